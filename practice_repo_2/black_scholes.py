@@ -1,45 +1,61 @@
-
-import numpy as np
-from scipy.stats import norm
-from src.utils.user_input import UserInput
-
-def black_scholes(option_type, S, K, T, r, sigma, q=0): # q is the continuous dividend yield
-    
-    # check input
-    if S <= 0 or K <= 0 or T <= 0:
-        raise ValueError("S, K, and T must be greater than zero.")
-    if sigma < 0:
-        raise ValueError("Volatility (sigma) must be non-negative.")
-
-    # compute d1 and d2
-    d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-
-    if option_type == "Call":
-        price = (S * np.exp(-q * T) * norm.cdf(d1)) - (K * np.exp(-r * T) * norm.cdf(d2))
-    elif option_type == "Put":
-        price = (K * np.exp(-r * T) * norm.cdf(-d2)) - (S * np.exp(-q * T) * norm.cdf(-d1))
-    else:
-        raise ValueError("Invalid option type. Use 'Call' or 'Put'.")
-
-    return price
-
-def calculate_black_scholes():
-    
-    # Create an instance of UserInput to gather parameters
-    user_input = UserInput()
-    user_input.gather_input(prefix="black_scholes_")
-    parameters = user_input.get_parameters()
-
-    # Extract parameters
-    underlying_price = parameters['underlying_price']
-    strike_price = parameters['strike_price']
-    time_to_expiration = parameters['time_to_expiration']  # Already in years
-    risk_free_rate = parameters['risk_free_rate']  # As a decimal
-    volatility = parameters['volatility']  # As a decimal
-    dividend_yield = parameters['dividend_yield']  # As a decimal
-    option_type = parameters['option_type']
-
-    # Calculate option price using the Black-Scholes formula
-    option_price = black_scholes(option_type, underlying_price, strike_price, time_to_expiration, risk_free_rate, volatility, dividend_yield)
-    return option_price
+
+import math
+import numpy as np
+
+#no streamlit or scipy here: batch workers import this module just for the formula, and both cost far more to
+#import than the pricing itself (the normal cdf comes from math.erfc, calculate_black_scholes lives in
+#src.utils.dashboard)
+
+def _norm_cdf(x):
+    return 0.5 * math.erfc(-x / math.sqrt(2))
+
+def black_scholes(option_type, S, K, T, r, sigma, q=0): # q is the continuous dividend yield
+    
+    # check input
+    if S <= 0 or K <= 0 or T <= 0:
+        raise ValueError("S, K, and T must be greater than zero.")
+    if sigma < 0:
+        raise ValueError("Volatility (sigma) must be non-negative.")
+
+    # compute d1 and d2
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
+    d2 = d1 - sigma * np.sqrt(T)
+
+    if option_type == "Call":
+        price = (S * np.exp(-q * T) * _norm_cdf(d1)) - (K * np.exp(-r * T) * _norm_cdf(d2))
+    elif option_type == "Put":
+        price = (K * np.exp(-r * T) * _norm_cdf(-d2)) - (S * np.exp(-q * T) * _norm_cdf(-d1))
+    else:
+        raise ValueError("Invalid option type. Use 'Call' or 'Put'.")
+
+    return price
+
+def black_scholes_batch(option_type, S, K, T, r, sigma, q=0):
+
+    # vectorized black_scholes for arrays of contracts: every input (option_type too, "Call"/"Put" labels) is
+    # broadcast against the others and the whole book is priced in one pass instead of a python loop
+    S, K, T, r, sigma, q = (np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q))
+    option_type = np.asarray(option_type)
+    if np.any(S <= 0) or np.any(K <= 0) or np.any(T <= 0):
+        raise ValueError("S, K, and T must be greater than zero.")
+    if np.any(sigma < 0):
+        raise ValueError("Volatility (sigma) must be non-negative.")
+    if not np.all(np.isin(option_type, ["Call", "Put"])):
+        raise ValueError("Invalid option type. Use 'Call' or 'Put'.")
+
+    # scipy.special is imported on the first call so importing this module stays cheap
+    from scipy.special import ndtr
+
+    # +1 for calls, -1 for puts so that both share the same formula
+    sign = np.where(option_type == "Call", 1.0, -1.0)
+    vol_sqrt_T = sigma * np.sqrt(T)
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / vol_sqrt_T
+    d2 = d1 - vol_sqrt_T
+    return sign * (S * np.exp(-q * T) * ndtr(sign * d1) - K * np.exp(-r * T) * ndtr(sign * d2))
+
+def __getattr__(name):
+    # the streamlit page used to import calculate_black_scholes from here; it is only loaded when asked for
+    if name == "calculate_black_scholes":
+        from src.utils.dashboard import calculate_black_scholes
+        return calculate_black_scholes
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
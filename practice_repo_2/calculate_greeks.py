@@ -1,163 +1,105 @@
-import numpy as np
-from src.models.black_scholes import black_scholes
-from src.models.monte_carlo import monte_carlo_simulation
-
-def calculate_greeks_black_scholes(option_type, S, K, T, r, sigma, q=0):
-    
-    # Calculate option price for the current price
-    price_current = black_scholes(option_type, S, K, T, r, sigma, q)
-
-    # First-order Greeks
-
-    #delta = dV/dS it tell how much the option price changes with change in stock price
-    #delta obtained by using the definition formula of limits: lt h tendsto 0 [V(S+h) - V(S-h)]/2h
-    price_up = black_scholes(option_type, S + 0.01, K, T, r, sigma, q)
-    price_down = black_scholes(option_type, S - 0.01, K, T, r, sigma, q)
-    delta = (price_up - price_down) / 0.02
-
-    #gamma = dV2/d2S - double differentiation numerical formula = [V(S+h) - 2*V(S) + V(S-h)]/h**2
-    gamma = (price_up - 2 * price_current + price_down) / (0.01 ** 2)
-
-    #theta = dV/dT - rate of change of option value with change in time
-    price_t_plus = black_scholes(option_type, S, K, T + 1/365, r, sigma, q)
-    #deltaV = V(T + deltaT) - V(T)
-    #deltaT=1/365
-    #divide both to get theta
-    theta = (price_t_plus - price_current) * 365 
-
-    #vega is dV/dsigma - rate of change of option price with change in volatality 
-    price_vol_up = black_scholes(option_type, S, K, T, r, sigma + 0.01, q)
-    price_vol_down = black_scholes(option_type, S, K, T, r, sigma - 0.01, q)
-    vega = (price_vol_up - price_vol_down) / 0.02
-
-    #rho is dV/dr - sensitivity to interest rate
-    price_r_up = black_scholes(option_type, S, K, T, r + 0.01, sigma, q)
-    price_r_down = black_scholes(option_type, S, K, T, r - 0.01, sigma, q)
-    rho = (price_r_up - price_r_down) / 0.02
-
-    # Second-order Greeks - CHECK FOR CORRECTNESS!!
-    charm = (black_scholes(option_type, S, K, T - 1/365, r, sigma, q) - price_current) / (1/365)
-    speed = (black_scholes(option_type, S + 0.01, K, T, r, sigma, q) - 2 * price_current + black_scholes(option_type, S - 0.01, K, T, r, sigma, q)) / (0.01 ** 2)
-    color = (black_scholes(option_type, S, K, T - 1/365, r, sigma, q) - price_current) / (1/365)
-    zomma = (price_vol_up - 2 * price_current + price_vol_down) / (0.01 ** 2)
-    veta = (black_scholes(option_type, S, K, T + 1/365, r, sigma, q) - price_current) / (1/365)
-    volga = (price_vol_up - 2 * price_current + price_vol_down) / (0.01 ** 2)
-
-    # Return the Greeks as separate dictionaries
-    first_order_greeks = {
-        'Delta': delta,
-        'Gamma': gamma,
-        'Theta': theta,
-        'Vega': vega,
-        'Rho': rho
-    }
-
-    second_order_greeks = {
-        'Charm': charm,
-        'Speed': speed,
-        'Color': color,
-        'Zomma': zomma,
-        'Veta': veta,
-        'Volga': volga
-    }
-
-    return first_order_greeks, second_order_greeks
-
-def calculate_greeks_monte_carlo(option_type, S, K, T, r, sigma, q=0, num_simulations=10000):
-
-    # Generate random numbers once to use across all simulations
-    random_numbers = np.random.normal(size=(num_simulations, 365))
-    # Calculate option price for the current price
-    price_current = monte_carlo_simulation(option_type, S, K, T, r, sigma, q, num_simulations, random_numbers)
-    
-    # Step sizes for finite differences
-    h_s = S * 0.001      # 0.1% of spot price
-    h_v = sigma * 0.01  # 1% of volatility
-    h_r = max(0.001, r * 0.001)  # 0.1% of rate
-    h_t = 1/12          # One month instead of one day
-
-    # First-order Greeks
-    # Delta calculation
-    price_up = monte_carlo_simulation(option_type, S + h_s, K, T, r, sigma, q, num_simulations, random_numbers)
-    price_down = monte_carlo_simulation(option_type, S - h_s, K, T, r, sigma, q, num_simulations, random_numbers)
-    delta = (price_up - price_down) / (2 * h_s)
-
-    # Gamma calculation
-    gamma = (price_up - 2 * price_current + price_down) / (h_s ** 2)
-
-    # Theta calculation (forward difference to avoid negative time)
-    price_t_plus = monte_carlo_simulation(option_type, S, K, T + h_t, r, sigma, q, num_simulations, random_numbers)
-    theta = (price_t_plus - price_current) / h_t
-
-    # Vega calculation
-    price_vol_up = monte_carlo_simulation(option_type, S, K, T, r, sigma + h_v, q, num_simulations, random_numbers)
-    price_vol_down = monte_carlo_simulation(option_type, S, K, T, r, sigma - h_v, q, num_simulations, random_numbers)
-    vega = (price_vol_up - price_vol_down) / (2 * h_v)
-
-    # Rho calculation
-    price_r_up = monte_carlo_simulation(option_type, S, K, T, r + h_r, sigma, q, num_simulations, random_numbers)
-    price_r_down = monte_carlo_simulation(option_type, S, K, T, r - h_r, sigma, q, num_simulations, random_numbers)
-    rho = (price_r_up - price_r_down) / (2 * h_r)
-
-    # Second-order Greeks using same random numbers
-    
-    # Charm (rate of change of delta with respect to time)
-    #compute delta at a time slightly later
-    price_up_dt = monte_carlo_simulation(option_type, S + h_s, K, T + h_t, r, sigma, q, num_simulations, random_numbers)
-    price_down_dt = monte_carlo_simulation(option_type, S - h_s, K, T + h_t, r, sigma, q, num_simulations, random_numbers)
-    delta_dt = (price_up_dt - price_down_dt) / (2 * h_s)
-    #used the forward finite difference formula for calculation ddelta/dT instead of central difference to avoid any potential domain errors
-    charm = (delta_dt - delta) / h_t
-
-
-    # Speed (rate of change of gamma with respect to stock price)
-    price_up_2h = monte_carlo_simulation(option_type, S + 2*h_s, K, T, r, sigma, q, num_simulations, random_numbers)
-    price_down_2h = monte_carlo_simulation(option_type, S - 2*h_s, K, T, r, sigma, q, num_simulations, random_numbers)
-    gamma_up = (price_up_2h - 2*price_up + price_current) / (h_s ** 2)
-    gamma_down = (price_current - 2*price_down + price_down_2h) / (h_s ** 2)
-    speed = (gamma_up - gamma_down) / (2 * h_s)
-
-    # Color (rate of change of gamma with respect to time)
-    price_up_dt = monte_carlo_simulation(option_type, S + h_s, K, T + h_t, r, sigma, q, num_simulations, random_numbers)
-    price_down_dt = monte_carlo_simulation(option_type, S - h_s, K, T + h_t, r, sigma, q, num_simulations, random_numbers)
-    price_dt = monte_carlo_simulation(option_type, S, K, T + h_t, r, sigma, q, num_simulations, random_numbers)
-    gamma_dt = (price_up_dt - 2*price_dt + price_down_dt) / (h_s ** 2)
-    color = (gamma_dt - gamma) / h_t
-
-    # Zomma (rate of change of gamma with respect to volatility)
-    price_up_vol = monte_carlo_simulation(option_type, S + h_s, K, T, r, sigma + h_v, q, num_simulations, random_numbers)
-    price_down_vol = monte_carlo_simulation(option_type, S - h_s, K, T, r, sigma + h_v, q, num_simulations, random_numbers)
-    gamma_up_vol = (price_up_vol - 2*price_vol_up + price_down_vol) / (h_s ** 2)
-    gamma_down_vol = (price_up - 2*price_current + price_down) / (h_s ** 2)
-    zomma = (gamma_up_vol - gamma_down_vol) / (2 * h_v)
-
-    # Veta (rate of change of vega with respect to time)
-    price_vol_up_dt = monte_carlo_simulation(option_type, S, K, T + h_t, r, sigma + h_v, q, num_simulations, random_numbers)
-    price_vol_down_dt = monte_carlo_simulation(option_type, S, K, T + h_t, r, sigma - h_v, q, num_simulations, random_numbers)
-    vega_dt = (price_vol_up_dt - price_vol_down_dt) / (2 * h_v)
-    veta = (vega_dt - vega) / h_t
-
-    # Volga (rate of change of vega with respect to volatility)
-    price_2vol_up = monte_carlo_simulation(option_type, S, K, T, r, sigma + 2*h_v, q, num_simulations, random_numbers)
-    price_2vol_down = monte_carlo_simulation(option_type, S, K, T, r, sigma - 2*h_v, q, num_simulations, random_numbers)
-    vega_up = (price_2vol_up - price_vol_up) / h_v
-    vega_down = (price_vol_down - price_2vol_down) / h_v
-    volga = (vega_up - vega_down) / (2 * h_v)
-
-    # Return the Greeks as separate dictionaries
-    first_order_greeks = {
-        'Delta': delta,
-        'Gamma': gamma,
-        'Theta': theta,
-        'Vega': vega,
-        'Rho': rho
-    }
-    second_order_greeks = {
-        'Charm': charm,
-        'Speed': speed,
-        'Color': color,
-        'Zomma': zomma,
-        'Veta': veta,
-        'Volga': volga
-    }
+import numpy as np
+from src.models.monte_carlo import monte_carlo_greeks
+
+def calculate_greeks_black_scholes(option_type, S, K, T, r, sigma, q=0):
+
+    # closed-form greeks: d1, d2, the discount factors and the normal pdf/cdf are computed once and every
+    # greek is built from them (the old version repriced the option ~17 times with finite differences)
+    # works for scalars or numpy arrays of contracts
+
+    # check input (vectorized so arrays of contracts can be passed in)
+    S, K, T, r, sigma, q = (np.asarray(x, dtype=float) for x in (S, K, T, r, sigma, q))
+    if np.any(S <= 0) or np.any(K <= 0) or np.any(T <= 0):
+        raise ValueError("S, K, and T must be greater than zero.")
+    if np.any(sigma <= 0):
+        raise ValueError("Volatility (sigma) must be greater than zero.")
+    option_type = np.asarray(option_type)
+    if not np.all(np.isin(option_type, ["Call", "Put"])):
+        raise ValueError("Invalid option type. Use 'Call' or 'Put'.")
+
+    # +1 for calls, -1 for puts so that both share the same formulas
+    sign = np.where(option_type == "Call", 1.0, -1.0)
+
+    sqrt_T = np.sqrt(T)
+    vol_sqrt_T = sigma * sqrt_T
+    d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / vol_sqrt_T
+    d2 = d1 - vol_sqrt_T
+
+    # scipy.special is imported on the first call rather than with the module (scipy.stats took ~1 s to import)
+    from scipy.special import ndtr
+
+    div_disc = np.exp(-q * T)    # e^(-qT)
+    rate_disc = np.exp(-r * T)   # e^(-rT)
+    pdf_d1 = np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi)
+    cdf_d1 = ndtr(sign * d1)
+    cdf_d2 = ndtr(sign * d2)
+
+    # First-order Greeks
+
+    #delta = dV/dS - how much the option price changes with change in stock price
+    delta = sign * div_disc * cdf_d1
+
+    #gamma = d2V/dS2 - how fast delta itself moves with the stock price
+    gamma = div_disc * pdf_d1 / (S * vol_sqrt_T)
+
+    #vega = dV/dsigma - per 1.0 (100%) change in volatility
+    vega = S * div_disc * pdf_d1 * sqrt_T
+
+    #theta - kept as dV/dT (change in value for more time to expiration, per year) like the monte carlo greeks
+    theta = (S * div_disc * pdf_d1 * sigma / (2 * sqrt_T)
+             + sign * r * K * rate_disc * cdf_d2
+             - sign * q * S * div_disc * cdf_d1)
+
+    #rho = dV/dr - per 1.0 (100%) change in the interest rate
+    rho = sign * K * T * rate_disc * cdf_d2
+
+    # Second-order Greeks (time derivatives are again taken w.r.t. time to expiration T)
+
+    # d(d1)/dT, shows up in every time derivative below
+    d1_dT = (r - q) / vol_sqrt_T - d2 / (2 * T)
+
+    vanna = -div_disc * pdf_d1 * d2 / sigma                               # d(delta)/d(sigma)
+    charm = -sign * q * div_disc * cdf_d1 + div_disc * pdf_d1 * d1_dT     # d(delta)/dT
+    speed = -gamma / S * (d1 / vol_sqrt_T + 1)                            # d(gamma)/dS
+    color = -gamma * (q + 1 / (2 * T) + d1 * d1_dT)                       # d(gamma)/dT
+    zomma = gamma * (d1 * d2 - 1) / sigma                                 # d(gamma)/d(sigma)
+    veta = vega * (-q + 1 / (2 * T) - d1 * d1_dT)                         # d(vega)/dT
+    volga = vega * d1 * d2 / sigma                                        # d(vega)/d(sigma)
+
+    # Return the Greeks as separate dictionaries
+    first_order_greeks = {
+        'Delta': delta,
+        'Gamma': gamma,
+        'Theta': theta,
+        'Vega': vega,
+        'Rho': rho
+    }
+
+    second_order_greeks = {
+        'Vanna': vanna,
+        'Charm': charm,
+        'Speed': speed,
+        'Color': color,
+        'Zomma': zomma,
+        'Veta': veta,
+        'Volga': volga
+    }
+
+    return first_order_greeks, second_order_greeks
+
+def calculate_greeks_monte_carlo(option_type, S, K, T, r, sigma, q=0, num_simulations=10000, seed=None,
+                                 return_std_errors=False):
+
+    # single simulation pass: pathwise estimators for delta, vega, rho and theta, likelihood-ratio/mixed
+    # estimators for gamma and the second-order greeks (see monte_carlo_greeks); the old version reran
+    # monte_carlo_simulation ~25 times with bumped inputs and the finite differences amplified the noise
+    random_numbers = seed if seed is not None else int(np.random.SeedSequence().entropy % 2 ** 63)
+    greeks = monte_carlo_greeks(option_type, S, K, T, r, sigma, q, num_simulations, random_numbers)
+
+    # Return the Greeks as separate dictionaries
+    first_order_greeks = {name: greeks[name][0] for name in ['Delta', 'Gamma', 'Theta', 'Vega', 'Rho']}
+    second_order_greeks = {name: greeks[name][0] for name in ['Vanna', 'Charm', 'Speed', 'Color', 'Zomma', 'Veta', 'Volga']}
+    if return_std_errors:
+        std_errors = {name: greeks[name][1] for name in greeks}
+        return first_order_greeks, second_order_greeks, std_errors
     return first_order_greeks, second_order_greeks
\ No newline at end of file
@@ -0,0 +1,48 @@
+
+#streamlit glue for the pricing models: reads the sidebar inputs and calls the headless functions
+#the models in src.models and src.greeks never import streamlit, so they can be used from scripts and workers
+
+from src.models.black_scholes import black_scholes
+from src.models.monte_carlo import monte_carlo_simulation
+from src.utils.user_input import UserInput
+
+def calculate_black_scholes():
+    
+    # Create an instance of UserInput to gather parameters
+    user_input = UserInput()
+    user_input.gather_input(prefix="black_scholes_")
+    parameters = user_input.get_parameters()
+
+    # Extract parameters
+    underlying_price = parameters['underlying_price']
+    strike_price = parameters['strike_price']
+    time_to_expiration = parameters['time_to_expiration']  # Already in years
+    risk_free_rate = parameters['risk_free_rate']  # As a decimal
+    volatility = parameters['volatility']  # As a decimal
+    dividend_yield = parameters['dividend_yield']  # As a decimal
+    option_type = parameters['option_type']
+
+    # Calculate option price using the Black-Scholes formula
+    option_price = black_scholes(option_type, underlying_price, strike_price, time_to_expiration, risk_free_rate, volatility, dividend_yield)
+    return option_price
+
+def calculate_monte_carlo():
+    
+    # Create an instance of UserInput to gather parameters
+    user_input = UserInput()
+    user_input.gather_input(prefix="monte_carlo_")
+    parameters = user_input.get_parameters()
+
+    # Extract parameters
+    underlying_price = parameters['underlying_price']
+    strike_price = parameters['strike_price']
+    time_to_expiration = parameters['time_to_expiration']  # Already in years
+    risk_free_rate = parameters['risk_free_rate']  # As a decimal
+    volatility = parameters['volatility']  # As a decimal
+    dividend_yield = parameters['dividend_yield']  # As a decimal
+    option_type = parameters['option_type']
+    num_simulations = parameters['num_simulations']  # Accessing num_simulations from user input
+
+    # Perform Monte Carlo simulation
+    option_price = monte_carlo_simulation(option_type, underlying_price, strike_price, time_to_expiration, risk_free_rate, volatility, dividend_yield, num_simulations)
+    return option_price
@@ -0,0 +1,58 @@
+
+import subprocess
+import sys
+
+#import-time budget for the headless core
+#batch workers are short-lived processes, so whatever `import src.models.black_scholes` costs is paid on every start.
+#every core module is imported in a fresh interpreter with -X importtime, and the check fails when one of them takes
+#longer than the budget or pulls in a dependency that has to stay lazy (streamlit, scipy, pandas)
+#run it from the project root, where src is importable, e.g. as a ci step:  python -m src.utils.import_budget
+#(or through pytest, test_import_budget.py)
+
+CORE_MODULES = ["src.models.black_scholes", "src.models.monte_carlo", "src.greeks.calculate_greeks",
+                "src.utils.pricing_cache"]
+FORBIDDEN = ["streamlit", "scipy", "pandas"]
+BUDGET_MS = 250  # numpy alone takes ~100 ms
+
+def import_profile(module):
+    # (import time in ms, names of every module it imported) measured in a fresh interpreter
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise ImportError(f"importing {module} failed:\n{result.stderr.strip()}")
+    total_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        total_us += int(self_us)
+        imported.add(name.strip())
+    return total_us / 1000, imported
+
+def check_import_budget(modules=CORE_MODULES, budget_ms=BUDGET_MS, forbidden=FORBIDDEN, repeats=3):
+    # returns {module: (best time in ms, forbidden modules it imported)} and the list of failures
+    # the best of a few runs is taken, the first import also pays for cold .pyc and disk caches
+    results = {}
+    failures = []
+    for module in modules:
+        times = []
+        for _ in range(repeats):
+            elapsed, imported = import_profile(module)
+            times.append(elapsed)
+        leaked = sorted(name for name in imported if name.split(".")[0] in forbidden and "." not in name)
+        results[module] = (min(times), leaked)
+        if min(times) > budget_ms:
+            failures.append(f"{module} takes {min(times):.0f} ms to import (budget {budget_ms} ms)")
+        if leaked:
+            failures.append(f"{module} imports {', '.join(leaked)} at import time")
+    return results, failures
+
+if __name__ == "__main__":
+    results, failures = check_import_budget()
+    for module, (elapsed, leaked) in results.items():
+        print(f"{module:<32} {elapsed:7.1f} ms  {'imports ' + ', '.join(leaked) if leaked else 'ok'}")
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
@@ -1,78 +1,287 @@
-
-import numpy as np
-from src.utils.user_input import UserInput
-
-#monte carlo simulation:
-#Instead of using a closed-form formula, we simulate many possible future stock price paths, calculate the option payoff in each case and average them out
-
-def monte_carlo_simulation(option_type, S, K, T, r, sigma, q=0, num_simulations=10000, random_numbers=None):
-
-    # check inputs and raise errors
-    if S <= 0:
-        raise ValueError("Underlying asset price (S) must be greater than zero.")
-    if K <= 0:
-        raise ValueError("Strike price (K) must be greater than zero.")
-    if T <= 0:
-        raise ValueError("Time to expiration (T) must be greater than zero.")
-    if sigma < 0:
-        raise ValueError("Volatility (sigma) must be non-negative.")
-    if num_simulations <= 0:
-        raise ValueError("Number of simulations must be a positive integer.")
-    if option_type not in ["Call", "Put"]:
-        raise ValueError("Invalid option type. Use 'Call' or 'Put'.")
-
-    # simulating price paths
-    dt = T / 365  # daily time steps
-    prices = np.zeros(num_simulations) #to store final stock price at expiry for each simulated world
-
-    # generate or use given random numbers
-    if random_numbers is None:
-        #acc to the geometric brownian motion stochastic DE, the second term is to include randomness
-        random_numbers = np.random.normal(size=(num_simulations, 365))  
-    
-    # check for random_numbers to have correct shape
-    if random_numbers.shape != (num_simulations, 365):
-        raise ValueError(f"random_numbers must have shape ({num_simulations}, 365)")
-
-    for i in range(num_simulations):
-        #for each of the simulations
-        #cumsum - cumulative sum of daily log returns (multiplication of the return percentages) of 365 days in the ith simulation world
-        price_path = S * np.exp(np.cumsum(
-            (r - q - 0.5 * sigma ** 2) * dt +   #this is the predicted movement -
-            sigma * np.sqrt(dt) * random_numbers[i] #randomness                 - this part is a vector of length 365 thats how the cumsum happens
-        ))
-        prices[i] = price_path[-1]  # last element since it has the final cumulated value
-
-    # calculating option payoffs
-    if option_type == "Call":
-        payoffs = np.maximum(prices - K, 0)
-    else:  # put payoffs
-        payoffs = np.maximum(K - prices, 0)
-
-    # the exponential term exists in order to correct the fact that future value is higher than present value 
-    # we're calculating the present fair option price by discounting (convertin future money value to present) 
-    # and averaging out the payoffs from all different simulations 
-    option_price = np.exp(-r * T) * np.mean(payoffs)
-    
-    return option_price
-
-def calculate_monte_carlo():
-    
-    # Create an instance of UserInput to gather parameters
-    user_input = UserInput()
-    user_input.gather_input(prefix="monte_carlo_")
-    parameters = user_input.get_parameters()
-
-    # Extract parameters
-    underlying_price = parameters['underlying_price']
-    strike_price = parameters['strike_price']
-    time_to_expiration = parameters['time_to_expiration']  # Already in years
-    risk_free_rate = parameters['risk_free_rate']  # As a decimal
-    volatility = parameters['volatility']  # As a decimal
-    dividend_yield = parameters['dividend_yield']  # As a decimal
-    option_type = parameters['option_type']
-    num_simulations = parameters['num_simulations']  # Accessing num_simulations from user input
-
-    # Perform Monte Carlo simulation
-    option_price = monte_carlo_simulation(option_type, underlying_price, strike_price, time_to_expiration, risk_free_rate, volatility, dividend_yield, num_simulations)
-    return option_price 
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import numpy as np
+
+#monte carlo simulation:
+#Instead of using a closed-form formula, we simulate many possible future stock price paths, calculate the option payoff in each case and average them out
+
+def monte_carlo_simulation(option_type, S, K, T, r, sigma, q=0, num_simulations=10000, random_numbers=None,
+                           chunk_size=10000, method="exact", antithetic=False, moment_matching=False,
+                           control_variate=False, workers=None, backend="process"):
+    price, _, _ = monte_carlo_estimate(option_type, S, K, T, r, sigma, q, num_simulations, random_numbers,
+                                       chunk_size, method, antithetic, moment_matching, control_variate,
+                                       workers, backend)
+    return price
+
+def monte_carlo_estimate(option_type, S, K, T, r, sigma, q=0, num_simulations=10000, random_numbers=None,
+                         chunk_size=10000, method="exact", antithetic=False, moment_matching=False,
+                         control_variate=False, workers=None, backend="process"):
+
+    # same as monte_carlo_simulation but returns (price, standard error, variance reduction factor)
+    # random_numbers can be a seed (int) or np.random.Generator - passing the same seed to several calls gives them
+    # common random numbers - or the old (num_simulations, 365) array of daily shocks
+    # paths are simulated chunk_size at a time and only running sums are kept,
+    # so memory stays flat however many simulations are asked for
+    # method="exact" draws S_T straight from its lognormal distribution (fine for european payoffs),
+    # method="path" builds it from 365 daily steps like the original code,
+    # method="sobol" is "exact" with scrambled sobol points instead of pseudo-random ones (quasi monte carlo, the
+    # error falls close to 1/N instead of 1/sqrt(N); pass a different seed per run to get independent replications)
+
+    # opt-in variance reduction:
+    # antithetic - every shock Z is also used as -Z, the pair average is one sample
+    # moment_matching - shocks of each chunk are rescaled to mean 0 and std 1
+    # control_variate - the terminal stock price is used as a control since its mean S e^((r-q)T) is known,
+    #                   with the optimal coefficient beta = Cov(payoff, S_T) / Var(S_T) estimated from the paths
+    # the variance reduction factor is (variance per path of the plain estimator) / (variance per path of this one)
+
+    # parallel runs: workers=k splits the simulations into k shards, each drawn from its own independent stream
+    # (SeedSequence(random_numbers).spawn(k)) on a process pool (backend="process") or thread pool ("thread");
+    # the shards return their running sums, which are added up in shard order, so a given seed and worker
+    # count always give the same result bit for bit. 0 means one worker per cpu core
+
+    # check inputs and raise errors
+    if S <= 0:
+        raise ValueError("Underlying asset price (S) must be greater than zero.")
+    if K <= 0:
+        raise ValueError("Strike price (K) must be greater than zero.")
+    if T <= 0:
+        raise ValueError("Time to expiration (T) must be greater than zero.")
+    if sigma < 0:
+        raise ValueError("Volatility (sigma) must be non-negative.")
+    if num_simulations <= 0:
+        raise ValueError("Number of simulations must be a positive integer.")
+    if option_type not in ["Call", "Put"]:
+        raise ValueError("Invalid option type. Use 'Call' or 'Put'.")
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be a positive integer.")
+    if method not in ["exact", "path", "sobol"]:
+        raise ValueError("Invalid method. Use 'exact', 'path' or 'sobol'.")
+    if antithetic and (num_simulations % 2 or chunk_size % 2):
+        raise ValueError("Antithetic sampling needs an even num_simulations and chunk_size.")
+    if backend not in ["process", "thread"]:
+        raise ValueError("Invalid backend. Use 'process' or 'thread'.")
+    if workers is not None and isinstance(random_numbers, (np.ndarray, np.random.Generator)):
+        raise ValueError("Parallel runs need a seed (int or SeedSequence) for random_numbers.")
+
+    if workers is None:
+        sums = _partial_sums(option_type, S, K, T, r, sigma, q, random_numbers, chunk_size, method, antithetic,
+                             moment_matching, num_simulations)
+    else:
+        workers = workers or os.cpu_count() or 1
+        # near-equal shards, kept even for antithetic pairs
+        pair = 2 if antithetic else 1
+        units, extra = divmod(num_simulations // pair, workers)
+        sizes = [(units + (i < extra)) * pair for i in range(workers)]
+        root = random_numbers if isinstance(random_numbers, np.random.SeedSequence) else np.random.SeedSequence(random_numbers)
+        shard = partial(_partial_sums, option_type, S, K, T, r, sigma, q)
+        executor = ProcessPoolExecutor if backend == "process" else ThreadPoolExecutor
+        with executor(max_workers=workers) as pool:
+            parts = list(pool.map(shard, root.spawn(workers), [chunk_size] * workers, [method] * workers,
+                                  [antithetic] * workers, [moment_matching] * workers, sizes))
+        sums = parts[0]
+        for part in parts[1:]:
+            sums = sums + part
+    n, sum_y, sum_yy, sum_c, sum_cc, sum_yc, raw_sum, raw_sq_sum = sums
+
+    # the exponential term exists in order to correct the fact that future value is higher than present value 
+    # we're calculating the present fair option price by discounting (convertin future money value to present) 
+    # and averaging out the payoffs from all different simulations 
+    discount = np.exp(-r * T)
+    mean_y = sum_y / n
+    var_y = (sum_yy - n * mean_y ** 2) / max(n - 1, 1)
+
+    if control_variate:
+        mean_c = sum_c / n
+        var_c = (sum_cc - n * mean_c ** 2) / max(n - 1, 1)
+        cov_yc = (sum_yc - n * mean_y * mean_c) / max(n - 1, 1)
+        beta = cov_yc / var_c if var_c > 0 else 0.0
+        mean_y -= beta * (mean_c - S * np.exp((r - q) * T))
+        var_y -= beta * cov_yc
+    var_y = max(var_y, 0.0)
+
+    option_price = discount * mean_y
+    std_error = discount * np.sqrt(var_y / n)
+
+    raw_mean = raw_sum / num_simulations
+    raw_var = (raw_sq_sum - num_simulations * raw_mean ** 2) / max(num_simulations - 1, 1)
+    cost_var = var_y * num_simulations / n  # an antithetic pair costs two paths
+    vr_factor = raw_var / cost_var if cost_var > 0 else np.inf
+
+    return option_price, std_error, vr_factor
+
+def _partial_sums(option_type, S, K, T, r, sigma, q, random_numbers, chunk_size, method, antithetic,
+                  moment_matching, num_simulations):
+
+    # running sums of one run (or one parallel shard) of monte_carlo_estimate:
+    # [samples, sum Y, sum Y^2, sum C, sum C^2, sum YC, plain payoff sum, plain payoff sum of squares]
+
+    #acc to the geometric brownian motion stochastic DE, log(S_T) = log(S) + (r - q - sigma^2/2) T + sigma sqrt(T) Z
+    drift = (r - q - 0.5 * sigma ** 2) * T  #this is the predicted movement
+    diffusion = sigma * np.sqrt(T)          #scale of the randomness
+
+    # running sums: payoff Y and control C per sample, plus the plain per-path payoff sums
+    n = 0
+    sum_y = sum_yy = sum_c = sum_cc = sum_yc = 0.0
+    raw_sum = raw_sq_sum = 0.0
+    for shocks in _terminal_shocks(random_numbers, num_simulations, chunk_size, method, antithetic):
+        if moment_matching and shocks.size > 1:
+            shocks = (shocks - shocks.mean()) / shocks.std()
+        prices = S * np.exp(drift + diffusion * shocks)  #final stock price at expiry for each simulated world in the chunk
+
+        # calculating option payoffs
+        if option_type == "Call":
+            payoffs = np.maximum(prices - K, 0)
+        else:  # put payoffs
+            payoffs = np.maximum(K - prices, 0)
+
+        raw_sum += payoffs.sum()
+        raw_sq_sum += np.dot(payoffs, payoffs)
+
+        if antithetic:
+            # second half of the chunk holds the mirrored shocks
+            half = payoffs.size // 2
+            payoffs = 0.5 * (payoffs[:half] + payoffs[half:])
+            prices = 0.5 * (prices[:half] + prices[half:])
+
+        n += payoffs.size
+        sum_y += payoffs.sum()
+        sum_yy += np.dot(payoffs, payoffs)
+        sum_c += prices.sum()
+        sum_cc += np.dot(prices, prices)
+        sum_yc += np.dot(payoffs, prices)
+
+    return np.array([n, sum_y, sum_yy, sum_c, sum_cc, sum_yc, raw_sum, raw_sq_sum])
+
+def monte_carlo_greeks(option_type, S, K, T, r, sigma, q=0, num_simulations=10000, random_numbers=None,
+                       chunk_size=10000, method="exact"):
+
+    # all greeks from ONE simulation pass (no bump-and-reprice), each with its standard error
+    # returns {greek name: (value, std_error)}; time greeks are d/dT like calculate_greeks_monte_carlo
+
+    # how: with m = log(S) + (r - q - sigma^2/2) T, s = sigma sqrt(T) and S_T = exp(m + s Z), the price is
+    # V = e^(-rT) U(m, s) with U = E[f(S_T)], so every greek is a combination of derivatives of U
+    # - first derivatives are pathwise: U_m = E[h], U_s = E[h Z] with h = f'(S_T) S_T
+    #   (the payoff derivative is just the in-the-money indicator)
+    # - higher ones differentiate h with the likelihood ratio of the gaussian (weights in Z), because the
+    #   indicator has no second derivative: U_mm = E[h Z] / s, U_ms = E[h (Z^2 - 1)] / s,
+    #   U_ss = E[h (Z^3 - 2Z)] / s, U_mmm = E[h (Z^2 - 1)] / s^2, U_mms = E[h (Z^3 - 3Z)] / s^2
+    # the same recipe works for another simulator (e.g. heston) once its per-path h and score weights are known
+
+    if S <= 0 or K <= 0 or T <= 0:
+        raise ValueError("S, K, and T must be greater than zero.")
+    if sigma <= 0:
+        raise ValueError("Volatility (sigma) must be greater than zero.")
+    if num_simulations <= 1:
+        raise ValueError("Number of simulations must be greater than one.")
+    if option_type not in ["Call", "Put"]:
+        raise ValueError("Invalid option type. Use 'Call' or 'Put'.")
+    if method not in ["exact", "path", "sobol"]:
+        raise ValueError("Invalid method. Use 'exact', 'path' or 'sobol'.")
+
+    sign = 1.0 if option_type == "Call" else -1.0
+    sqrt_T = np.sqrt(T)
+    s = sigma * sqrt_T
+    D = np.exp(-r * T)
+
+    # derivatives of m, s and the discount factor D w.r.t. the model inputs
+    m_sigma, m_r, m_T = -sigma * T, T, r - q - 0.5 * sigma ** 2
+    s_sigma, s_T = sqrt_T, sigma / (2 * sqrt_T)
+    D_r, D_T = -T * D, -r * D
+
+    names = ['Delta', 'Gamma', 'Theta', 'Vega', 'Rho', 'Vanna', 'Charm', 'Speed', 'Color', 'Zomma', 'Veta', 'Volga']
+    sums = dict.fromkeys(names, 0.0)
+    sq_sums = dict.fromkeys(names, 0.0)
+
+    for Z in _terminal_shocks(random_numbers, num_simulations, chunk_size, method):
+        ST = S * np.exp(m_T * T + s * Z)
+        f = np.maximum(sign * (ST - K), 0)        # payoff
+        h = sign * (sign * (ST - K) > 0) * ST     # f'(S_T) S_T
+
+        # per-path samples of U and its partial derivatives
+        U = f
+        U_m = h
+        U_s = h * Z
+        U_mm = h * Z / s
+        U_ms = h * (Z ** 2 - 1) / s
+        U_ss = h * (Z ** 3 - 2 * Z) / s
+        U_mmm = h * (Z ** 2 - 1) / s ** 2
+        U_mms = h * (Z ** 3 - 3 * Z) / s ** 2
+
+        # chain rule from (D, m, s) to the usual greeks
+        samples = {
+            'Delta': D * U_m / S,
+            'Gamma': D * (U_mm - U_m) / S ** 2,
+            'Theta': D_T * U + D * (U_m * m_T + U_s * s_T),
+            'Vega': D * (U_m * m_sigma + U_s * s_sigma),
+            'Rho': D_r * U + D * U_m * m_r,
+            'Vanna': D * (U_mm * m_sigma + U_ms * s_sigma) / S,
+            'Charm': (D_T * U_m + D * (U_mm * m_T + U_ms * s_T)) / S,
+            'Speed': D * (U_mmm - 3 * U_mm + 2 * U_m) / S ** 3,
+            'Color': (D_T * (U_mm - U_m) + D * ((U_mmm - U_mm) * m_T + (U_mms - U_ms) * s_T)) / S ** 2,
+            'Zomma': D * ((U_mmm - U_mm) * m_sigma + (U_mms - U_ms) * s_sigma) / S ** 2,
+            'Veta': (D_T * (U_m * m_sigma + U_s * s_sigma)
+                     + D * ((U_mm * m_T + U_ms * s_T) * m_sigma + U_m * -sigma
+                            + (U_ms * m_T + U_ss * s_T) * s_sigma + U_s / (2 * sqrt_T))),
+            'Volga': D * (U_mm * m_sigma ** 2 + 2 * U_ms * m_sigma * s_sigma + U_ss * s_sigma ** 2 + U_m * -T),
+        }
+        for name in names:
+            sums[name] += samples[name].sum()
+            sq_sums[name] += np.dot(samples[name], samples[name])
+
+    greeks = {}
+    for name in names:
+        mean = sums[name] / num_simulations
+        variance = max(sq_sums[name] - num_simulations * mean ** 2, 0) / (num_simulations - 1)
+        greeks[name] = (mean, np.sqrt(variance / num_simulations))
+    return greeks
+
+def _terminal_shocks(random_numbers, num_simulations, chunk_size, method, antithetic=False):
+
+    # yields the standard normal shock driving S_T for every path, chunk_size paths at a time
+    # with antithetic=True the second half of each chunk is the first half negated
+
+    if isinstance(random_numbers, np.ndarray):
+        # check for random_numbers to have correct shape
+        if random_numbers.shape != (num_simulations, 365):
+            raise ValueError(f"random_numbers must have shape ({num_simulations}, 365)")
+        # sum of 365 daily shocks / sqrt(365) is exactly the shock the cumsum of the old loop ended on
+        for start in range(0, num_simulations, chunk_size):
+            rows = random_numbers[start:start + chunk_size]
+            if antithetic:
+                rows = rows[:rows.shape[0] // 2]
+                shocks = rows.sum(axis=1) / np.sqrt(365)
+                yield np.concatenate([shocks, -shocks])
+            else:
+                yield rows.sum(axis=1) / np.sqrt(365)
+        return
+
+    rng = np.random.default_rng(random_numbers)
+    sobol = None
+    if method == "sobol":
+        # scipy is only imported for sobol points, so importing this module stays cheap
+        from scipy.special import ndtri
+        from scipy.stats import qmc
+        sobol = qmc.Sobol(d=1, scramble=True, seed=rng)
+    for start in range(0, num_simulations, chunk_size):
+        n = min(chunk_size, num_simulations - start)
+        draws = n // 2 if antithetic else n
+        if method == "exact":
+            shocks = rng.standard_normal(draws)
+        elif method == "sobol":
+            # the sequence continues across chunks; scipy warns when a draw is not a power of two
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                shocks = ndtri(sobol.random(draws)[:, 0])
+        else:
+            shocks = rng.standard_normal((draws, 365)).sum(axis=1) / np.sqrt(365)
+        yield np.concatenate([shocks, -shocks]) if antithetic else shocks
+
+def __getattr__(name):
+    # the streamlit page used to import calculate_monte_carlo from here; it is only loaded when asked for
+    if name == "calculate_monte_carlo":
+        from src.utils.dashboard import calculate_monte_carlo
+        return calculate_monte_carlo
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
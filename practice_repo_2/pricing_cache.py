@@ -0,0 +1,100 @@
+
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from src.greeks.calculate_greeks import calculate_greeks_black_scholes, calculate_greeks_monte_carlo
+
+#memoization for the greeks dashboard:
+#streamlit reruns the whole script on every widget change, so the same parameters get priced over and over
+#results are kept in a least-recently-used cache bounded by number of entries and by (approximate) memory,
+#the cache is a plain module object so it works the same from streamlit and from scripts/notebooks
+
+class PricingCache:
+    def __init__(self, max_entries=256, max_bytes=32 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size in bytes), oldest first
+        self._bytes = 0
+        # streamlit serves every session from its own thread
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        # returns the cached value for key, or compute() stored under key
+        # cached values are shared between callers, treat them as read-only
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # computed outside the lock so one slow monte carlo run does not block every other session
+        value = compute()
+        size = _size_of(value)
+        with self._lock:
+            if key in self._entries:  # another thread got there first
+                self._bytes -= self._entries.pop(key)[1]
+            if size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self._bytes += size
+                while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._bytes -= evicted_size
+                    self.evictions += 1
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+def _size_of(value):
+    # rough deep size of the cached results (dicts/tuples/lists of floats and numpy arrays)
+    if isinstance(value, np.ndarray):
+        #getsizeof already includes the buffer of an array that owns its data, a view only reports its header
+        return sys.getsizeof(value) if value.base is None else value.nbytes + sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_size_of(k) + _size_of(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_size_of(v) for v in value)
+    return sys.getsizeof(value)
+
+def greeks_key(option_type, S, K, T, r, sigma, q, num_simulations, seed=None):
+    # normalized parameter tuple: numbers as plain floats rounded to 12 significant digits, so values that only
+    # differ by float noise (0.05 vs 5 / 100) share an entry
+    numbers = tuple(float(f"{float(x):.12g}") for x in (S, K, T, r, sigma, q))
+    return (str(option_type).capitalize(),) + numbers + (int(num_simulations), None if seed is None else int(seed))
+
+# shared by the dashboard and headless callers
+greeks_cache = PricingCache()
+
+def cached_greeks(option_type, S, K, T, r, sigma, q=0, num_simulations=10000, seed=None, cache=None):
+    # returns (first_order_bs, second_order_bs, first_order_mc, second_order_mc)
+    # with seed=None the first monte carlo run for a parameter set draws a fresh seed and later lookups return
+    # that same run, so repeat views show the same numbers
+    cache = greeks_cache if cache is None else cache
+    key = greeks_key(option_type, S, K, T, r, sigma, q, num_simulations, seed)
+
+    def compute():
+        first_order_bs, second_order_bs = calculate_greeks_black_scholes(key[0], S, K, T, r, sigma, q)
+        first_order_mc, second_order_mc = calculate_greeks_monte_carlo(key[0], S, K, T, r, sigma, q, num_simulations, seed)
+        return first_order_bs, second_order_bs, first_order_mc, second_order_mc
+
+    return cache.get_or_compute(key, compute)
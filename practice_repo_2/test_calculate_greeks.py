@@ -0,0 +1,75 @@
+
+import numpy as np
+import pytest
+
+from src.greeks.calculate_greeks import calculate_greeks_black_scholes, calculate_greeks_monte_carlo
+from src.models.black_scholes import black_scholes, black_scholes_batch
+from src.models.monte_carlo import monte_carlo_greeks
+
+#closed-form greeks against central finite differences of the black-scholes price; like the module, the time
+#greeks are derivatives w.r.t. time to expiration T and vega / rho are per 1.0 of vol / rate
+
+rng = np.random.default_rng(0)
+N = 100
+BOOK = dict(S=rng.uniform(60, 140, N), K=rng.uniform(60, 140, N), T=rng.uniform(0.05, 3.0, N),
+            r=rng.uniform(0.0, 0.08, N), sigma=rng.uniform(0.05, 0.8, N), q=rng.uniform(0.0, 0.05, N))
+TYPES = np.where(rng.random(N) < 0.5, "Call", "Put")
+
+def _greek(name, **bump):
+    first, second = calculate_greeks_black_scholes(TYPES, **{**BOOK, **bump})
+    return {**first, **second}[name]
+
+def _difference(function, variable):
+    step = 1e-5 * np.maximum(BOOK[variable], 1.0)
+    up = function(**{variable: BOOK[variable] + step})
+    down = function(**{variable: BOOK[variable] - step})
+    return (up - down) / (2 * step)
+
+def _price(**bump):
+    return black_scholes_batch(TYPES, **{**BOOK, **bump})
+
+@pytest.mark.parametrize("name, variable", [("Delta", "S"), ("Vega", "sigma"), ("Theta", "T"), ("Rho", "r")])
+def test_first_order(name, variable):
+    np.testing.assert_allclose(_greek(name), _difference(_price, variable), rtol=1e-5, atol=1e-7)
+
+@pytest.mark.parametrize("name, base, variable", [
+    ("Gamma", "Delta", "S"), ("Vanna", "Delta", "sigma"), ("Charm", "Delta", "T"), ("Speed", "Gamma", "S"),
+    ("Color", "Gamma", "T"), ("Zomma", "Gamma", "sigma"), ("Veta", "Vega", "T"), ("Volga", "Vega", "sigma")])
+def test_second_order(name, base, variable):
+    expected = _difference(lambda **bump: _greek(base, **bump), variable)
+    np.testing.assert_allclose(_greek(name), expected, rtol=1e-5, atol=1e-7 * np.abs(_greek(base)).max())
+
+def test_batch_price_matches_scalar():
+    prices = black_scholes_batch(TYPES, **BOOK)
+    for i in range(0, N, 9):
+        scalar = black_scholes(TYPES[i], *(BOOK[name][i] for name in ("S", "K", "T", "r", "sigma", "q")))
+        assert prices[i] == pytest.approx(scalar, rel=1e-12, abs=1e-12)
+
+def test_scalar_inputs_and_errors():
+    first, second = calculate_greeks_black_scholes("Call", 100, 100, 1, 0.05, 0.2)
+    assert first["Delta"] == pytest.approx(0.6368306511756191, rel=1e-12)
+    assert first["Gamma"] == pytest.approx(0.018762017345846895, rel=1e-12)
+    with pytest.raises(ValueError, match="Volatility"):
+        calculate_greeks_black_scholes("Call", 100, 100, 1, 0.05, 0.0)
+    with pytest.raises(ValueError, match="Invalid option type"):
+        calculate_greeks_black_scholes("call", 100, 100, 1, 0.05, 0.2)
+
+#single-pass monte carlo greeks against the closed form, within a few standard errors
+@pytest.mark.parametrize("option_type, S, K", [("Call", 100.0, 100.0), ("Put", 100.0, 110.0), ("Call", 90.0, 80.0)])
+def test_monte_carlo_greeks_match_closed_form(option_type, S, K):
+    args = (option_type, S, K, 0.75, 0.03, 0.25, 0.01)
+    first, second = calculate_greeks_black_scholes(*args)
+    exact = {**first, **second}
+    estimates = monte_carlo_greeks(*args, num_simulations=400000, random_numbers=11)
+    assert set(estimates) == set(exact)
+    for name, (value, std_error) in estimates.items():
+        assert abs(value - exact[name]) < 5 * std_error, (name, value, exact[name], std_error)
+
+def test_monte_carlo_greeks_are_reproducible():
+    args = ("Put", 100.0, 95.0, 0.5, 0.02, 0.3)
+    first, second, std_errors = calculate_greeks_monte_carlo(*args, num_simulations=20000, seed=12,
+                                                             return_std_errors=True)
+    again, _ = calculate_greeks_monte_carlo(*args, num_simulations=20000, seed=12)
+    assert first == again
+    assert set(std_errors) == set(first) | set(second)
+    assert all(error > 0 for error in std_errors.values())
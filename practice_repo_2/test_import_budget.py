@@ -0,0 +1,16 @@
+
+from src.utils.import_budget import BUDGET_MS, CORE_MODULES, check_import_budget
+
+#the import-time budget as tests, so the regular test run enforces it (run from the project root)
+#which modules get imported is deterministic and checked strictly; wall-clock time is noisy on shared ci runners,
+#so it takes the best of several runs and only fails past a generous multiple of the budget
+TIME_SLACK = 4
+
+def test_core_imports_stay_lazy():
+    results, _ = check_import_budget(budget_ms=float("inf"), repeats=1)
+    assert set(results) == set(CORE_MODULES)
+    assert {module: leaked for module, (_, leaked) in results.items() if leaked} == {}
+
+def test_import_time():
+    _, failures = check_import_budget(budget_ms=TIME_SLACK * BUDGET_MS, forbidden=[], repeats=5)
+    assert failures == []
@@ -0,0 +1,93 @@
+
+import numpy as np
+import pytest
+
+from src.models.black_scholes import black_scholes
+from src.models.monte_carlo import monte_carlo_estimate, monte_carlo_simulation
+
+#monte carlo prices against the closed form, within a few standard errors
+
+ARGS = ("Call", 100.0, 105.0, 1.0, 0.05, 0.2, 0.01)
+
+def _within(estimate, std_error, exact, errors=4):
+    assert abs(estimate - exact) < errors * std_error, (estimate, exact, std_error)
+
+@pytest.mark.parametrize("option_type", ["Call", "Put"])
+def test_exact_method_matches_black_scholes(option_type):
+    args = (option_type,) + ARGS[1:]
+    price, std_error, vr_factor = monte_carlo_estimate(*args, num_simulations=200000, random_numbers=1)
+    _within(price, std_error, black_scholes(*args))
+    assert vr_factor == pytest.approx(1.0)
+
+def test_path_method_matches_black_scholes():
+    price, std_error, _ = monte_carlo_estimate(*ARGS, num_simulations=20000, random_numbers=2, method="path")
+    _within(price, std_error, black_scholes(*ARGS))
+
+def test_chunk_size_does_not_change_the_result():
+    # the chunks continue one stream, only memory use depends on chunk_size
+    prices = [monte_carlo_simulation(*ARGS, num_simulations=30000, random_numbers=3, chunk_size=size)
+              for size in (30000, 4096, 1000)]
+    assert prices[1] == pytest.approx(prices[0], rel=1e-12)
+    assert prices[2] == pytest.approx(prices[0], rel=1e-12)
+
+def test_legacy_daily_shocks():
+    # the old (num_simulations, 365) array: S_T from the cumulative daily shocks, as the original loop did
+    rng = np.random.default_rng(4)
+    shocks = rng.standard_normal((5000, 365))
+    S, K, T, r, sigma, q = ARGS[1:]
+    dt = T / 365
+    ST = S * np.exp(np.sum((r - q - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * shocks, axis=1))
+    expected = np.exp(-r * T) * np.maximum(ST - K, 0).mean()
+    assert monte_carlo_simulation(*ARGS, num_simulations=5000, random_numbers=shocks, chunk_size=700) \
+        == pytest.approx(expected, rel=1e-10)
+
+def test_same_seed_same_price():
+    assert monte_carlo_simulation(*ARGS, random_numbers=5) == monte_carlo_simulation(*ARGS, random_numbers=5)
+    assert monte_carlo_simulation(*ARGS, random_numbers=5) != monte_carlo_simulation(*ARGS, random_numbers=6)
+
+@pytest.mark.parametrize("options", [{"antithetic": True}, {"control_variate": True},
+                                     {"antithetic": True, "moment_matching": True, "control_variate": True}])
+def test_variance_reduction_matches_black_scholes(options):
+    plain = monte_carlo_estimate(*ARGS, num_simulations=100000, random_numbers=7)
+    price, std_error, vr_factor = monte_carlo_estimate(*ARGS, num_simulations=100000, random_numbers=7, **options)
+    _within(price, std_error, black_scholes(*ARGS))
+    assert std_error < plain[1]
+    assert vr_factor > 1
+
+def test_moment_matching_centres_each_chunk():
+    #matched shocks pin the mean and spread of log S_T, so a zero strike call sits on the discounted forward
+    #much closer than the plain standard error (about 0.3% here)
+    S, T, r, q = 100.0, 1.0, 0.05, 0.01
+    price, _, _ = monte_carlo_estimate("Call", S, 1e-12, T, r, 0.3, q, num_simulations=9000, random_numbers=8,
+                                       moment_matching=True, chunk_size=3000)
+    assert price == pytest.approx(S * np.exp(-q * T), rel=1e-3)
+
+def test_sobol_method_beats_pseudo_random():
+    #independent scrambles of the same sobol run, their spread against the pseudo-random standard error
+    exact = black_scholes(*ARGS)
+    prices = np.array([monte_carlo_simulation(*ARGS, num_simulations=4096, random_numbers=seed, method="sobol",
+                                              chunk_size=1024) for seed in range(10)])
+    _, std_error, _ = monte_carlo_estimate(*ARGS, num_simulations=4096, random_numbers=9)
+    assert abs(prices.mean() - exact) < 4 * prices.std(ddof=1) / np.sqrt(prices.size)
+    assert prices.std(ddof=1) < std_error / 10
+
+def test_workers_are_reproducible_across_backends():
+    #each shard has its own spawned stream and the sums are added in shard order
+    threads = monte_carlo_estimate(*ARGS, num_simulations=60000, random_numbers=10, workers=3, backend="thread",
+                                   antithetic=True)
+    processes = monte_carlo_estimate(*ARGS, num_simulations=60000, random_numbers=10, workers=3, backend="process",
+                                     antithetic=True)
+    assert threads == processes
+    _within(threads[0], threads[1], black_scholes(*ARGS))
+    assert monte_carlo_estimate(*ARGS, num_simulations=60000, random_numbers=10, workers=2, backend="thread",
+                                antithetic=True) != threads
+
+@pytest.mark.parametrize("bad, match", [
+    ({"num_simulations": 0}, "Number of simulations"), ({"chunk_size": 0}, "chunk_size"),
+    ({"method": "euler"}, "Invalid method"), ({"random_numbers": np.zeros((10, 365))}, "shape"),
+    ({"antithetic": True, "num_simulations": 101}, "Antithetic"), ({"antithetic": True, "chunk_size": 33}, "Antithetic"),
+    ({"workers": 2, "backend": "cluster"}, "Invalid backend"),
+    ({"workers": 2, "random_numbers": np.random.default_rng(0)}, "Parallel runs need a seed")])
+def test_errors(bad, match):
+    with pytest.raises(ValueError, match=match):
+        monte_carlo_simulation(*ARGS, **{"num_simulations": 100, **bad})
@@ -0,0 +1,79 @@
+
+import threading
+import numpy as np
+import pytest
+
+from src.greeks.calculate_greeks import calculate_greeks_black_scholes, calculate_greeks_monte_carlo
+from src.utils.pricing_cache import PricingCache, cached_greeks, greeks_key
+
+#the dashboard cache: lru order, entry and memory bounds, key normalization, and cached greeks equal to a fresh run
+
+def test_hits_and_misses():
+    cache = PricingCache()
+    calls = []
+    compute = lambda: calls.append(1) or 42.0
+    assert cache.get_or_compute("a", compute) == 42.0
+    assert cache.get_or_compute("a", compute) == 42.0
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["hit_rate"]) == (1, 1, 1, 0.5)
+
+def test_least_recently_used_entry_goes_first():
+    cache = PricingCache(max_entries=2)
+    cache.get_or_compute("a", lambda: 1)
+    cache.get_or_compute("b", lambda: 2)
+    cache.get_or_compute("a", lambda: 0)  #touch a, so b is now the oldest
+    cache.get_or_compute("c", lambda: 3)
+    assert cache.get_or_compute("a", lambda: -1) == 1
+    assert cache.get_or_compute("b", lambda: -2) == -2
+    assert cache.stats()["evictions"] == 2
+
+def test_memory_bound():
+    array = np.zeros(1000)
+    cache = PricingCache(max_bytes=3 * array.nbytes)
+    for key in range(5):
+        cache.get_or_compute(key, lambda: np.zeros(1000))
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] <= 3 * array.nbytes
+    #a value larger than the whole budget is returned but never stored
+    big = cache.get_or_compute("big", lambda: np.zeros(10000))
+    assert big.size == 10000 and cache.stats()["entries"] == 2
+    cache.clear()
+    assert cache.stats() == {"hits": 0, "misses": 0, "evictions": 0, "hit_rate": 0.0, "entries": 0, "bytes": 0}
+
+def test_concurrent_lookups_keep_one_entry():
+    cache = PricingCache()
+    barrier = threading.Barrier(4)
+    def lookup():
+        barrier.wait()
+        cache.get_or_compute("k", lambda: np.ones(100))
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["entries"] == 1 and stats["hits"] + stats["misses"] == 4
+    #a value computed twice by racing threads is only counted once
+    single = PricingCache()
+    single.get_or_compute("k", lambda: np.ones(100))
+    assert stats["bytes"] == single.stats()["bytes"]
+
+def test_key_normalization():
+    assert greeks_key("call", 100, 100, 1, 0.05, 0.2, 0, 1000) == greeks_key("Call", 100.0, 100.0, 1.0, 5 / 100, 0.2, 0.0, 1000.0)
+    assert greeks_key("Call", 100, 100, 1, 0.05, 0.2, 0, 1000) != greeks_key("Call", 100, 100, 1, 0.05, 0.2, 0, 1000, seed=1)
+
+def test_cached_greeks_match_a_fresh_run():
+    cache = PricingCache()
+    args = ("Put", 100.0, 105.0, 0.5, 0.03, 0.25, 0.01)
+    first_bs, second_bs, first_mc, second_mc = cached_greeks(*args, num_simulations=5000, seed=7, cache=cache)
+    assert (first_bs, second_bs) == calculate_greeks_black_scholes(*args)
+    assert (first_mc, second_mc) == calculate_greeks_monte_carlo(*args, num_simulations=5000, seed=7)
+    #monte carlo greeks sit on the closed form within the simulation noise
+    assert first_mc["Delta"] == pytest.approx(first_bs["Delta"], abs=0.02)
+    assert cached_greeks(*args, num_simulations=5000, seed=7, cache=cache)[2] is first_mc
+
+def test_unseeded_run_is_repeated_from_the_cache():
+    cache = PricingCache()
+    first = cached_greeks("Call", 100, 100, 1, 0.05, 0.2, num_simulations=2000, cache=cache)
+    assert cached_greeks("Call", 100, 100, 1, 0.05, 0.2, num_simulations=2000, cache=cache) is first
@@ -0,0 +1,263 @@
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from black_scholes import call_mask
+from greeks import greeks_batch
+from volatality import IV_OK, implied_volatility_batch
+
+# headless end-of-day pipeline for option chain files
+# quotes are streamed from csv / parquet / .npy (memory-mapped) in chunks of chunk_size rows; every chunk gets
+# implied vols (from the price column) and black-scholes price and greeks in one vectorized pass, and is
+# appended to the output file before the next one is read. at most 2 * workers chunks are in flight, so memory
+# stays flat however large the file is:
+#     python batch_pipeline.py chain.csv results.parquet --chunk-size 200000 --workers 4 --r 0.03
+# columns: S0, strike, T, r, q, option_type, sigma and the price column (lastPrice by default); any of them
+# except strike can instead be given once for the whole file on the command line (--S0, --r, ...)
+# results: the input columns plus impliedVol, ivStatus, and price/delta/gamma/vega/theta/rho at sigma when
+# given, else at the implied vol (raw units as in greeks_batch)
+# csv output is bound by pandas' number formatting (several times the cost of the pricing itself); parquet
+# (needs pyarrow) and .npy are columnar binary and much faster
+
+GREEK_COLUMNS = ('price', 'delta', 'gamma', 'vega', 'theta', 'rho')
+
+
+def _pyarrow():
+    # parquet support is optional, csv and .npy files work without it
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("parquet files need pyarrow installed (pip install pyarrow); "
+                          "use .csv or .npy files otherwise") from None
+    return pyarrow
+
+
+def read_chunks(path, chunk_size=100000):
+    # yields DataFrames of at most chunk_size rows
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(path, chunksize=chunk_size)
+    elif extension == '.parquet':
+        for batch in _pyarrow().parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    elif extension == '.npy':
+        # structured array (one field per column), memory-mapped: only the chunk being read is paged in
+        records = np.load(path, mmap_mode='r')
+        if records.dtype.names is None:
+            raise ValueError(".npy input must be a structured array with one field per column")
+        for start in range(0, records.shape[0], chunk_size):
+            chunk = records[start:start + chunk_size]
+            yield pd.DataFrame({name: _decode(np.asarray(chunk[name])) for name in records.dtype.names})
+    else:
+        raise ValueError(f"unsupported input format '{extension}' (csv, parquet or npy)")
+
+
+def count_rows(path):
+    # row count without loading the data (needed up front by the .npy writer)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        return np.load(path, mmap_mode='r').shape[0]
+    if extension == '.parquet':
+        return _pyarrow().parquet.ParquetFile(path).metadata.num_rows
+    # csv: a real parse of the first column, so quoted line breaks, blank lines and a missing final newline count
+    # the same way read_chunks sees them
+    return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[0], chunksize=1 << 20))
+
+
+def _decode(values):
+    return values.astype(str) if values.dtype.kind == 'S' else values
+
+
+def process_chunk(chunk, price_column='lastPrice', defaults=None):
+    # implied vol and greeks for one chunk; defaults fill columns the file does not have
+    defaults = dict(defaults or {})
+    if 'strike' not in chunk.columns:
+        raise ValueError("The option chain must contain a 'strike' column.")
+
+    def column(name, fallback=None):
+        if name in chunk.columns:
+            return chunk[name].to_numpy()
+        if name in defaults:
+            return defaults[name]
+        if fallback is not None:
+            return fallback
+        raise ValueError(f"No '{name}' column in the chain and no --{name} default given")
+
+    S0, T, r = (np.asarray(column(name), dtype=float) for name in ('S0', 'T', 'r'))
+    q = np.asarray(column('q', 0.0), dtype=float)
+    strike = chunk['strike'].to_numpy(dtype=float)
+    is_call = np.broadcast_to(call_mask(column('option_type', 'call')), strike.shape)
+    result = chunk.copy()
+
+    vol = None
+    if price_column in chunk.columns:
+        implied_vol, status = implied_volatility_batch(chunk[price_column].to_numpy(dtype=float), S0, strike, T, r,
+                                                       q, is_call)
+        result['impliedVol'] = implied_vol
+        result['ivStatus'] = status
+        vol = np.where(status == IV_OK, implied_vol, np.nan)
+    if 'sigma' in chunk.columns or 'sigma' in defaults:
+        vol = np.broadcast_to(np.asarray(column('sigma'), dtype=float), strike.shape)
+    if vol is None:
+        raise ValueError(f"Need a '{price_column}' column to invert or a sigma to price with")
+
+    # greeks only where there is a usable vol and contract, nan elsewhere (unsolvable quotes, bad rows)
+    S0, T, r, q = (np.broadcast_to(a, strike.shape) for a in (S0, T, r, q))
+    ok = (vol > 0) & (S0 > 0) & (strike > 0) & (T > 0)
+    greeks = greeks_batch(S0[ok], strike[ok], T[ok], r[ok], vol[ok], q[ok], is_call[ok])
+    for name in GREEK_COLUMNS:
+        values = np.full(strike.shape, np.nan)
+        values[ok] = greeks[name]
+        result[name] = values
+    return result
+
+
+class _CsvWriter:
+    def __init__(self, path, total_rows=None):
+        self.path = path
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    def close(self, check=True):
+        pass
+
+
+class _ParquetWriter:
+    # one row group per chunk
+    def __init__(self, path, total_rows=None):
+        self.pyarrow = _pyarrow()
+        self.path = path
+        self.writer = None
+
+    def write(self, frame):
+        table = self.pyarrow.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self, check=True):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _NpyWriter:
+    # structured .npy written through a memory map, sized from the input row count; text columns get the
+    # width of the first chunk (at least 16 characters)
+    def __init__(self, path, total_rows):
+        self.path = path
+        self.total_rows = total_rows
+        self.records = None
+        self.position = 0
+
+    def write(self, frame):
+        columns = {name: np.asarray(frame[name]) for name in frame.columns}
+        if self.records is None:
+            dtype = [(name, _field_dtype(values)) for name, values in columns.items()]
+            self.records = np.lib.format.open_memmap(self.path, mode='w+', dtype=dtype, shape=(self.total_rows,))
+        rows = slice(self.position, self.position + len(frame))
+        for name, values in columns.items():
+            field = self.records.dtype[name]
+            if field.kind == 'U' and values.size and max(map(len, values.astype(str))) > field.itemsize // 4:
+                raise ValueError(f"column '{name}' has values longer than {field.itemsize // 4} characters, "
+                                 "write .csv or .parquet instead")
+            self.records[name][rows] = values
+        self.position = rows.stop
+
+    def close(self, check=True):
+        # check: the file must be full, skipped when the run failed (the caller removes the file then)
+        if self.records is not None:
+            self.records.flush()
+            self.records = None
+        if check and self.position != self.total_rows:
+            raise ValueError(f"wrote {self.position} rows into a .npy sized for {self.total_rows}")
+
+
+def _field_dtype(values):
+    if values.dtype.kind in 'OUS':
+        return f"U{max(16, max(map(len, values.astype(str)), default=0))}"
+    return values.dtype.str
+
+
+WRITERS = {'.csv': _CsvWriter, '.parquet': _ParquetWriter, '.npy': _NpyWriter}
+
+
+def run_pipeline(input_path, output_path, chunk_size=100000, workers=None, price_column='lastPrice', defaults=None):
+    # workers None runs in this process; otherwise chunks go to a process pool, results are written in order
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in WRITERS:
+        raise ValueError(f"unsupported output format '{extension}' (csv, parquet or npy)")
+    writer = WRITERS[extension](output_path, count_rows(input_path) if extension == '.npy' else None)
+    chunks = read_chunks(input_path, chunk_size)
+    stats = {'rows': 0, 'chunks': 0, 'iv_failures': 0}
+    start = time.perf_counter()
+
+    def consume(result):
+        # counted before the write, so a failed first write still counts as having touched the output
+        stats['chunks'] += 1
+        writer.write(result)
+        stats['rows'] += len(result)
+        if 'ivStatus' in result:
+            stats['iv_failures'] += int((result['ivStatus'] != IV_OK).sum())
+
+    try:
+        if workers is None:
+            for chunk in chunks:
+                consume(process_chunk(chunk, price_column, defaults))
+        else:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(process_chunk, chunk, price_column, defaults))
+                    # bounded read-ahead keeps memory flat
+                    if len(pending) >= 2 * workers:
+                        consume(pending.popleft().result())
+                while pending:
+                    consume(pending.popleft().result())
+    except BaseException:
+        # no partial output that could pass for a complete one, and the original error surfaces
+        writer.close(check=False)
+        if stats['chunks'] and os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    writer.close()
+
+    stats['seconds'] = time.perf_counter() - start
+    stats['rows_per_sec'] = stats['rows'] / max(stats['seconds'], 1e-12)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Implied vols and greeks for option chain files, chunk by chunk")
+    parser.add_argument('input', help="chain file (.csv, .parquet or structured .npy)")
+    parser.add_argument('output', help="results file (.csv, .parquet or .npy)")
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=None, help="process pool size (0 = one per core)")
+    parser.add_argument('--price-column', default='lastPrice')
+    for name in ('S0', 'T', 'r', 'q', 'sigma'):
+        parser.add_argument(f'--{name}', type=float, help=f"{name} for every row without a '{name}' column")
+    parser.add_argument('--option-type', choices=('call', 'put'), help="option type for every row")
+    args = parser.parse_args(argv)
+
+    defaults = {name: getattr(args, name) for name in ('S0', 'T', 'r', 'q', 'sigma') if getattr(args, name) is not None}
+    if args.option_type is not None:
+        defaults['option_type'] = args.option_type
+    stats = run_pipeline(args.input, args.output, args.chunk_size, args.workers, args.price_column, defaults)
+    print(f"{stats['rows']:,} rows in {stats['chunks']} chunks, {stats['seconds']:.2f} s "
+          f"({stats['rows_per_sec']:,.0f} rows/s), {stats['iv_failures']:,} quotes without an implied vol")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
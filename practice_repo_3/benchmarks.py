@@ -0,0 +1,1065 @@
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import brentq
+from scipy.stats import norm
+
+from batch_pipeline import run_pipeline
+from binomial_tree import BinomialTreeModel
+from calibration import HestonCalibrator
+from cev import CEVModel
+from black_scholes import BlackScholesModel, price_batch
+from greeks import Greeks, greeks_batch
+from heston import HestonModel, heston_cos_prices
+from instrumentation import profile
+import kernels
+from monte_carlo import MonteCarloModel
+from parallel import default_workers
+from pde import FiniteDifferenceModel
+from portfolio import Portfolio, scenario_grid
+from pricing_grid import PricingGrid
+from qmc import PseudoRandomSampler, SobolSampler
+from repricing_service import demo_instruments, run_demo
+from streaming_volatility import (CloseToCloseVolatility, EWMAVolatility, GarmanKlassVolatility, ParkinsonVolatility,
+                                  YangZhangVolatility)
+from volatality import VolatilityMeasures, implied_volatility_batch
+
+# throughput benchmarks for the vectorized engines against the original one-contract-at-a-time code
+# run all of them with `python benchmarks.py` or a single one with `python benchmarks.py black_scholes_batch`
+# `python benchmarks.py --suite --json results.json` runs the reproducible suite at the end of this file instead
+# and `--compare baseline.json` checks it against an earlier run (exit status 1 on a regression)
+
+
+def random_book(n_contracts, seed=0):
+    # reproducible book of contracts spread around the money
+    rng = np.random.default_rng(seed)
+    return {
+        'S0': rng.uniform(50, 150, n_contracts),
+        'X': rng.uniform(50, 150, n_contracts),
+        'T': rng.uniform(0.05, 2.0, n_contracts),
+        'r': rng.uniform(0.0, 0.05, n_contracts),
+        'sigma': rng.uniform(0.1, 0.6, n_contracts),
+        'q': rng.uniform(0.0, 0.03, n_contracts),
+        'is_call': rng.random(n_contracts) < 0.5,
+    }
+
+
+def bench_black_scholes_batch(n_contracts=20000, seed=0):
+    book = random_book(n_contracts, seed)
+
+    # current approach: one BlackScholesModel per contract
+    start = time.perf_counter()
+    loop_prices = np.empty(n_contracts)
+    for i in range(n_contracts):
+        model = BlackScholesModel(book['S0'][i], book['X'][i], book['T'][i], book['r'][i], book['sigma'][i], book['q'][i])
+        loop_prices[i] = model.call_price() if book['is_call'][i] else model.put_price()
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_prices = price_batch(book['S0'], book['X'], book['T'], book['r'], book['sigma'], book['q'], book['is_call'])
+    batch_time = time.perf_counter() - start
+
+    result = {
+        'contracts': n_contracts,
+        'loop_contracts_per_sec': n_contracts / loop_time,
+        'batch_contracts_per_sec': n_contracts / batch_time,
+        'speedup': loop_time / batch_time,
+        'max_abs_diff': float(np.max(np.abs(loop_prices - batch_prices))),
+    }
+    print(f"Black-Scholes batch ({n_contracts:,} contracts): "
+          f"loop {result['loop_contracts_per_sec']:,.0f}/s, batch {result['batch_contracts_per_sec']:,.0f}/s, "
+          f"speedup {result['speedup']:.0f}x, max diff {result['max_abs_diff']:.2e}")
+    return result
+
+
+def bench_greeks_batch(n_contracts=5000, seed=0):
+    book = random_book(n_contracts, seed)
+
+    # current approach: each greek method recomputes d1/d2 and the normal cdf on its own
+    start = time.perf_counter()
+    for i in range(n_contracts):
+        greeks = Greeks(book['S0'][i], book['X'][i], book['T'][i], book['r'][i], book['sigma'][i], book['q'][i])
+        option_type = 'call' if book['is_call'][i] else 'put'
+        greeks.delta(option_type), greeks.gamma(), greeks.theta(option_type), greeks.vega(), greeks.rho(option_type)
+    loop_time = time.perf_counter() - start
+
+    # fused kernel also returns the price and all seven second-order greeks
+    start = time.perf_counter()
+    greeks_batch(book['S0'], book['X'], book['T'], book['r'], book['sigma'], book['q'], book['is_call'])
+    batch_time = time.perf_counter() - start
+
+    result = {
+        'contracts': n_contracts,
+        'loop_contracts_per_sec': n_contracts / loop_time,
+        'batch_contracts_per_sec': n_contracts / batch_time,
+        'speedup': loop_time / batch_time,
+    }
+    print(f"Greeks batch ({n_contracts:,} contracts): "
+          f"loop {result['loop_contracts_per_sec']:,.0f}/s, fused {result['batch_contracts_per_sec']:,.0f}/s, "
+          f"speedup {result['speedup']:.0f}x")
+    return result
+
+
+def bench_implied_vol_chain(n_rows=50000, n_loop_rows=2000, seed=0):
+    book = random_book(n_rows, seed)
+    prices = price_batch(book['S0'], book['X'], book['T'], book['r'], book['sigma'], book['q'], book['is_call'])
+
+    # current approach: one scalar brentq per quote with a closure around the bs formula
+    start = time.perf_counter()
+    for i in range(n_loop_rows):
+        model = BlackScholesModel(book['S0'][i], book['X'][i], book['T'][i], book['r'][i], 0.2, book['q'][i])
+        price_fn = model.call_price if book['is_call'][i] else model.put_price
+
+        def objective(sigma):
+            model.sigma = sigma
+            return price_fn() - prices[i]
+        try:
+            brentq(objective, 1e-6, 10)
+        except ValueError:
+            pass
+    loop_time = time.perf_counter() - start
+
+    # chain solver, one row per quote with its own spot
+    chain = pd.DataFrame({'strike': book['X'], 'lastPrice': prices, 'T': book['T'],
+                          'option_type': np.where(book['is_call'], 'call', 'put')})
+    measures = VolatilityMeasures(None)
+    result = measures.implied_volatility_chain(chain, book['S0'], book['r'], book['q'])
+    solved = result['ivStatus'].to_numpy() == 0
+
+    stats = {
+        'rows': n_rows,
+        'loop_rows_per_sec': n_loop_rows / loop_time,
+        'chain_rows_per_sec': measures.chain_stats['rows_per_sec'],
+        'speedup': measures.chain_stats['rows_per_sec'] * loop_time / n_loop_rows,
+        'status_counts': np.bincount(result['ivStatus'], minlength=5).tolist(),
+        'max_vol_error': float(np.max(np.abs(result['impliedVol'].to_numpy()[solved] - book['sigma'][solved]))),
+    }
+    print(f"Implied vol chain ({n_rows:,} rows): brentq loop {stats['loop_rows_per_sec']:,.0f} rows/s, "
+          f"chain {stats['chain_rows_per_sec']:,.0f} rows/s, speedup {stats['speedup']:.0f}x, "
+          f"status counts {stats['status_counts']}, max vol error {stats['max_vol_error']:.1e}")
+    return stats
+
+
+def _loop_tree_price(model, option_type='call'):
+    # the original nested-loop induction, kept only as the timing baseline
+    ST = np.array([model.S0 * (model.u ** i) * (model.d ** (model.N - i)) for i in range(model.N + 1)])
+    sign = 1.0 if option_type == 'call' else -1.0
+    option_values = np.maximum(sign * (ST - model.X), 0)
+    for j in range(model.N - 1, -1, -1):
+        for i in range(j + 1):
+            option_values[i] = np.exp(-model.r * model.dt) * (model.p * option_values[i + 1] + (1 - model.p) * option_values[i])
+    return option_values[0]
+
+
+def bench_binomial_convergence(steps=(100, 250, 500, 1000, 2500, 5000), loop_steps=500):
+    S0, X, T, r, sigma = 100.0, 100.0, 1.0, 0.05, 0.2
+    european_ref = BlackScholesModel(S0, X, T, r, sigma).put_price()
+    american_ref = BinomialTreeModel(S0, X, T, r, sigma, 20000).price('put', 'american', richardson=True)
+
+    start = time.perf_counter()
+    _loop_tree_price(BinomialTreeModel(S0, X, T, r, sigma, loop_steps), 'put')
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    BinomialTreeModel(S0, X, T, r, sigma, loop_steps).price('put')
+    vector_time = time.perf_counter() - start
+    print(f"Binomial tree N={loop_steps}: nested loop {loop_time * 1e3:.1f} ms, vectorized {vector_time * 1e3:.2f} ms, "
+          f"speedup {loop_time / vector_time:.0f}x")
+
+    # convergence vs time: european put error against black-scholes, american put against a fine richardson tree
+    rows = []
+    for N in steps:
+        model = BinomialTreeModel(S0, X, T, r, sigma, N)
+        for exercise, reference in (('european', european_ref), ('american', american_ref)):
+            for richardson in (False, True):
+                start = time.perf_counter()
+                value = model.price('put', exercise, richardson=richardson)
+                elapsed = time.perf_counter() - start
+                rows.append({'N': N, 'exercise': exercise, 'richardson': richardson,
+                             'ms': elapsed * 1e3, 'abs_error': abs(value - reference)})
+    table = pd.DataFrame(rows)
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+    return {'loop_ms': loop_time * 1e3, 'vector_ms': vector_time * 1e3, 'convergence': rows}
+
+
+def bench_heston_memory(num_simulations=100000, num_steps=252, batch_size=20000):
+    params = dict(S0=100, X=100, T=1.0, r=0.05, kappa=2.0, theta=0.04, sigma=0.3, v0=0.04, rho=-0.7,
+                  num_simulations=num_simulations, num_steps=num_steps)
+
+    # full (num_simulations, num_steps + 1) S and v matrices
+    tracemalloc.start()
+    start = time.perf_counter()
+    paths = HestonModel(**params, seed=0).simulate_price_paths()
+    np.exp(-params['r'] * params['T']) * np.mean(np.maximum(paths[:, -1] - params['X'], 0))
+    matrix_time = time.perf_counter() - start
+    matrix_peak = tracemalloc.get_traced_memory()[1]
+    del paths
+
+    # rolling state, batch_size paths at a time
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    price, std_error = HestonModel(**params, batch_size=batch_size, seed=0).price_and_std_error('call')
+    rolling_time = time.perf_counter() - start
+    rolling_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        'paths': num_simulations, 'steps': num_steps,
+        'matrix_seconds': matrix_time, 'matrix_peak_mb': matrix_peak / 1e6,
+        'rolling_seconds': rolling_time, 'rolling_peak_mb': rolling_peak / 1e6,
+        'price': price, 'std_error': std_error,
+    }
+    print(f"Heston {num_simulations:,} paths x {num_steps} steps: matrix {matrix_time:.2f} s / {matrix_peak / 1e6:,.0f} MB, "
+          f"rolling {rolling_time:.2f} s / {rolling_peak / 1e6:,.1f} MB, price {price:.4f} +- {std_error:.4f}")
+    return result
+
+
+def bench_variance_reduction(num_simulations=50000, seed=0):
+    # same path budget for every estimator; vr_factor is how many times fewer paths reach the same std error
+    settings = {
+        'plain': {},
+        'antithetic': {'antithetic': True},
+        'moment matching': {'moment_matching': True},
+        'control variates': {'control_variates': ('spot', 'black_scholes')},
+        'antithetic + control variates': {'antithetic': True, 'control_variates': ('spot', 'black_scholes')},
+    }
+    rows = []
+    for label, options in settings.items():
+        heston = HestonModel(100, 100, 1.0, 0.05, 2.0, 0.04, 0.3, 0.04, -0.7, num_simulations=num_simulations,
+                             num_steps=100, seed=seed)
+        start = time.perf_counter()
+        result = heston.estimate('call', **options)
+        rows.append({'model': 'heston', 'estimator': label, 'price': result['price'], 'std_error': result['std_error'],
+                     'vr_factor': result['vr_factor'], 'seconds': time.perf_counter() - start})
+
+        gbm_options = dict(options, control_variates=('spot',)) if 'control_variates' in options else options
+        gbm = MonteCarloModel(100, 100, 1.0, 0.05, 0.2, num_simulations=num_simulations, num_steps=50, seed=seed)
+        start = time.perf_counter()
+        result = gbm.estimate('call', **gbm_options)
+        rows.append({'model': 'gbm', 'estimator': label, 'price': result['price'], 'std_error': result['std_error'],
+                     'vr_factor': result['vr_factor'], 'seconds': time.perf_counter() - start})
+
+    print(pd.DataFrame(rows).sort_values('model').to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return rows
+
+
+def _geometric_asian_call(S0, X, T, r, sigma, num_steps):
+    # closed form for a discretely monitored geometric average call (path-dependent reference)
+    dt = T / num_steps
+    mean = np.log(S0) + (r - 0.5 * sigma ** 2) * dt * (num_steps + 1) / 2
+    std = sigma * np.sqrt(dt * (num_steps + 1) * (2 * num_steps + 1) / (6 * num_steps))
+    d2 = (mean - np.log(X)) / std
+    return np.exp(-r * T) * (np.exp(mean + 0.5 * std ** 2) * norm.cdf(d2 + std) - X * norm.cdf(d2))
+
+
+def bench_qmc_convergence(path_counts=(2 ** 10, 2 ** 12, 2 ** 14, 2 ** 16), replications=8, num_steps=32):
+    S0, X, T, r, sigma = 100.0, 100.0, 1.0, 0.05, 0.2
+    european_ref = BlackScholesModel(S0, X, T, r, sigma).call_price()
+    asian_ref = _geometric_asian_call(S0, X, T, r, sigma, num_steps)
+
+    # rmse over independent replications (fresh seed / fresh scramble) against the closed forms
+    rows = []
+    for n in path_counts:
+        model = MonteCarloModel(S0, X, T, r, sigma, num_simulations=n, num_steps=num_steps)
+        for label, make_sampler in (('pseudo', PseudoRandomSampler), ('sobol + bridge', SobolSampler)):
+            european_errors, asian_errors = [], []
+            start = time.perf_counter()
+            for seed in range(replications):
+                paths = model.simulate_price_paths(make_sampler(seed))
+                european = np.exp(-r * T) * np.maximum(paths[:, -1] - X, 0).mean()
+                geometric_mean = np.exp(np.log(paths[:, 1:]).mean(axis=1))
+                asian = np.exp(-r * T) * np.maximum(geometric_mean - X, 0).mean()
+                european_errors.append(european - european_ref)
+                asian_errors.append(asian - asian_ref)
+            elapsed = (time.perf_counter() - start) / replications
+            rows.append({'paths': n, 'sampler': label, 'ms_per_run': elapsed * 1e3,
+                         'european_rmse': float(np.sqrt(np.mean(np.square(european_errors)))),
+                         'asian_rmse': float(np.sqrt(np.mean(np.square(asian_errors))))})
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+    return rows
+
+
+def bench_parallel_scaling(num_simulations=200000, num_steps=100, seed=0, backend='process'):
+    # heston paths sharded over 1, 2, 4, ... workers up to the core count; every run is repeated to check
+    # that a fixed seed and worker count reproduce the price bit for bit
+    counts = sorted({1, 2} | {2 ** k for k in range(default_workers().bit_length())} | {default_workers()})
+    heston = HestonModel(100, 100, 1.0, 0.05, 2.0, 0.04, 0.3, 0.04, -0.7, num_simulations=num_simulations,
+                         num_steps=num_steps, batch_size=20000, seed=seed)
+    rows = []
+    for workers in counts:
+        start = time.perf_counter()
+        result = heston.estimate('call', workers=workers, backend=backend)
+        elapsed = time.perf_counter() - start
+        repeat = heston.estimate('call', workers=workers, backend=backend)
+        rows.append({'workers': workers, 'seconds': elapsed, 'price': result['price'], 'std_error': result['std_error'],
+                     'reproducible': repeat['price'] == result['price']})
+    for row in rows:
+        row['speedup'] = rows[0]['seconds'] / row['seconds']
+    print(f"Heston {num_simulations:,} paths x {num_steps} steps, {backend} pool, {default_workers()} cores")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return rows
+
+
+def bench_heston_cos(n_strikes=(1, 10, 100, 1000), num_simulations=200000, seed=0):
+    # semi-analytic cos prices vs the simulator (antithetic + control variates, 252 steps) on a few strikes,
+    # then throughput of a whole strike grid priced from one characteristic-function evaluation
+    heston = HestonModel(100, 100, 1.0, 0.05, 2.0, 0.04, 0.3, 0.04, -0.7, num_simulations=num_simulations,
+                         num_steps=252, seed=seed)
+    check = []
+    for strike in (80, 100, 120):
+        heston.X = strike
+        start = time.perf_counter()
+        mc = heston.estimate('call', antithetic=True, control_variates=('spot', 'black_scholes'))
+        mc_time = time.perf_counter() - start
+        start = time.perf_counter()
+        cos = heston.cos_price('call')
+        cos_time = time.perf_counter() - start
+        check.append({'strike': strike, 'cos': cos, 'monte_carlo': mc['price'], 'std_error': mc['std_error'],
+                      'z_score': (mc['price'] - cos) / mc['std_error'], 'mc_ms': mc_time * 1e3, 'cos_ms': cos_time * 1e3})
+    print(pd.DataFrame(check).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    rows = []
+    for n in n_strikes:
+        strikes = np.linspace(60, 160, n)
+        repeats = max(1, 2000 // n)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            heston_cos_prices(100, strikes, 1.0, 0.05, 2.0, 0.04, 0.3, 0.04, -0.7)
+        elapsed = (time.perf_counter() - start) / repeats
+        rows.append({'strikes': n, 'ms_per_grid': elapsed * 1e3, 'strikes_per_ms': n / (elapsed * 1e3)})
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return {'check': check, 'throughput': rows}
+
+
+def bench_heston_schemes(steps_per_year=(4, 8, 16, 32, 64, 252), num_simulations=200000, seed=0):
+    # bias against the cos price as the time grid gets coarser; the parameters violate the feller condition
+    # (2 kappa theta = 0.18 < sigma^2 = 1) so the variance keeps hitting zero
+    params = dict(S0=100, X=100, T=1.0, r=0.03, kappa=1.0, theta=0.09, sigma=1.0, v0=0.09, rho=-0.3)
+    reference = HestonModel(**params).cos_price('call')
+    rows = []
+    for scheme in ('euler', 'qe'):
+        for steps in steps_per_year:
+            heston = HestonModel(**params, num_simulations=num_simulations, num_steps=steps, seed=seed, scheme=scheme)
+            start = time.perf_counter()
+            result = heston.estimate('call', antithetic=True, control_variates=('spot',))
+            rows.append({'scheme': scheme, 'steps': steps, 'bias': result['price'] - reference,
+                         'std_error': result['std_error'], 'seconds': time.perf_counter() - start})
+    print(f"reference (cos) {reference:.4f}")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    return rows
+
+
+def _heston_surface(params, S0=100.0, r=0.03, expiries=(0.1, 0.25, 0.5, 1.0, 2.0), strikes=np.linspace(70, 130, 25)):
+    # synthetic out-of-the-money surface priced with the cos method
+    rows = []
+    for T in expiries:
+        calls = heston_cos_prices(S0, strikes, T, r, *params, option_type='call')
+        puts = heston_cos_prices(S0, strikes, T, r, *params, option_type='put')
+        for strike, call, put in zip(strikes, calls, puts):
+            rows.append({'strike': strike, 'T': T, 'option_type': 'call' if strike >= S0 else 'put',
+                         'lastPrice': call if strike >= S0 else put})
+    return pd.DataFrame(rows)
+
+
+def bench_heston_calibration(seed=0, noise_vol=0.002):
+    # fit a noisy synthetic surface cold (analytic vs finite-difference jacobian), then refit warm after the
+    # "market" moves, as an intraday recalibration would
+    rng = np.random.default_rng(seed)
+    true_params = (1.8, 0.05, 0.7, 0.03, -0.65)
+    chain = _heston_surface(true_params)
+    chain['lastPrice'] *= np.exp(noise_vol * rng.standard_normal(len(chain)))
+
+    rows = []
+    for label, options in (('cold, analytic jacobian', {'analytic_gradient': True}),
+                           ('cold, finite differences', {'analytic_gradient': False})):
+        calibrator = HestonCalibrator(chain, 100.0, 0.03)
+        result = calibrator.calibrate(**options)
+        rows.append({'run': label, **result})
+
+    moved = _heston_surface((1.9, 0.052, 0.68, 0.032, -0.63))
+    calibrator.set_prices(moved['lastPrice'].to_numpy())
+    rows.append({'run': 'warm start after move', **calibrator.calibrate(analytic_gradient=True)})
+
+    print(f"{len(chain)} quotes, true parameters {true_params}")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return rows
+
+
+def _notebook_cev_smile(S0, r, sigma, gamma, T, strikes, n_paths, n_steps, seed=0):
+    # the final-project notebook workflow: full (n_paths, n_steps + 1) euler matrix with a hard floor,
+    # then one brentq inversion per strike
+    rng = np.random.default_rng(seed)
+    dt = T / n_steps
+    paths = np.zeros((n_paths, n_steps + 1))
+    paths[:, 0] = S0
+    Z = rng.standard_normal((n_paths, n_steps))
+    for i in range(n_steps):
+        S = paths[:, i]
+        paths[:, i + 1] = np.maximum(S + r * S * dt + sigma * S ** gamma * np.sqrt(dt) * Z[:, i], 1e-8)
+    vols = []
+    for K in strikes:
+        price = np.exp(-r * T) * np.maximum(paths[:, -1] - K, 0).mean()
+        try:
+            vols.append(brentq(lambda v: BlackScholesModel(S0, K, T, r, v).call_price() - price, 1e-3, 10.0))
+        except ValueError:
+            vols.append(np.nan)
+    return np.array(vols)
+
+
+def bench_cev_smile(gamma=0.8, n_paths=50000, n_steps=252, strikes=(85, 92, 100, 108, 115)):
+    S0, r, T = 100.0, 0.02, 1.0
+    sigma = 0.2 * S0 ** (1 - gamma)  # 20% local vol at the start
+    strikes = np.asarray(strikes, dtype=float)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    notebook_vols = _notebook_cev_smile(S0, r, sigma, gamma, T, strikes, n_paths, n_steps)
+    notebook_time = time.perf_counter() - start
+    notebook_peak = tracemalloc.get_traced_memory()[1]
+
+    model = CEVModel(S0, 100.0, T, r, sigma, gamma, num_simulations=n_paths, num_steps=n_steps, batch_size=10000, seed=0)
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    mc_prices = []
+    for K in strikes:
+        model.X = K
+        mc_prices.append(model.estimate('call', control_variates=('black_scholes',))['price'])
+    simulator_time = time.perf_counter() - start
+    simulator_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    smile = model.smile(strikes, option_type='call')
+    smile_time = time.perf_counter() - start
+
+    smile['notebookVol'] = notebook_vols
+    smile['simulatorPrice'] = mc_prices
+    print(f"gamma {gamma}: notebook {notebook_time:.2f} s / {notebook_peak / 1e6:,.0f} MB, "
+          f"batched simulator {simulator_time:.2f} s / {simulator_peak / 1e6:,.1f} MB, "
+          f"closed-form smile {smile_time * 1e3:.2f} ms")
+    print(smile.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    return smile
+
+
+def _american_put(S0, sigma, T, X=100.0, r=0.03, N=400):
+    # module level so the grid build can send it to worker processes
+    return BinomialTreeModel(S0, X, T, r, sigma, N).price('put', exercise='american', richardson=True)
+
+
+def bench_pricing_grid(nodes=(24, 12, 10), n_queries=100000, n_direct=200, workers=None, seed=0):
+    # american put prices over S0 x sigma x T: build the chebyshev grid once from the tree, then answer a
+    # large batch of random what-if queries from it and compare with pricing the same points on the tree
+    axes = {'S0': (70.0, 130.0, nodes[0]), 'sigma': (0.1, 0.5, nodes[1]), 'T': (0.1, 2.0, nodes[2])}
+    start = time.perf_counter()
+    grid = PricingGrid.build(_american_put, axes, workers=workers)
+    build_time = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    queries = {name: rng.uniform(low, high, n_queries) for name, (low, high, _) in axes.items()}
+    start = time.perf_counter()
+    grid(**queries)
+    query_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for S0, sigma, T in zip(*(values[:n_direct] for values in queries.values())):
+        _american_put(S0, sigma, T)
+    direct_time = (time.perf_counter() - start) / n_direct * n_queries
+
+    accuracy = grid.validate(_american_put, n_points=n_direct, seed=seed + 1)
+    rows = [
+        {'method': 'binomial tree (extrapolated)', 'seconds': direct_time, 'quotes/s': n_queries / direct_time},
+        {'method': f'grid build ({grid.values.size} nodes)', 'seconds': build_time, 'quotes/s': np.nan},
+        {'method': 'grid lookup', 'seconds': query_time, 'quotes/s': n_queries / query_time},
+    ]
+    print(f"{n_queries:,} american put quotes; grid max error {accuracy['max_error']:.2e}, "
+          f"mean {accuracy['mean_error']:.2e}, estimated bound {accuracy['error_estimate']:.2e}")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return rows
+
+
+def bench_portfolio_var(n_positions=20000, n_loop_positions=200, seed=0):
+    # book over five underlyings revalued under a 500-scenario spot x vol x rate grid, then 1-day 99% VaR
+    rng = np.random.default_rng(seed)
+    book = random_book(n_positions, seed)
+    tickers = np.array(['AAA', 'BBB', 'CCC', 'DDD', 'EEE'])
+    underlying = rng.integers(0, 5, n_positions)
+    book['S0'] = np.array([60.0, 80.0, 100.0, 120.0, 140.0])[underlying]  # one spot per underlying
+    book['option_type'] = book.pop('is_call')
+    positions = pd.DataFrame({**book, 'underlying': tickers[underlying],
+                              'quantity': rng.integers(-50, 51, n_positions)})
+    portfolio = Portfolio(positions)
+    scenarios = scenario_grid(spot=np.linspace(-0.2, 0.2, 25), vol=np.linspace(-0.1, 0.1, 10), rate=(-0.01, 0.01),
+                              horizon=1 / 365)
+    cells = n_positions * len(scenarios)
+
+    # original style: one BlackScholesModel per position and scenario
+    start = time.perf_counter()
+    for i in range(n_loop_positions):
+        for spot, vol, rate, horizon in scenarios.itertuples(index=False):
+            model = BlackScholesModel(book['S0'][i] * (1 + spot), book['X'][i], book['T'][i] - horizon,
+                                      book['r'][i] + rate, max(book['sigma'][i] + vol, 1e-4), book['q'][i])
+            model.call_price() if book['option_type'][i] else model.put_price()
+    loop_time = (time.perf_counter() - start) / n_loop_positions * n_positions
+
+    rows = [{'method': 'per-contract loop', 'seconds': loop_time, 'cells/s': cells / loop_time, 'peak MB': np.nan}]
+    results = {}
+    for method in ('full', 'delta_gamma_vega'):
+        tracemalloc.start()
+        start = time.perf_counter()
+        results[method] = portfolio.scenario_pnl(scenarios, method)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rows.append({'method': method, 'seconds': elapsed, 'cells/s': cells / elapsed, 'peak MB': peak / 1e6})
+    approximation_error = np.max(np.abs(results['delta_gamma_vega'] - results['full'])) / abs(portfolio.value)
+
+    # one year of daily history for the five underlyings, correlated spot returns and vol changes
+    correlation = 0.5 + 0.5 * np.eye(5)
+    spot_returns = pd.DataFrame(rng.multivariate_normal(np.zeros(5), 0.015 ** 2 * correlation, size=250),
+                                columns=tickers)
+    vol_changes = pd.DataFrame(-0.3 * spot_returns.to_numpy() + rng.normal(0, 0.003, (250, 5)), columns=tickers)
+    for name, run in (('historical VaR', lambda: portfolio.historical_var(spot_returns, vol_changes)),
+                      ('monte carlo VaR (2k)', lambda: portfolio.monte_carlo_var(spot_returns, vol_changes,
+                                                                                n_scenarios=2000, seed=seed))):
+        start = time.perf_counter()
+        risk = run()
+        elapsed = time.perf_counter() - start
+        rows.append({'method': f"{name}: {risk['var']:,.0f} / ES {risk['es']:,.0f}", 'seconds': elapsed,
+                     'cells/s': n_positions * risk['pnl'].size / elapsed, 'peak MB': np.nan})
+
+    print(f"{n_positions:,} positions x {len(scenarios)} scenarios, book value {portfolio.value:,.0f}; "
+          f"delta-gamma-vega max error {approximation_error:.2%} of book value")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return rows
+
+
+def _ohlc_bars(n_bars, n_tickers, daily_vol=0.01, overnight_share=0.2, intraday_steps=64, seed=0):
+    # gbm bars: an overnight gap carrying overnight_share of the variance, then a sampled intraday path
+    rng = np.random.default_rng(seed)
+    open_, high, low, close = (np.empty((n_bars, n_tickers)) for _ in range(4))
+    last = np.full(n_tickers, 100.0)
+    for t in range(n_bars):
+        open_[t] = last * np.exp(daily_vol * np.sqrt(overnight_share) * rng.standard_normal(n_tickers))
+        path = open_[t] * np.exp(np.cumsum(daily_vol * np.sqrt((1 - overnight_share) / intraday_steps)
+                                           * rng.standard_normal((intraday_steps, n_tickers)), axis=0))
+        high[t] = np.maximum(open_[t], path.max(axis=0))
+        low[t] = np.minimum(open_[t], path.min(axis=0))
+        last = close[t] = path[-1]
+    return open_, high, low, close
+
+
+def bench_streaming_volatility(n_tickers=5000, n_bars=300, n_timed_bars=50, n_loop_tickers=100, window=252):
+    # a new bar for every ticker: recomputing historical_volatility over each ticker's series against one
+    # vectorized O(1) update of the streaming estimators (averaged over n_timed_bars, which includes the
+    # periodic resync of the running sums)
+    open_, high, low, close = _ohlc_bars(n_bars, n_tickers)
+
+    start = time.perf_counter()
+    for j in range(n_loop_tickers):
+        VolatilityMeasures(pd.Series(close[:, j])).historical_volatility(window)
+    loop_time = (time.perf_counter() - start) / n_loop_tickers * n_tickers
+
+    estimators = {
+        'close-to-close': (CloseToCloseVolatility(n_tickers, window), (close,)),
+        'ewma': (EWMAVolatility(n_tickers), (close,)),
+        'parkinson': (ParkinsonVolatility(n_tickers), (high, low)),
+        'garman-klass': (GarmanKlassVolatility(n_tickers), (open_, high, low, close)),
+        'yang-zhang': (YangZhangVolatility(n_tickers), (open_, high, low, close)),
+    }
+    rows = [{'estimator': 'historical_volatility (full series)', 'ms/bar': loop_time * 1e3,
+             'tickers/s': n_tickers / loop_time, 'median vol': np.nan}]
+    for name, (estimator, columns) in estimators.items():
+        estimator.replay(*(column[:-n_timed_bars] for column in columns))
+        start = time.perf_counter()
+        for t in range(n_bars - n_timed_bars, n_bars):
+            estimator.update(*(column[t] for column in columns))
+            volatility = estimator.volatility()
+        elapsed = (time.perf_counter() - start) / n_timed_bars
+        rows.append({'estimator': name, 'ms/bar': elapsed * 1e3, 'tickers/s': n_tickers / elapsed,
+                     'median vol': np.nanmedian(volatility)})
+    # parkinson and garman-klass only see the trading session, and a range sampled at discrete steps reads low
+    print(f"{n_tickers:,} tickers, {n_bars} bars, true vol {0.01 * np.sqrt(252):.4f} "
+          f"({0.01 * np.sqrt(0.8 * 252):.4f} intraday)")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return rows
+
+def bench_instrumentation_overhead(n_calls=5000, repeats=10):
+    # cost of the hooks on the smallest engine call there is (one contract through price_batch): the bare
+    # function, the instrumented one with no report active, and with a report collecting. the variants are
+    # interleaved within every repeat so clock drift hits them alike, best repeat wins
+    args = (100.0, 100.0, 1.0, 0.02, 0.2)
+
+    def timed(function):
+        start = time.perf_counter()
+        for _ in range(n_calls):
+            function(*args)
+        return (time.perf_counter() - start) / n_calls
+
+    timings = {'uninstrumented': [], 'instrumentation off': [], 'instrumentation on': []}
+    for _ in range(repeats):
+        timings['uninstrumented'].append(timed(price_batch.__wrapped__))
+        timings['instrumentation off'].append(timed(price_batch))
+        with profile() as report:
+            timings['instrumentation on'].append(timed(price_batch))
+    rows = [{'variant': name, 'us/call': min(values) * 1e6} for name, values in timings.items()]
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+    print(report)
+    return rows
+
+def _kernel_cases(scale):
+    # (name, call) per kernel-backed engine; scale shrinks the problem for the interpreted parity run
+    paths = max(int(100000 * scale), 64)
+    heston = dict(S0=100, X=100, T=1.0, r=0.03, kappa=1.0, theta=0.09, sigma=1.0, v0=0.09, rho=-0.3, seed=0)
+    return [
+        ('binomial_tree (american, N=2000)',
+         lambda: BinomialTreeModel(100, 100, 1.0, 0.03, 0.2, max(int(2000 * scale), 50)).price('put', 'american')),
+        ('gbm simulate_price_paths',
+         lambda: MonteCarloModel(100, 100, 1.0, 0.03, 0.2, num_simulations=paths // 2, num_steps=100,
+                                 seed=0).simulate_price_paths()),
+        ('heston euler estimate (252 steps)',
+         lambda: HestonModel(**heston, num_simulations=paths, num_steps=252).estimate('call')['price']),
+        ('heston qe estimate (32 steps)',
+         lambda: HestonModel(**heston, num_simulations=paths, num_steps=32, scheme='qe').estimate('call')['price']),
+        ('heston simulate_price_paths',
+         lambda: HestonModel(**heston, num_simulations=paths // 2, num_steps=100).simulate_price_paths()),
+        ('cev estimate (252 steps)',
+         lambda: CEVModel(100, 100, 1.0, 0.03, 0.2 * 100 ** 0.2, 0.8, num_simulations=paths, num_steps=252,
+                          seed=0).estimate('call')['price']),
+    ]
+
+
+def bench_kernels(parity_scale=0.01):
+    # numpy loops against the numba kernels: speed at full size, and the largest price difference (same seeds,
+    # so only rounding). without numba the parity check runs the interpreted kernels on a small problem
+    compiled = 'numba' if kernels.available() else 'python'
+    previous = kernels.set_backend('numpy')
+    rows = []
+    try:
+        for (name, run), (_, small) in zip(_kernel_cases(1.0), _kernel_cases(parity_scale)):
+            kernels.set_backend('numpy')
+            start = time.perf_counter()
+            reference = run()
+            numpy_time = time.perf_counter() - start
+            row = {'kernel': name, 'numpy s': numpy_time, 'numba s': np.nan, 'speedup': np.nan}
+
+            if compiled == 'numba':
+                kernels.set_backend('numba')
+                run()  # compilation (cached on disk after the first run)
+                start = time.perf_counter()
+                result = run()
+                row['numba s'] = time.perf_counter() - start
+                row['speedup'] = numpy_time / row['numba s']
+            else:
+                reference = small()
+                kernels.set_backend('python')
+                result = small()
+            row['max abs diff'] = float(np.max(np.abs(np.asarray(result) - np.asarray(reference))))
+            rows.append(row)
+    finally:
+        kernels.set_backend(previous)
+    if compiled == 'python':
+        print(f"numba is not installed: numpy timings only, parity checked on the interpreted kernels "
+              f"at {parity_scale:g} of the size")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return rows
+
+
+def _write_chain(path, n_rows, seed=0):
+    # structured .npy option chain with market prices from known vols
+    rng = np.random.default_rng(seed)
+    chain = np.zeros(n_rows, dtype=[('S0', 'f8'), ('strike', 'f8'), ('T', 'f8'), ('r', 'f8'), ('option_type', 'U4'),
+                                    ('lastPrice', 'f8')])
+    chain['S0'] = 100.0
+    chain['strike'] = rng.uniform(60, 140, n_rows)
+    chain['T'] = rng.uniform(0.05, 2.0, n_rows)
+    chain['r'] = 0.03
+    chain['option_type'] = np.where(rng.random(n_rows) < 0.5, 'call', 'put')
+    chain['lastPrice'] = price_batch(chain['S0'], chain['strike'], chain['T'], chain['r'],
+                                     rng.uniform(0.1, 0.6, n_rows), 0.0, chain['option_type'])
+    np.save(path, chain)
+
+
+def bench_batch_pipeline(n_rows=(50000, 200000, 800000), chunk_size=50000, workers=None):
+    # end-of-day chain files of growing size through batch_pipeline (.npy in and out): throughput, and the
+    # tracemalloc peak of a second run, which stays at a few chunks' worth however large the file gets
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        source, target = os.path.join(directory, 'chain.npy'), os.path.join(directory, 'results.npy')
+        for n in n_rows:
+            _write_chain(source, n)
+            stats = run_pipeline(source, target, chunk_size, workers)
+            with profile(memory=True) as report:
+                run_pipeline(source, target, chunk_size, workers)
+            rows.append({'rows': n, 'file MB': os.path.getsize(source) / 2 ** 20, 'seconds': stats['seconds'],
+                         'rows/s': stats['rows_per_sec'], 'peak MB': report.peak_memory / 2 ** 20})
+    print(f"chunks of {chunk_size:,} rows, workers={workers}")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return rows
+
+
+def bench_repricing_service(rates=(10000, 100000, 400000), n_instruments=10000, duration=2.0, n_loop_quotes=2000):
+    # the service against the simulated feed at growing quote rates: how much coalescing absorbs and the
+    # quote-to-publish latency (bucket upper bounds). the baseline is the rate one-quote-at-a-time repricing
+    # (BlackScholesModel + Greeks per quote) can sustain at all
+    instruments = demo_instruments(n_loop_quotes)
+    start = time.perf_counter()
+    for row in instruments.itertuples():
+        model = BlackScholesModel(row.S0, row.X, row.T, row.r, row.sigma)
+        price = model.call_price() if row.option_type == 'call' else model.put_price()
+        greeks = Greeks(row.S0, row.X, row.T, row.r, row.sigma).all_greeks(row.option_type)
+    loop_rate = n_loop_quotes / (time.perf_counter() - start)
+
+    rows = []
+    for rate in rates:
+        latency, counters = asyncio.run(run_demo(n_instruments, rate, max(1, int(rate / 100)), duration))
+        rows.append({'target quotes/s': rate, 'quotes/s': counters['quotes'] / duration,
+                     'coalesced %': 100 * counters['coalesced'] / max(counters['quotes'], 1),
+                     'batches': counters['batches'], 'p50 ms': latency.loc['quote_to_publish', 'p50 ms'],
+                     'p99 ms': latency.loc['quote_to_publish', 'p99 ms']})
+    print(f"{n_instruments:,} instruments, feed bursts every 10 ms; one-at-a-time repricing sustains "
+          f"{loop_rate:,.0f} quotes/s")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    return rows
+
+
+def bench_pde(grids=((100, 50), (200, 100), (400, 200)), tree_steps=(250, 500, 1000, 2000, 4000),
+              strikes=np.linspace(80, 120, 25)):
+    # american put accuracy per millisecond: crank-nicolson pde (space x time steps) against the binomial tree
+    # (with richardson), both against a 20000-step richardson tree; then a whole strike strip in one call each
+    # against a 4000-step richardson tree, where the pde also returns delta / gamma / theta from the same solve
+    S0, X, T, r, sigma = 100.0, 100.0, 1.0, 0.05, 0.2
+    at_the_money = BinomialTreeModel(S0, X, T, r, sigma, 20000).price('put', 'american', richardson=True)
+
+    rows = []
+    for space_steps, time_steps in grids:
+        model = FiniteDifferenceModel(S0, X, T, r, sigma, space_steps=space_steps, time_steps=time_steps)
+        for richardson in (False, True):
+            start = time.perf_counter()
+            value = model.price('put', 'american', richardson=richardson)
+            rows.append({'engine': 'pde', 'size': f"{space_steps}x{time_steps}", 'richardson': richardson,
+                         'ms': (time.perf_counter() - start) * 1e3, 'abs_error': abs(value - at_the_money)})
+    for N in tree_steps:
+        start = time.perf_counter()
+        value = BinomialTreeModel(S0, X, T, r, sigma, N).price('put', 'american', richardson=True)
+        rows.append({'engine': 'tree', 'size': str(N), 'richardson': True, 'ms': (time.perf_counter() - start) * 1e3,
+                     'abs_error': abs(value - at_the_money)})
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.3g}"))
+
+    reference = BinomialTreeModel(S0, X, T, r, sigma, 4000).price('put', 'american', strikes=strikes, richardson=True)
+    model = FiniteDifferenceModel(S0, X, T, r, sigma)
+    start = time.perf_counter()
+    greeks = model.greeks('put', 'american', strikes=strikes, richardson=True)
+    pde_time = time.perf_counter() - start
+    start = time.perf_counter()
+    tree = BinomialTreeModel(S0, X, T, r, sigma, 1000).price('put', 'american', strikes=strikes, richardson=True)
+    tree_time = time.perf_counter() - start
+    strip = {'strikes': strikes.size, 'pde_ms': pde_time * 1e3, 'tree_ms': tree_time * 1e3,
+             'pde_max_error': float(np.max(np.abs(greeks['price'] - reference))),
+             'tree_max_error': float(np.max(np.abs(tree - reference)))}
+    print(f"{strikes.size} strikes: pde 400x200 richardson {strip['pde_ms']:.1f} ms (max error {strip['pde_max_error']:.2e}, "
+          f"with delta/gamma/theta), tree N=1000 {strip['tree_ms']:.1f} ms (max error {strip['tree_max_error']:.2e})")
+    return {'convergence': rows, 'strip': strip}
+
+
+BENCHMARKS = {
+    'black_scholes_batch': bench_black_scholes_batch,
+    'greeks_batch': bench_greeks_batch,
+    'implied_vol_chain': bench_implied_vol_chain,
+    'binomial_convergence': bench_binomial_convergence,
+    'heston_memory': bench_heston_memory,
+    'variance_reduction': bench_variance_reduction,
+    'qmc_convergence': bench_qmc_convergence,
+    'parallel_scaling': bench_parallel_scaling,
+    'heston_cos': bench_heston_cos,
+    'heston_schemes': bench_heston_schemes,
+    'heston_calibration': bench_heston_calibration,
+    'cev_smile': bench_cev_smile,
+    'pricing_grid': bench_pricing_grid,
+    'portfolio_var': bench_portfolio_var,
+    'streaming_volatility': bench_streaming_volatility,
+    'instrumentation_overhead': bench_instrumentation_overhead,
+    'kernels': bench_kernels,
+    'batch_pipeline': bench_batch_pipeline,
+    'repricing_service': bench_repricing_service,
+    'pde': bench_pde,
+}
+
+
+# reproducible suite: every engine on fixed parameters and seeds, timed (best of `repeats`), peak memory from a
+# separate tracemalloc run, and the error against a closed-form or semi-analytic reference. results are plain
+# json so two commits can be compared case by case
+
+SUITE_OPTION = dict(S0=100.0, X=100.0, T=1.0, r=0.02, sigma=0.2)  # the final project's sanity check contract
+SUITE_HESTON = dict(kappa=2.0, theta=0.04, sigma=0.5, v0=0.04, rho=-0.7)
+SUITE_CEV_GAMMA = 0.8
+
+
+def _suite_reference_call():
+    return BlackScholesModel(**SUITE_OPTION).call_price()
+
+
+def _suite_black_scholes(n_contracts=100000, n_check=500):
+    book = random_book(n_contracts, seed=0)
+    args = [book[name] for name in ('S0', 'X', 'T', 'r', 'sigma', 'q', 'is_call')]
+
+    def check(prices):
+        # the original per-contract model is the reference
+        reference = [BlackScholesModel(*(a[i] for a in args[:6])).call_price() if book['is_call'][i]
+                     else BlackScholesModel(*(a[i] for a in args[:6])).put_price() for i in range(n_check)]
+        return float(np.max(np.abs(prices[:n_check] - reference)))
+    return lambda: price_batch(*args), n_contracts, check
+
+
+def _suite_greeks(n_contracts=100000, n_check=500):
+    book = random_book(n_contracts, seed=0)
+    args = [book[name] for name in ('S0', 'X', 'T', 'r', 'sigma', 'q', 'is_call')]
+
+    def check(greeks):
+        # the original per-contract class, whose vega is per 1% of vol
+        errors = []
+        for i in range(n_check):
+            option_type = 'call' if book['is_call'][i] else 'put'
+            reference = Greeks(*(a[i] for a in args[:6]))
+            errors += [greeks['delta'][i] - reference.delta(option_type), greeks['gamma'][i] - reference.gamma(),
+                       greeks['vega'][i] / 100 - reference.vega()]
+        return float(np.max(np.abs(errors)))
+    return lambda: greeks_batch(*args), n_contracts, check
+
+
+def _suite_implied_vol(n_contracts=100000):
+    # round trip: prices from known vols, inverted back
+    book = random_book(n_contracts, seed=0)
+    args = [book[name] for name in ('S0', 'X', 'T', 'r')]
+    prices = price_batch(*args, book['sigma'], book['q'], book['is_call'])
+    solvable = prices > 1e-6 * book['S0']  # prices rounded to nothing carry no vol information
+
+    def check(result):
+        return float(np.nanmax(np.abs(result[0] - book['sigma'])[solvable]))
+    return (lambda: implied_volatility_batch(prices, *args, book['q'], book['is_call'])), n_contracts, check
+
+
+def _suite_binomial(N=2000):
+    model = BinomialTreeModel(**SUITE_OPTION, N=N)
+    reference = _suite_reference_call()
+    return lambda: model.price('call'), N * (N + 1) // 2, lambda value: abs(value - reference)
+
+
+def _suite_gbm_monte_carlo(num_simulations=50000, num_steps=252):
+    model = MonteCarloModel(**SUITE_OPTION, num_simulations=num_simulations, num_steps=num_steps, seed=0)
+    reference = _suite_reference_call()
+    return (lambda: model.estimate('call')), num_simulations * num_steps, \
+        lambda result: abs(result['price'] - reference)
+
+
+def _suite_heston_monte_carlo(num_simulations=50000, num_steps=32):
+    params = {key: SUITE_OPTION[key] for key in ('S0', 'X', 'T', 'r')}
+    model = HestonModel(**params, **SUITE_HESTON, num_simulations=num_simulations, num_steps=num_steps, seed=0,
+                        scheme='qe')
+    reference = model.cos_price('call', n_terms=4096, truncation=30)
+    return (lambda: model.estimate('call')), num_simulations * num_steps, \
+        lambda result: abs(result['price'] - reference)
+
+
+def _suite_heston_cos(n_strikes=1000):
+    params = dict(S0=SUITE_OPTION['S0'], T=SUITE_OPTION['T'], r=SUITE_OPTION['r'], **SUITE_HESTON)
+    strikes = np.linspace(50, 200, n_strikes)
+    reference = heston_cos_prices(strikes=strikes, n_terms=4096, truncation=30, **params)
+    return (lambda: heston_cos_prices(strikes=strikes, **params)), n_strikes, \
+        lambda prices: float(np.max(np.abs(prices - reference)))
+
+
+def _suite_cev_monte_carlo(num_simulations=50000, num_steps=252):
+    sigma = SUITE_OPTION['sigma'] * SUITE_OPTION['S0'] ** (1 - SUITE_CEV_GAMMA)
+    model = CEVModel(SUITE_OPTION['S0'], SUITE_OPTION['X'], SUITE_OPTION['T'], SUITE_OPTION['r'], sigma,
+                     SUITE_CEV_GAMMA, num_simulations=num_simulations, num_steps=num_steps, seed=0)
+    reference = model.call_price()
+    return (lambda: model.estimate('call')), num_simulations * num_steps, \
+        lambda result: abs(result['price'] - reference)
+
+
+SUITE = {
+    'black_scholes': _suite_black_scholes,
+    'greeks': _suite_greeks,
+    'implied_vol': _suite_implied_vol,
+    'binomial_tree': _suite_binomial,
+    'gbm_monte_carlo': _suite_gbm_monte_carlo,
+    'heston_monte_carlo': _suite_heston_monte_carlo,
+    'heston_cos': _suite_heston_cos,
+    'cev_monte_carlo': _suite_cev_monte_carlo,
+}
+
+
+def _suite_curves():
+    # accuracy-vs-time: (resolution name, values, builder(value) -> (run, error of its result))
+    reference = _suite_reference_call()
+    heston_params = {key: SUITE_OPTION[key] for key in ('S0', 'X', 'T', 'r')}
+    heston_reference = HestonModel(**heston_params, **SUITE_HESTON).cos_price('call', n_terms=4096, truncation=30)
+
+    def tree(richardson):
+        return lambda N: (lambda: BinomialTreeModel(**SUITE_OPTION, N=N).price('call', richardson=richardson),
+                          lambda value: abs(value - reference))
+
+    def gbm(n):
+        model = MonteCarloModel(**SUITE_OPTION, num_simulations=n, num_steps=1, seed=0)
+        return (lambda: model.estimate('call', antithetic=True)), lambda result: result['std_error']
+
+    def heston(scheme):
+        def build(steps):
+            model = HestonModel(**heston_params, **SUITE_HESTON, num_simulations=100000, num_steps=steps, seed=0,
+                                scheme=scheme)
+            return (lambda: model.estimate('call', antithetic=True)), \
+                lambda result: abs(result['price'] - heston_reference)
+        return build
+
+    def cos(n_terms):
+        return (lambda: HestonModel(**heston_params, **SUITE_HESTON).cos_price('call', n_terms=n_terms)), \
+            lambda value: abs(value - heston_reference)
+
+    return {
+        'binomial_tree': ('steps', (50, 100, 200, 400, 800, 1600, 3200), tree(False)),
+        'binomial_tree_richardson': ('steps', (50, 100, 200, 400, 800, 1600), tree(True)),
+        'gbm_monte_carlo': ('paths', (2 ** 10, 2 ** 12, 2 ** 14, 2 ** 16, 2 ** 18, 2 ** 20), gbm),
+        'heston_euler': ('steps', (4, 8, 16, 32, 64), heston('euler')),
+        'heston_qe': ('steps', (4, 8, 16, 32, 64), heston('qe')),
+        'heston_cos': ('terms', (16, 32, 64, 128, 256), cos),
+    }
+
+
+def _measure(run, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+    # memory in its own run, tracing slows the allocations down
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, min(times), peak
+
+
+def run_suite(names=None, repeats=3, curves=True):
+    results = {'meta': _suite_meta(repeats), 'cases': {}, 'curves': {}}
+    for name in names or SUITE:
+        run, items, check = SUITE[name]()
+        result, seconds, peak = _measure(run, repeats)
+        results['cases'][name] = {'seconds': seconds, 'throughput': items / seconds, 'peak_mb': peak / 1e6,
+                                  'error': float(check(result))}
+    if curves:
+        for name, (resolution, values, build) in _suite_curves().items():
+            points = []
+            for value in values:
+                run, check = build(value)
+                start = time.perf_counter()
+                result = run()
+                points.append({resolution: value, 'seconds': time.perf_counter() - start,
+                               'error': float(check(result))})
+            results['curves'][name] = points
+    return results
+
+
+def _suite_meta(repeats):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'cpus': default_workers(), 'repeats': repeats,
+            'kernels': kernels.get_backend()}
+
+
+def compare_results(current, baseline, time_tolerance=0.25, memory_tolerance=0.25, error_tolerance=0.5,
+                    error_floor=1e-12):
+    # one row per case and metric present in both runs; a metric regresses when it grows by more than its
+    # tolerance (relative), errors also need to grow by more than error_floor so noise at machine precision passes
+    tolerances = {'seconds': time_tolerance, 'peak_mb': memory_tolerance, 'error': error_tolerance}
+    rows = []
+    for name, case in current['cases'].items():
+        if name not in baseline['cases']:
+            continue
+        for metric, tolerance in tolerances.items():
+            old, new = baseline['cases'][name][metric], case[metric]
+            worse = new > old * (1 + tolerance) and (metric != 'error' or new - old > error_floor)
+            better = new < old / (1 + tolerance) and (metric != 'error' or old - new > error_floor)
+            rows.append({'case': name, 'metric': metric, 'baseline': old, 'current': new,
+                         'change': new / old - 1 if old else np.nan,
+                         'status': 'regression' if worse else 'improved' if better else 'ok'})
+    return pd.DataFrame(rows)
+
+
+def _print_suite(results):
+    cases = pd.DataFrame.from_dict(results['cases'], orient='index')
+    print(cases.to_string(float_format=lambda v: f"{v:.4g}"))
+    for name, points in results['curves'].items():
+        print(f"\n{name}")
+        print(pd.DataFrame(points).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+
+def plot_curves(results, path):
+    # error against wall time on log axes, one line per curve; matplotlib is only needed for this
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for name, points in results['curves'].items():
+        ax.loglog([p['seconds'] for p in points], [max(p['error'], 1e-16) for p in points], marker='o', label=name)
+    ax.set_xlabel('seconds')
+    ax.set_ylabel('absolute error')
+    ax.legend()
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pricing engine benchmarks")
+    parser.add_argument('names', nargs='*', help="benchmarks (or suite cases with --suite) to run, default all")
+    parser.add_argument('--suite', action='store_true', help="run the reproducible suite")
+    parser.add_argument('--json', help="write the suite results to this file")
+    parser.add_argument('--compare', help="suite results of an earlier run to check against")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--no-curves', action='store_true', help="skip the accuracy-vs-time curves")
+    parser.add_argument('--plot', help="save the accuracy-vs-time curves as an image (needs matplotlib)")
+    parser.add_argument('--time-tolerance', type=float, default=0.25)
+    parser.add_argument('--memory-tolerance', type=float, default=0.25)
+    parser.add_argument('--error-tolerance', type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    if not args.suite:
+        for name in args.names or BENCHMARKS:
+            BENCHMARKS[name]()
+        return 0
+
+    results = run_suite(args.names, args.repeats, curves=not args.no_curves)
+    _print_suite(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.plot:
+        plot_curves(results, args.plot)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        comparison = compare_results(results, baseline, args.time_tolerance, args.memory_tolerance,
+                                     args.error_tolerance)
+        print(f"\nagainst {args.compare} (commit {baseline['meta'].get('commit')})")
+        print(comparison.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+        if (comparison['status'] == 'regression').any():
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,50 +1,91 @@
-
-import numpy as np
-
-class BinomialTreeModel:
-    def __init__(self, S0, X, T, r, sigma, N):
-        self.S0 = S0  # Initial stock price
-        self.X = X  # Strike price
-        self.T = T  # Time to maturity
-        self.r = r  # Risk-free rate
-        self.sigma = sigma  # Volatility
-        self.N = N  # Number of time steps
-
-        # Ensure parameters are realistic
-        if T <= 0:
-            raise ValueError("Time to maturity T must be positive")
-        if sigma <= 0:
-            raise ValueError("Volatility sigma must be positive")
-        if r < 0:
-            raise ValueError("Risk-free rate r must be non-negative")
-
-        # Calculate derived parameters
-        self.dt = T / N
-        self.u = np.exp(sigma * np.sqrt(self.dt))
-        self.d = 1 / self.u
-        self.p = (np.exp(r * self.dt) - self.d) / (self.u - self.d)
-
-        # Validate up/down factors and probability
-        if not (0 < self.d < 1 < self.u):
-            raise ValueError("The up/down factors are not correctly calculated")
-        if not (0 < self.p < 1):
-            raise ValueError("The probability is not in the valid range")
-
-    def price(self, option_type='call'):
-        # Initialize asset prices at maturity
-        ST = np.zeros(self.N + 1)
-        for i in range(self.N + 1):
-            ST[i] = self.S0 * (self.u ** i) * (self.d ** (self.N - i))
-        
-        # Initialize option values at maturity
-        if option_type == 'call':
-            option_values = np.maximum(ST - self.X, 0)
-        elif option_type == 'put':
-            option_values = np.maximum(self.X - ST, 0)
-
-        # Step backwards through tree
-        for j in range(self.N - 1, -1, -1):
-            for i in range(j + 1):
-                option_values[i] = np.exp(-self.r * self.dt) * (self.p * option_values[i + 1] + (1 - self.p) * option_values[i])
-
-        return option_values[0]
+
+import numpy as np
+
+from instrumentation import instrument, record
+from kernels import tree_backward_induction, use_compiled
+
+class BinomialTreeModel:
+    def __init__(self, S0, X, T, r, sigma, N):
+        self.S0 = S0  # Initial stock price
+        self.X = X  # Strike price
+        self.T = T  # Time to maturity
+        self.r = r  # Risk-free rate
+        self.sigma = sigma  # Volatility
+        self.N = N  # Number of time steps
+
+        # Ensure parameters are realistic
+        if T <= 0:
+            raise ValueError("Time to maturity T must be positive")
+        if sigma <= 0:
+            raise ValueError("Volatility sigma must be positive")
+        if r < 0:
+            raise ValueError("Risk-free rate r must be non-negative")
+
+        # Calculate derived parameters
+        self.dt = T / N
+        self.u = np.exp(sigma * np.sqrt(self.dt))
+        self.d = 1 / self.u
+        self.p = (np.exp(r * self.dt) - self.d) / (self.u - self.d)
+
+        # Validate up/down factors and probability
+        if not (0 < self.d < 1 < self.u):
+            raise ValueError("The up/down factors are not correctly calculated")
+        if not (0 < self.p < 1):
+            raise ValueError("The probability is not in the valid range")
+
+    @instrument('binomial_tree')
+    def price(self, option_type='call', exercise='european', strikes=None, exercise_dates=None, richardson=False):
+        # exercise: 'european', 'american' or 'bermudan' (exercise allowed only at exercise_dates, in years)
+        # strikes: optional array of strikes priced on the same tree, returns an array in that case
+        # richardson: two-point extrapolation 2 * V(2N) - V(N), removes most of the O(1/N) error
+        if option_type not in ('call', 'put'):
+            raise ValueError("Invalid option type. Must be 'call' or 'put'.")
+        if exercise not in ('european', 'american', 'bermudan'):
+            raise ValueError("exercise must be 'european', 'american' or 'bermudan'")
+        if exercise == 'bermudan' and exercise_dates is None:
+            raise ValueError("Bermudan exercise needs exercise_dates")
+
+        X = np.atleast_1d(np.asarray(self.X if strikes is None else strikes, dtype=float))
+        if richardson:
+            values = 2 * self._backward_induction(2 * self.N, option_type, X, exercise, exercise_dates) \
+                - self._backward_induction(self.N, option_type, X, exercise, exercise_dates)
+        else:
+            values = self._backward_induction(self.N, option_type, X, exercise, exercise_dates)
+        return values if strikes is not None else values[0]
+
+    def _backward_induction(self, N, option_type, X, exercise, exercise_dates):
+        record('binomial_tree', nodes=(N + 1) * (N + 2) // 2 * X.size)
+        dt = self.T / N
+        up_log = self.sigma * np.sqrt(dt)
+        p = (np.exp(self.r * dt) - np.exp(-up_log)) / (np.exp(up_log) - np.exp(-up_log))
+        # discount folded into the probabilities once instead of np.exp(-r*dt) at every node
+        disc_up = np.exp(-self.r * dt) * p
+        disc_down = np.exp(-self.r * dt) * (1 - p)
+        sign = 1.0 if option_type == 'call' else -1.0
+
+        if exercise == 'american':
+            exercise_steps = set(range(N))
+        elif exercise == 'bermudan':
+            exercise_steps = {int(round(t / dt)) for t in np.atleast_1d(exercise_dates) if 0 <= t < self.T}
+        else:
+            exercise_steps = set()
+
+        # one row per strike, one column per node; node i at step j has i up moves: S0 * u^(2i - j),
+        # so every layer's prices are a strided slice of the same 2N+1 price levels
+        strikes = X[:, None]
+        levels = self.S0 * np.exp(up_log * np.arange(-N, N + 1))
+        option_values = np.maximum(sign * (levels[::2] - strikes), 0)
+
+        if use_compiled():
+            # fused in-place roll back, one tree row per strike
+            exercise_mask = np.zeros(N, dtype=bool)
+            exercise_mask[[j for j in exercise_steps if j < N]] = True
+            return tree_backward_induction(option_values, levels, X, disc_up, disc_down, sign, exercise_mask)
+
+        # each layer is a single vectorized update, only the current layer is kept in memory
+        for j in range(N - 1, -1, -1):
+            option_values = disc_up * option_values[:, 1:] + disc_down * option_values[:, :-1]
+            if j in exercise_steps:
+                np.maximum(option_values, sign * (levels[N - j:N + j + 1:2] - strikes), out=option_values)
+
+        return option_values[:, 0]
@@ -1,28 +1,77 @@
-
-import numpy as np
-from scipy.stats import norm
-
-class BlackScholesModel:
-    def __init__(self, S0, X, T, r, sigma, q=0.0):
-        self.S0 = S0
-        self.X = X
-        self.T = T
-        self.r = r
-        self.sigma = sigma
-        self.q = q
-
-    def d1(self):
-        return (np.log(self.S0 / self.X) + (self.r - self.q + 0.5 * self.sigma ** 2) * self.T) / (self.sigma * np.sqrt(self.T))
-
-    def d2(self):
-        return self.d1() - self.sigma * np.sqrt(self.T)
-
-    def call_price(self):
-        d1 = self.d1()
-        d2 = self.d2()
-        return self.S0 * np.exp(-self.q * self.T) * norm.cdf(d1) - self.X * np.exp(-self.r * self.T) * norm.cdf(d2)
-
-    def put_price(self):
-        d1 = self.d1()
-        d2 = self.d2()
-        return self.X * np.exp(-self.r * self.T) * norm.cdf(-d2) - self.S0 * np.exp(-self.q * self.T) * norm.cdf(-d1)
+
+import numpy as np
+from scipy.special import ndtr
+from scipy.stats import norm
+
+from instrumentation import instrument, record
+
+class BlackScholesModel:
+    def __init__(self, S0, X, T, r, sigma, q=0.0):
+        self.S0 = S0
+        self.X = X
+        self.T = T
+        self.r = r
+        self.sigma = sigma
+        self.q = q
+
+    def d1(self):
+        return (np.log(self.S0 / self.X) + (self.r - self.q + 0.5 * self.sigma ** 2) * self.T) / (self.sigma * np.sqrt(self.T))
+
+    def d2(self):
+        return self.d1() - self.sigma * np.sqrt(self.T)
+
+    def call_price(self):
+        d1 = self.d1()
+        d2 = self.d2()
+        return self.S0 * np.exp(-self.q * self.T) * norm.cdf(d1) - self.X * np.exp(-self.r * self.T) * norm.cdf(d2)
+
+    def put_price(self):
+        d1 = self.d1()
+        d2 = self.d2()
+        return self.X * np.exp(-self.r * self.T) * norm.cdf(-d2) - self.S0 * np.exp(-self.q * self.T) * norm.cdf(-d1)
+
+
+# batch pricing - prices a whole book of contracts in one numpy pass instead of one object per contract
+
+def call_mask(option_type):
+    # accepts a boolean mask (True = call) or 'call'/'put' labels, either as a scalar or an array
+    option_type = np.asarray(option_type)
+    if option_type.dtype == bool:
+        return option_type
+    labels = np.char.lower(option_type.astype(str))
+    if np.any((labels != 'call') & (labels != 'put')):
+        raise ValueError("Invalid option type. Must be 'call' or 'put'.")
+    return labels == 'call'
+
+
+def check_positive(name, values):
+    bad = np.flatnonzero(~(values > 0))
+    if bad.size:
+        raise ValueError(f"{name} must be positive for every contract ({bad.size} invalid, first at index {bad[0]})")
+
+
+@instrument('black_scholes')
+def price_batch(S0, X, T, r, sigma, q=0.0, option_type='call'):
+    S0, X, T, r, sigma, q = (np.asarray(a, dtype=float) for a in (S0, X, T, r, sigma, q))
+    S0, X, T, r, sigma, q, is_call = np.broadcast_arrays(S0, X, T, r, sigma, q, call_mask(option_type))
+    record('black_scholes', contracts=S0.size)
+
+    for name, values in (('S0', S0), ('X', X), ('T', T), ('sigma', sigma)):
+        check_positive(name, values)
+
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S0 / X) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+
+    # call = S e^-qT N(d1) - X e^-rT N(d2), put = -(S e^-qT N(-d1) - X e^-rT N(-d2)); one formula with a sign
+    # ndtr is the raw normal cdf ufunc, it skips the argument checking that norm.cdf does on every call
+    sign = np.where(is_call, 1.0, -1.0)
+    return sign * (S0 * np.exp(-q * T) * ndtr(sign * d1) - X * np.exp(-r * T) * ndtr(sign * d2))
+
+
+def price_frame(frame):
+    # frame needs S0, X, T, r, sigma columns; q defaults to 0 and option_type to 'call'
+    q = frame['q'].to_numpy() if 'q' in frame else 0.0
+    option_type = frame['option_type'].to_numpy() if 'option_type' in frame else 'call'
+    return price_batch(frame['S0'].to_numpy(), frame['X'].to_numpy(), frame['T'].to_numpy(),
+                       frame['r'].to_numpy(), frame['sigma'].to_numpy(), q, option_type)
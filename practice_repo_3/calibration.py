@@ -0,0 +1,215 @@
+
+import time
+
+import numpy as np
+from scipy.optimize import least_squares
+
+from black_scholes import call_mask, check_positive
+from instrumentation import instrument, record
+from heston import HestonModel, heston_characteristic_function, heston_characteristic_function_gradient, heston_cumulants
+from volatality import IV_OK, implied_volatility_batch
+
+# least-squares fit of the heston parameters to a whole option surface
+# the chain is grouped by expiry once; every expiry keeps the cos basis of its strikes (the closed-form payoff
+# integrals against the cosines), so a residual evaluation is one characteristic-function call per expiry and
+# a matrix-vector product - the characteristic function is shared by all strikes of the expiry
+
+
+class HestonCalibrator:
+    PARAMETERS = ('kappa', 'theta', 'sigma', 'v0', 'rho')
+    LOWER = np.array([1e-3, 1e-4, 1e-3, 1e-4, -0.999])
+    UPPER = np.array([20.0, 2.0, 5.0, 2.0, 0.999])
+
+    def __init__(self, option_chain, S0, r, option_type='call', price_column='lastPrice', weighting='vega',
+                 n_terms=None, truncation=30, tol=1e-8):
+        # option_chain needs 'strike' and 'T' (years) columns and price_column; an 'option_type' column
+        # overrides the option_type argument per row (same conventions as implied_volatility_chain)
+        # weighting: 'vega' divides each residual by the black-scholes vega at the market implied vol,
+        # so the fit is close to a least-squares fit in implied vol; 'price' fits raw prices
+        # n_terms: cos terms for every expiry; None sizes each expiry as heston_cos_prices does (doubling blocks
+        # until one moves no price by more than tol * S0), so long maturities with a large vol of vol get the
+        # thousands of terms they need and short ones stay at a few hundred. truncation: half-width of the cos
+        # interval in standard deviations of the log return; the heavy tails of long expiries need ~30, a
+        # narrower interval leaves pricing errors the fit would absorb into the parameters
+        for column in ('strike', 'T', price_column):
+            if column not in option_chain.columns:
+                raise ValueError(f"The option_chain DataFrame must contain a '{column}' column.")
+        if weighting not in ('vega', 'price'):
+            raise ValueError("weighting must be 'vega' or 'price'")
+        if 'option_type' in option_chain.columns:
+            option_type = option_chain['option_type'].to_numpy()
+
+        self.S0 = S0
+        self.r = r
+        self.strikes = option_chain['strike'].to_numpy(dtype=float)
+        self.T = option_chain['T'].to_numpy(dtype=float)
+        check_positive('strike', self.strikes)
+        check_positive('T', self.T)
+        self.is_call = np.broadcast_to(call_mask(option_type), self.strikes.shape)
+        self.weighting = weighting
+        self.n_terms = n_terms
+        self.truncation = truncation
+        self.tol = tol
+        self.expiries = [np.flatnonzero(self.T == T) for T in np.unique(self.T)]
+        # parity shift from the put prices the cos basis produces to calls
+        self.parity = np.where(self.is_call, self.S0 - self.strikes * np.exp(-r * self.T), 0.0)
+
+        self.params = None
+        self.result = None
+        self._plan = None
+        self._plan_params = None
+        self.set_prices(option_chain[price_column].to_numpy(dtype=float))
+
+    def set_prices(self, prices):
+        # new quotes for the same strikes and expiries (intraday refresh), keeps the last fit as warm start
+        prices = np.asarray(prices, dtype=float)
+        if prices.shape != self.strikes.shape:
+            raise ValueError("prices must have one entry per row of the option chain")
+        self.prices = prices
+        self.implied_vol, status = implied_volatility_batch(prices, self.S0, self.strikes, self.T, self.r,
+                                                            option_type=self.is_call)
+        self.valid = status == IV_OK
+        if not self.valid.any():
+            raise ValueError("No quote in the chain has a valid implied volatility")
+        if self.weighting == 'vega':
+            sqrt_T = np.sqrt(self.T)
+            vol = np.where(self.valid, self.implied_vol, np.nanmedian(self.implied_vol[self.valid]))
+            d1 = (np.log(self.S0 / self.strikes) + (self.r + 0.5 * vol ** 2) * self.T) / (vol * sqrt_T)
+            vega = self.S0 * np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi) * sqrt_T
+            # floor so deep otm quotes with almost no vega do not dominate
+            self.weights = 1 / np.maximum(vega, 1e-2 * self.S0 * np.sqrt(self.T.min()))
+        else:
+            self.weights = np.ones_like(prices)
+        # quotes without an implied vol (arbitrage violations, stale prices) are left out of the fit
+        self.weights = np.where(self.valid, self.weights, 0.0)
+
+    def _build_plan(self, params):
+        # per expiry: cos interval from the cumulants at params, cosine frequencies and the basis matrix
+        record('heston_calibration', cache_misses=1)
+        plan = []
+        for rows in self.expiries:
+            T = self.T[rows[0]]
+            c1, c2 = heston_cumulants(T, self.r, *params)
+            a = c1 - self.truncation * np.sqrt(c2)
+            b = c1 + self.truncation * np.sqrt(c2)
+            blocks = []
+            start, size = 0, self.n_terms or 128
+            while True:
+                blocks.append(self._basis(rows, T, a, b, np.arange(start, start + size)))
+                start += size
+                if self.n_terms is not None or start >= 2 ** 16 or self._converged(T, params, *blocks[-1]):
+                    break
+                size = start
+            w, prefactor, basis = (np.concatenate(parts, axis=-1) for parts in zip(*blocks))
+            plan.append((rows, T, w, prefactor, basis))
+        self._plan = plan
+        self._plan_params = np.array(params, dtype=float)
+
+    def _basis(self, rows, T, a, b, k):
+        # frequencies, characteristic-function prefactors and discounted put payoff integrals for terms k
+        w = k * np.pi / (b - a)
+        prefactor = 2 / (b - a) * np.exp(-1j * w * a) * np.where(k == 0, 0.5, 1.0)
+        d = np.clip(np.log(self.strikes[rows] / self.S0), a, b)[:, None]
+        angle = w * (d - a)
+        chi = (np.exp(d) * (np.cos(angle) + w * np.sin(angle)) - np.exp(a)) / (1 + w ** 2)
+        psi = np.where(k == 0, d - a, np.sin(angle) / np.where(k == 0, 1, w))
+        basis = np.exp(-self.r * T) * (self.strikes[rows, None] * psi - self.S0 * chi)
+        return w, prefactor, basis
+
+    def _converged(self, T, params, w, prefactor, basis):
+        # whether a block of terms moves no price by more than tol * S0
+        block = basis @ np.real(prefactor * heston_characteristic_function(w, T, self.r, *params))
+        return np.max(np.abs(block)) < self.tol * self.S0
+
+    def _plan_fits(self, params):
+        # the plan built at _plan_params still prices params: every expiry's interval holds the variance of the
+        # log return within a factor 2, and the last half of its terms stays under the tolerance
+        for rows, T, w, prefactor, basis in self._plan:
+            ratio = heston_cumulants(T, self.r, *params)[1] / heston_cumulants(T, self.r, *self._plan_params)[1]
+            if not 0.5 < ratio < 2:
+                return False
+            half = w.size // 2
+            if self.n_terms is None and not self._converged(T, params, w[half:], prefactor[half:], basis[:, half:]):
+                return False
+        return True
+
+    def model_prices(self, params):
+        if self._plan is None:
+            self._build_plan(params)
+        else:
+            record('heston_calibration', cache_hits=1)  # cos basis reused
+        prices = np.empty_like(self.prices)
+        for rows, T, w, prefactor, basis in self._plan:
+            phi = heston_characteristic_function(w, T, self.r, *params)
+            prices[rows] = basis @ np.real(prefactor * phi)
+        return prices + self.parity
+
+    def residuals(self, params):
+        return self.weights * (self.model_prices(params) - self.prices)
+
+    def jacobian(self, params):
+        # analytic: the prices are linear in the characteristic function, so only its gradient is needed
+        if self._plan is None:
+            self._build_plan(params)
+        jac = np.empty((self.prices.size, len(self.PARAMETERS)))
+        for rows, T, w, prefactor, basis in self._plan:
+            _, gradient = heston_characteristic_function_gradient(w, T, self.r, *params)
+            jac[rows] = basis @ np.real(prefactor * gradient).T
+        return self.weights[:, None] * jac
+
+    def initial_guess(self):
+        # flat variance at the median implied vol, moderate mean reversion and vol of vol, equity-like skew
+        variance = float(np.nanmedian(self.implied_vol[self.valid])) ** 2
+        return np.array([2.0, variance, 0.5, variance, -0.5])
+
+    @instrument('heston_calibration')
+    def calibrate(self, initial=None, analytic_gradient=True, warm_start=True, **options):
+        # initial: dict or sequence of (kappa, theta, sigma, v0, rho); default is the previous fit when
+        # warm_start is on, otherwise initial_guess(). options go to scipy.optimize.least_squares
+        start = time.perf_counter()
+        if initial is None:
+            x0 = self.params if warm_start and self.params is not None else self.initial_guess()
+        elif isinstance(initial, dict):
+            x0 = np.array([initial[name] for name in self.PARAMETERS], dtype=float)
+        else:
+            x0 = np.asarray(initial, dtype=float)
+        x0 = np.clip(x0, self.LOWER, self.UPPER)
+
+        options.setdefault('x_scale', 'jac')
+        nfev = 0
+        # the cos intervals and term counts are sized at the starting point; if the fit lands far away (variance
+        # of the log return more than doubled or halved, or more terms needed) they are rebuilt once and the fit
+        # is polished from there
+        for _ in range(2):
+            self._build_plan(x0)
+            fit = least_squares(self.residuals, x0, jac=self.jacobian if analytic_gradient else '2-point',
+                                bounds=(self.LOWER, self.UPPER), **options)
+            nfev += fit.nfev
+            x0 = fit.x
+            if self._plan_fits(fit.x):
+                break
+
+        record('heston_calibration', function_evaluations=nfev)
+        self.params = fit.x
+        errors = (self.model_prices(fit.x) - self.prices)[self.valid]
+        self.result = {
+            **dict(zip(self.PARAMETERS, fit.x)),
+            'price_rmse': float(np.sqrt(np.mean(errors ** 2))),
+            'feller': 2 * fit.x[0] * fit.x[1] > fit.x[2] ** 2,
+            'success': fit.success,
+            'nfev': nfev,
+            'seconds': time.perf_counter() - start,
+        }
+        return self.result
+
+    def implied_vol_errors(self):
+        # model minus market implied vol per row of the chain (nan where either cannot be inverted)
+        model_vol, status = implied_volatility_batch(self.model_prices(self.params), self.S0, self.strikes, self.T,
+                                                     self.r, option_type=self.is_call)
+        return np.where(self.valid & (status == IV_OK), model_vol - self.implied_vol, np.nan)
+
+    def model(self, X, T, **kwargs):
+        # HestonModel with the fitted parameters, e.g. to simulate exotics on the calibrated surface
+        if self.params is None:
+            raise ValueError("Call calibrate() first")
+        return HestonModel(self.S0, X, T, self.r, *self.params, **kwargs)
@@ -0,0 +1,196 @@
+
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from scipy.special import chndtr
+
+from black_scholes import BlackScholesModel, call_mask, price_batch
+from instrumentation import instrument, record
+from kernels import cev_steps, step_block, use_compiled
+from parallel import run_sharded
+from variance_reduction import PayoffAccumulator, draw_normals
+from volatality import implied_volatility_batch
+
+# constant elasticity of variance model: dS = (r - q) S dt + sigma S^gamma dW
+# gamma < 1 gives the equity skew (volatility rises as the price falls), gamma = 1 is black-scholes,
+# gamma > 1 an upward smile; note sigma is in units of S^(1 - gamma), so sigma S0^(gamma - 1) is the
+# black-scholes-equivalent volatility at the start
+# (for gamma > 1 with a very large local vol the discounted price is a strict local martingale and the
+# simulated call drifts below the closed form, which is the expected value of the put side of parity)
+
+
+class CEVModel:
+    def __init__(self, S0, X, T, r, sigma, gamma, q=0.0, num_simulations=10000, num_steps=252, batch_size=100000,
+                 seed=None):
+        self.S0 = S0
+        self.X = X
+        self.T = T
+        self.r = r
+        self.sigma = sigma
+        self.gamma = gamma
+        self.q = q
+        self.num_simulations = num_simulations
+        self.num_steps = num_steps
+        self.batch_size = batch_size  # paths held in memory at once by the simulator
+        self.seed = seed
+
+    def local_vol(self, S):
+        return self.sigma * np.asarray(S, dtype=float) ** (self.gamma - 1)
+
+    @instrument('cev_closed_form')
+    def price(self, option_type='call', strikes=None):
+        # closed form (schroder 1989) through the noncentral chi-square cdf, vectorized over strikes and
+        # call/put labels; gamma < 1 is the version with absorption at zero
+        X = np.asarray(self.X if strikes is None else strikes, dtype=float)
+        X, is_call = np.broadcast_arrays(X, call_mask(option_type))
+        record('cev_closed_form', contracts=X.size)
+        spot_disc = self.S0 * np.exp(-self.q * self.T)
+        strike_disc = X * np.exp(-self.r * self.T)
+
+        if self.gamma == 1:
+            return price_batch(self.S0, X, self.T, self.r, self.sigma, self.q, is_call)
+
+        drift = self.r - self.q
+        one_minus = 1 - self.gamma
+        # variance of the time change
+        if drift == 0:
+            v = self.sigma ** 2 * self.T
+        else:
+            v = self.sigma ** 2 / (2 * drift * (self.gamma - 1)) * (np.exp(2 * drift * (self.gamma - 1) * self.T) - 1)
+        a = (X * np.exp(-drift * self.T)) ** (2 * one_minus) / (one_minus ** 2 * v)
+        b = 1 / one_minus
+        c = self.S0 ** (2 * one_minus) / (one_minus ** 2 * v)
+
+        if self.gamma < 1:
+            spot_prob = chndtr(a, b + 2, c)      # P(S_T > X) under the share measure is 1 - spot_prob
+            strike_prob = chndtr(c, b, a)        # P(S_T > X) under the pricing measure
+        else:
+            spot_prob = chndtr(c, -b, a)
+            strike_prob = chndtr(a, 2 - b, c)
+        call = spot_disc * (1 - spot_prob) - strike_disc * strike_prob
+        put = strike_disc * (1 - strike_prob) - spot_disc * spot_prob
+        return np.where(is_call, call, put)
+
+    def call_price(self):
+        return float(self.price('call'))
+
+    def put_price(self):
+        return float(self.price('put'))
+
+    def simulate_terminal(self, num_paths, rng, sampler=None):
+        S, _ = self._roll(num_paths, rng, sampler=sampler)
+        return S
+
+    def _roll(self, num_paths, rng, antithetic=False, moment_matching=False, sampler=None):
+        # euler in log space with the local vol sigma S^(gamma - 1) of the start of the step: prices stay positive
+        # without the hard floor of the notebook simulator (whose clipped paths made gamma = 0.5 / 1.5 unstable)
+        # and e^-(r-q)t S_t stays a martingale step by step. only the current S is kept (memory O(num_paths));
+        # returns terminal S and the sum of the shocks, which drives the black-scholes control variate
+        dt = self.T / self.num_steps
+        sqrt_dt = np.sqrt(dt)
+        S = np.full(num_paths, float(self.S0))
+        shock_sum = np.zeros(num_paths)
+        increments = sampler.increments(num_paths, self.num_steps)[:, :, 0] if sampler is not None else None
+
+        if use_compiled():
+            block = step_block(num_paths, self.num_steps)
+            for start in range(0, self.num_steps, block):
+                stop = min(start + block, self.num_steps)
+                if increments is not None:
+                    z = np.ascontiguousarray(increments[:, start:stop].T)
+                else:
+                    z = np.empty((stop - start, num_paths))
+                    for t in range(stop - start):
+                        z[t] = draw_normals(rng, num_paths, antithetic, moment_matching)
+                cev_steps(S, shock_sum, z, dt, self.r - self.q, self.sigma, self.gamma)
+            return S, shock_sum
+
+        for t in range(self.num_steps):
+            z = increments[:, t] if increments is not None else draw_normals(rng, num_paths, antithetic, moment_matching)
+            shock_sum += z
+            vol = self.local_vol(S)
+            S *= np.exp((self.r - self.q - 0.5 * vol ** 2) * dt + vol * sqrt_dt * z)
+        return S, shock_sum
+
+    def option_price(self, option_type='call', antithetic=False, moment_matching=False, control_variates=(), sampler=None,
+                     workers=None, backend='process'):
+        return self.estimate(option_type, antithetic, moment_matching, control_variates, sampler, workers, backend)['price']
+
+    @instrument('cev')
+    def estimate(self, option_type='call', antithetic=False, moment_matching=False, control_variates=(), sampler=None,
+                 workers=None, backend='process'):
+        # monte carlo price, std_error and vr_factor, batch_size paths at a time
+        # control_variates can hold 'spot' (mean S0 e^(r-q)T) and 'black_scholes' (the option on a gbm path with the
+        # starting local vol driven by the same shocks, priced in closed form)
+        if option_type not in ('call', 'put'):
+            raise ValueError("Invalid option type. Must be 'call' or 'put'.")
+        if set(control_variates) - {'spot', 'black_scholes'}:
+            raise ValueError("control_variates can only contain 'spot' and 'black_scholes'")
+        if sampler is not None and (antithetic or moment_matching):
+            raise ValueError("antithetic and moment_matching apply to pseudo-random draws, not to a sampler")
+        if sampler is not None and workers is not None:
+            raise ValueError("a sampler holds one sequence and cannot be sharded across workers")
+
+        bs_sigma = float(self.local_vol(self.S0))
+        bs_model = BlackScholesModel(self.S0, self.X, self.T, self.r, bs_sigma, self.q)
+        growth = np.exp(self.r * self.T)
+        control_means = [self.S0 * np.exp((self.r - self.q) * self.T) if name == 'spot'
+                         else (bs_model.call_price() if option_type == 'call' else bs_model.put_price()) * growth
+                         for name in control_variates]
+
+        record('cev', paths=self.num_simulations, path_steps=self.num_simulations * self.num_steps)
+        if workers is None:
+            accumulator = self._accumulate(option_type, antithetic, moment_matching, tuple(control_variates),
+                                           control_means, self.num_simulations, np.random.default_rng(self.seed),
+                                           sampler)
+        else:
+            shard = partial(self._shard, option_type, antithetic, moment_matching, tuple(control_variates),
+                            control_means)
+            accumulator = run_sharded(shard, self.num_simulations, self.seed, workers, backend,
+                                      multiple=2 if antithetic else 1)
+        return accumulator.result(np.exp(-self.r * self.T))
+
+    def _shard(self, option_type, antithetic, moment_matching, control_variates, control_means, num_paths,
+               seed_sequence):
+        return self._accumulate(option_type, antithetic, moment_matching, control_variates, control_means,
+                                num_paths, np.random.default_rng(seed_sequence))
+
+    def _accumulate(self, option_type, antithetic, moment_matching, control_variates, control_means, num_paths, rng,
+                    sampler=None):
+        sign = 1.0 if option_type == 'call' else -1.0
+        bs_sigma = float(self.local_vol(self.S0))
+        accumulator = PayoffAccumulator(control_means)
+        for start in range(0, num_paths, self.batch_size):
+            ST, shock_sum = self._roll(min(self.batch_size, num_paths - start), rng, antithetic, moment_matching,
+                                       sampler)
+            payoffs = np.maximum(sign * (ST - self.X), 0)
+
+            controls = []
+            for name in control_variates:
+                if name == 'spot':
+                    controls.append(ST)
+                else:
+                    gbm_ST = self.S0 * np.exp((self.r - self.q - 0.5 * bs_sigma ** 2) * self.T
+                                              + bs_sigma * np.sqrt(self.T / self.num_steps) * shock_sum)
+                    controls.append(np.maximum(sign * (gbm_ST - self.X), 0))
+            accumulator.add(payoffs, controls, antithetic)
+        return accumulator
+
+    def smile(self, strikes, option_type=None):
+        # closed-form prices and black-scholes implied vols for a whole strike grid in one vectorized pass
+        # option_type defaults to out-of-the-money options (puts below the forward, calls above)
+        strikes = np.asarray(strikes, dtype=float)
+        if option_type is None:
+            forward = self.S0 * np.exp((self.r - self.q) * self.T)
+            option_type = strikes >= forward
+        is_call = np.broadcast_to(call_mask(option_type), strikes.shape)
+        prices = self.price(is_call, strikes)
+        implied_vol, status = implied_volatility_batch(prices, self.S0, strikes, self.T, self.r, self.q, is_call)
+        return pd.DataFrame({
+            'strike': strikes,
+            'option_type': np.where(is_call, 'call', 'put'),
+            'price': prices,
+            'impliedVol': implied_vol,
+            'ivStatus': status,
+        })
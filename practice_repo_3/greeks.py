@@ -1,62 +1,116 @@
-
-import numpy as np
-from scipy.stats import norm
-
-class Greeks:
-    def __init__(self, S0, X, T, r, sigma, q=0.0):
-        self.S0 = S0
-        self.X = X
-        self.T = T
-        self.r = r
-        self.sigma = sigma
-        self.q = q  # Dividend yield
-
-    def d1(self):
-        return (np.log(self.S0 / self.X) + (self.r - self.q + 0.5 * self.sigma ** 2) * self.T) / (self.sigma * np.sqrt(self.T))
-
-    def d2(self):
-        return self.d1() - self.sigma * np.sqrt(self.T)
-
-    def delta(self, option_type='call'):
-        d1 = self.d1()
-        if option_type == 'call':
-            return np.exp(-self.q * self.T) * norm.cdf(d1)
-        elif option_type == 'put':
-            return np.exp(-self.q * self.T) * (norm.cdf(d1) - 1)
-
-    def gamma(self):
-        d1 = self.d1()
-        return np.exp(-self.q * self.T) * norm.pdf(d1) / (self.S0 * self.sigma * np.sqrt(self.T))
-
-    def theta(self, option_type='call'):
-        d1 = self.d1()
-        d2 = self.d2()
-        first_term = - (self.S0 * norm.pdf(d1) * self.sigma * np.exp(-self.q * self.T)) / (2 * np.sqrt(self.T))
-        
-        if option_type == 'call':
-            second_term = self.q * self.S0 * norm.cdf(d1) * np.exp(-self.q * self.T)
-            third_term = self.r * self.X * np.exp(-self.r * self.T) * norm.cdf(d2)
-            return (first_term - second_term - third_term) / 365  # Per-day theta
-        elif option_type == 'put':
-            second_term = self.q * self.S0 * norm.cdf(-d1) * np.exp(-self.q * self.T)
-            third_term = self.r * self.X * np.exp(-self.r * self.T) * norm.cdf(-d2)
-            return (first_term + second_term + third_term) / 365  # Per-day theta
-
-    def vega(self):
-        d1 = self.d1()
-        return self.S0 * np.sqrt(self.T) * norm.pdf(d1) * np.exp(-self.q * self.T) / 100
-
-    def rho(self, option_type='call'):
-        d2 = self.d2()
-        if option_type == 'call':
-            return self.X * self.T * np.exp(-self.r * self.T) * norm.cdf(d2) / 100
-        elif option_type == 'put':
-            return -self.X * self.T * np.exp(-self.r * self.T) * norm.cdf(-d2) / 100
-
-    def all_greeks(self, option_type='call'):
-        delta = self.delta(option_type)
-        gamma = self.gamma()
-        theta = self.theta(option_type)
-        vega = self.vega()
-        rho = self.rho(option_type)
-        return delta, gamma, theta, vega, rho
+
+import numpy as np
+from scipy.special import ndtr
+from scipy.stats import norm
+
+from black_scholes import call_mask, check_positive
+from instrumentation import instrument, record
+
+class Greeks:
+    def __init__(self, S0, X, T, r, sigma, q=0.0):
+        self.S0 = S0
+        self.X = X
+        self.T = T
+        self.r = r
+        self.sigma = sigma
+        self.q = q  # Dividend yield
+
+    def d1(self):
+        return (np.log(self.S0 / self.X) + (self.r - self.q + 0.5 * self.sigma ** 2) * self.T) / (self.sigma * np.sqrt(self.T))
+
+    def d2(self):
+        return self.d1() - self.sigma * np.sqrt(self.T)
+
+    def delta(self, option_type='call'):
+        d1 = self.d1()
+        if option_type == 'call':
+            return np.exp(-self.q * self.T) * norm.cdf(d1)
+        elif option_type == 'put':
+            return np.exp(-self.q * self.T) * (norm.cdf(d1) - 1)
+
+    def gamma(self):
+        d1 = self.d1()
+        return np.exp(-self.q * self.T) * norm.pdf(d1) / (self.S0 * self.sigma * np.sqrt(self.T))
+
+    def theta(self, option_type='call'):
+        d1 = self.d1()
+        d2 = self.d2()
+        first_term = - (self.S0 * norm.pdf(d1) * self.sigma * np.exp(-self.q * self.T)) / (2 * np.sqrt(self.T))
+        
+        if option_type == 'call':
+            second_term = self.q * self.S0 * norm.cdf(d1) * np.exp(-self.q * self.T)
+            third_term = self.r * self.X * np.exp(-self.r * self.T) * norm.cdf(d2)
+            return (first_term + second_term - third_term) / 365  # Per-day theta
+        elif option_type == 'put':
+            second_term = self.q * self.S0 * norm.cdf(-d1) * np.exp(-self.q * self.T)
+            third_term = self.r * self.X * np.exp(-self.r * self.T) * norm.cdf(-d2)
+            return (first_term - second_term + third_term) / 365  # Per-day theta
+
+    def vega(self):
+        d1 = self.d1()
+        return self.S0 * np.sqrt(self.T) * norm.pdf(d1) * np.exp(-self.q * self.T) / 100
+
+    def rho(self, option_type='call'):
+        d2 = self.d2()
+        if option_type == 'call':
+            return self.X * self.T * np.exp(-self.r * self.T) * norm.cdf(d2) / 100
+        elif option_type == 'put':
+            return -self.X * self.T * np.exp(-self.r * self.T) * norm.cdf(-d2) / 100
+
+    def all_greeks(self, option_type='call'):
+        # one fused pass instead of recomputing d1 and the normal cdf for every greek
+        greeks = greeks_batch(self.S0, self.X, self.T, self.r, self.sigma, self.q, option_type)
+        return greeks['delta'], greeks['gamma'], greeks['theta'] / 365, greeks['vega'] / 100, greeks['rho'] / 100
+
+
+# fused closed-form kernel - d1, d2, discount factors, pdf and cdf are computed once and every greek is built from them
+# works on arrays of contracts; all values are in raw units (per 1.0 of vol/rate, theta and the other
+# time greeks per year of calendar time, so theta = dV/dt = -dV/dT)
+
+@instrument('greeks')
+def greeks_batch(S0, X, T, r, sigma, q=0.0, option_type='call'):
+    S0, X, T, r, sigma, q = (np.asarray(a, dtype=float) for a in (S0, X, T, r, sigma, q))
+    S0, X, T, r, sigma, q, is_call = np.broadcast_arrays(S0, X, T, r, sigma, q, call_mask(option_type))
+    record('greeks', contracts=S0.size)
+    for name, values in (('S0', S0), ('X', X), ('T', T), ('sigma', sigma)):
+        check_positive(name, values)
+
+    sqrt_T = np.sqrt(T)
+    vol_sqrt_T = sigma * sqrt_T
+    d1 = (np.log(S0 / X) + (r - q + 0.5 * sigma ** 2) * T) / vol_sqrt_T
+    d2 = d1 - vol_sqrt_T
+
+    # +1 for calls, -1 for puts so both sides share one set of formulas
+    sign = np.where(is_call, 1.0, -1.0)
+    div_disc = np.exp(-q * T)
+    rate_disc = np.exp(-r * T)
+    pdf_d1 = np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi)
+    cdf_d1 = ndtr(sign * d1)
+    cdf_d2 = ndtr(sign * d2)
+
+    spot_disc = S0 * div_disc
+    strike_disc = X * rate_disc
+
+    price = sign * (spot_disc * cdf_d1 - strike_disc * cdf_d2)
+    delta = sign * div_disc * cdf_d1
+    gamma = div_disc * pdf_d1 / (S0 * vol_sqrt_T)
+    vega = spot_disc * pdf_d1 * sqrt_T
+    theta = (-spot_disc * pdf_d1 * sigma / (2 * sqrt_T)
+             - sign * r * strike_disc * cdf_d2
+             + sign * q * spot_disc * cdf_d1)
+    rho = sign * X * T * rate_disc * cdf_d2
+
+    # second order
+    drift_term = (2 * (r - q) * T - d2 * vol_sqrt_T) / (2 * T * vol_sqrt_T)
+    vanna = -div_disc * pdf_d1 * d2 / sigma
+    charm = sign * q * div_disc * cdf_d1 - div_disc * pdf_d1 * drift_term
+    speed = -gamma / S0 * (d1 / vol_sqrt_T + 1)
+    color = gamma / (2 * T) * (2 * q * T + 1 + 2 * T * drift_term * d1)
+    zomma = gamma * (d1 * d2 - 1) / sigma
+    veta = vega * (q + (r - q) * d1 / vol_sqrt_T - (1 + d1 * d2) / (2 * T))
+    volga = vega * d1 * d2 / sigma
+
+    return {
+        'price': price, 'delta': delta, 'gamma': gamma, 'vega': vega, 'theta': theta, 'rho': rho,
+        'vanna': vanna, 'charm': charm, 'speed': speed, 'color': color, 'zomma': zomma, 'veta': veta, 'volga': volga,
+    }
@@ -1,45 +1,366 @@
-
-import numpy as np
-
-class HestonModel:
-    def __init__(self, S0, X, T, r, kappa, theta, sigma, v0, rho, num_simulations=10000, num_steps=252):
-        self.S0 = S0
-        self.X = X
-        self.T = T
-        self.r = r
-        self.kappa = kappa
-        self.theta = theta
-        self.sigma = sigma
-        self.v0 = v0
-        self.rho = rho
-        self.num_simulations = num_simulations
-        self.num_steps = num_steps
-
-    def simulate_price_paths(self):
-        dt = self.T / self.num_steps
-        S = np.zeros((self.num_simulations, self.num_steps + 1))
-        v = np.zeros((self.num_simulations, self.num_steps + 1))
-
-        S[:, 0] = self.S0
-        v[:, 0] = self.v0
-
-        for t in range(1, self.num_steps + 1):
-            z1 = np.random.standard_normal(self.num_simulations)
-            z2 = np.random.standard_normal(self.num_simulations)
-            z2 = self.rho * z1 + np.sqrt(1 - self.rho ** 2) * z2
-
-            v[:, t] = np.maximum(v[:, t-1] + self.kappa * (self.theta - v[:, t-1]) * dt +
-                                 self.sigma * np.sqrt(v[:, t-1]) * np.sqrt(dt) * z1, 0)
-            S[:, t] = S[:, t-1] * np.exp((self.r - 0.5 * v[:, t]) * dt + np.sqrt(v[:, t] * dt) * z2)
-
-        return S
-
-    def option_price(self, option_type='call'):
-        price_paths = self.simulate_price_paths()
-        if option_type == 'call':
-            payoffs = np.maximum(price_paths[:, -1] - self.X, 0)
-        else:
-            payoffs = np.maximum(self.X - price_paths[:, -1], 0)
-        
-        option_price = np.exp(-self.r * self.T) * np.mean(payoffs)
-        return option_price
+
+from functools import partial
+
+import numpy as np
+from scipy.special import ndtr
+
+from black_scholes import BlackScholesModel
+from instrumentation import instrument, record
+from kernels import heston_paths, heston_steps, step_block, use_compiled
+from parallel import run_sharded
+from variance_reduction import PayoffAccumulator, draw_normals
+
+def heston_characteristic_function(u, T, r, kappa, theta, sigma, v0, rho):
+    # E[exp(i u log(S_T / S0))] in the "little heston trap" form (Albrecher et al.): with g built from
+    # kappa - rho sigma i u - d the complex log never crosses its branch cut, so long maturities stay stable
+    u = np.asarray(u, dtype=complex)
+    beta = kappa - rho * sigma * 1j * u
+    d = np.sqrt(beta ** 2 + sigma ** 2 * (1j * u + u ** 2))
+    g = (beta - d) / (beta + d)
+    exp_dT = np.exp(-d * T)
+    C = r * 1j * u * T + kappa * theta / sigma ** 2 * ((beta - d) * T - 2 * np.log((1 - g * exp_dT) / (1 - g)))
+    D = (beta - d) / sigma ** 2 * (1 - exp_dT) / (1 - g * exp_dT)
+    return np.exp(C + D * v0)
+
+
+def heston_characteristic_function_gradient(u, T, r, kappa, theta, sigma, v0, rho):
+    # the characteristic function and its derivatives w.r.t. (kappa, theta, sigma, v0, rho), shape (5,) + u.shape,
+    # by differentiating the little-trap formula term by term (used for analytic calibration jacobians)
+    u = np.asarray(u, dtype=complex)
+    iu = 1j * u
+    beta = kappa - rho * sigma * iu
+    d = np.sqrt(beta ** 2 + sigma ** 2 * (iu + u ** 2))
+    g = (beta - d) / (beta + d)
+    E = np.exp(-d * T)
+    L = np.log((1 - g * E) / (1 - g))
+    B = (beta - d) * T - 2 * L
+    F = (1 - E) / (1 - g * E)
+    C = r * iu * T + kappa * theta / sigma ** 2 * B
+    D = (beta - d) / sigma ** 2 * F
+    phi = np.exp(C + D * v0)
+
+    one = np.ones_like(u)
+    # d beta and d d w.r.t. kappa, sigma, rho (theta and v0 do not enter them)
+    beta_x = {'kappa': one, 'sigma': -rho * iu, 'rho': -sigma * iu}
+    d_x = {'kappa': beta / d, 'sigma': (beta * beta_x['sigma'] + sigma * (iu + u ** 2)) / d,
+           'rho': beta * beta_x['rho'] / d}
+    C_x, D_x = {}, {}
+    for name in ('kappa', 'sigma', 'rho'):
+        g_x = 2 * (beta_x[name] * d - beta * d_x[name]) / (beta + d) ** 2
+        E_x = -T * d_x[name] * E
+        L_x = -(g_x * E + g * E_x) / (1 - g * E) + g_x / (1 - g)
+        B_x = (beta_x[name] - d_x[name]) * T - 2 * L_x
+        F_x = (-E_x * (1 - g * E) + (1 - E) * (g_x * E + g * E_x)) / (1 - g * E) ** 2
+        C_x[name] = kappa * theta / sigma ** 2 * B_x
+        D_x[name] = ((beta_x[name] - d_x[name]) * F + (beta - d) * F_x) / sigma ** 2
+    # explicit dependence of C and D on kappa and sigma outside beta and d
+    C_x['kappa'] = C_x['kappa'] + theta / sigma ** 2 * B
+    C_x['sigma'] = C_x['sigma'] - 2 * kappa * theta / sigma ** 3 * B
+    D_x['sigma'] = D_x['sigma'] - 2 * D / sigma
+
+    gradient = np.stack([
+        phi * (C_x['kappa'] + v0 * D_x['kappa']),
+        phi * kappa / sigma ** 2 * B,
+        phi * (C_x['sigma'] + v0 * D_x['sigma']),
+        phi * D,
+        phi * (C_x['rho'] + v0 * D_x['rho']),
+    ])
+    return phi, gradient
+
+
+def heston_cumulants(T, r, kappa, theta, sigma, v0, rho, h=1e-3):
+    # first two cumulants of log(S_T / S0), they size the cos truncation range; taken from the characteristic
+    # function by central differences of its log (the closed forms in the literature are easy to get wrong)
+    log_phi = np.log(heston_characteristic_function(np.array([-h, 0.0, h]), T, r, kappa, theta, sigma, v0, rho))
+    c1 = ((log_phi[2] - log_phi[0]) / (2j * h)).real
+    c2 = -((log_phi[2] - 2 * log_phi[1] + log_phi[0]) / h ** 2).real
+    return c1, abs(c2)
+
+
+@instrument('heston_cos')
+def heston_cos_prices(S0, strikes, T, r, kappa, theta, sigma, v0, rho, option_type='call', n_terms=None,
+                      truncation=20, tol=1e-8):
+    # european prices for a whole strike grid of one expiry with the cos method
+    # the density of z = log(S_T / S0) on [a, b] is expanded in cosines whose coefficients come from
+    # one evaluation of the characteristic function, shared by every strike; a strike only enters through
+    # the closed-form integrals of the put payoff K - S0 e^z against those cosines. calls follow from parity
+    # n_terms=None adds terms in doubling blocks until a block moves no price by more than tol * S0; a fixed
+    # count is needed far less often than one might think, but long maturities with large vol of vol need
+    # thousands of terms while typical surfaces converge with a few hundred
+    if option_type not in ('call', 'put'):
+        raise ValueError("Invalid option type. Must be 'call' or 'put'.")
+    strikes = np.atleast_1d(np.asarray(strikes, dtype=float))
+    c1, c2 = heston_cumulants(T, r, kappa, theta, sigma, v0, rho)
+    a = c1 - truncation * np.sqrt(c2)
+    b = c1 + truncation * np.sqrt(c2)
+    # put payoff is positive for z < log(K / S0), its cosine integrals run over [a, d]
+    d = np.clip(np.log(strikes / S0), a, b)[:, None]
+    exp_d = np.exp(d)
+
+    puts = np.zeros(strikes.size)
+    start, size = 0, n_terms or 128
+    while True:
+        k = np.arange(start, start + size)
+        w = k * np.pi / (b - a)
+        phi = heston_characteristic_function(w, T, r, kappa, theta, sigma, v0, rho)
+        coefficients = 2 / (b - a) * np.real(phi * np.exp(-1j * w * a))
+        if start == 0:
+            coefficients[0] *= 0.5
+
+        angle = w * (d - a)
+        cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+        chi = (exp_d * (cos_angle + w * sin_angle) - np.exp(a)) / (1 + w ** 2)
+        psi = np.where(k == 0, d - a, sin_angle / np.where(k == 0, 1, w))
+        block = (strikes[:, None] * psi - S0 * chi) @ coefficients
+        puts += block
+
+        start += size
+        if n_terms is not None or np.max(np.abs(block)) < tol * S0 or start >= 2 ** 16:
+            break
+        size = start
+
+    record('heston_cos', strikes=strikes.size, terms=start)
+    puts = np.maximum(np.exp(-r * T) * puts, np.maximum(strikes * np.exp(-r * T) - S0, 0))
+    if option_type == 'put':
+        return puts
+    return puts + S0 - strikes * np.exp(-r * T)
+
+
+class HestonModel:
+    def __init__(self, S0, X, T, r, kappa, theta, sigma, v0, rho, num_simulations=10000, num_steps=252,
+                 batch_size=100000, seed=None, scheme='euler'):
+        if scheme not in ('euler', 'qe'):
+            raise ValueError("scheme must be 'euler' or 'qe'")
+        self.S0 = S0
+        self.X = X
+        self.T = T
+        self.r = r
+        self.kappa = kappa
+        self.theta = theta
+        self.sigma = sigma
+        self.v0 = v0
+        self.rho = rho
+        self.num_simulations = num_simulations
+        self.num_steps = num_steps
+        self.batch_size = batch_size  # paths held in memory at once by the rolling-state simulator
+        self.seed = seed
+        # 'euler': full-truncation euler on v, needs fine steps (~daily) and is biased when 2 kappa theta < sigma^2
+        # 'qe': andersen's quadratic-exponential scheme with martingale correction, accurate with 8-16 steps a year
+        self.scheme = scheme
+
+    def characteristic_function(self, u):
+        return heston_characteristic_function(u, self.T, self.r, self.kappa, self.theta, self.sigma, self.v0, self.rho)
+
+    def cos_price(self, option_type='call', strikes=None, n_terms=None, truncation=20):
+        # semi-analytic price (no simulation noise or time-step bias); strikes: a grid priced in one transform,
+        # defaults to the model strike X and then returns a float
+        prices = heston_cos_prices(self.S0, self.X if strikes is None else strikes, self.T, self.r, self.kappa,
+                                   self.theta, self.sigma, self.v0, self.rho, option_type, n_terms, truncation)
+        return float(prices[0]) if strikes is None else prices
+
+    def simulate_price_paths(self, sampler=None):
+        # sampler: optional backend from qmc.py (PseudoRandomSampler / SobolSampler), default is a Generator seeded with seed
+        dt = self.T / self.num_steps
+        rng = np.random.default_rng(self.seed)
+        S = np.zeros((self.num_simulations, self.num_steps + 1))
+        v = np.zeros((self.num_simulations, self.num_steps + 1))
+
+        S[:, 0] = self.S0
+        v[:, 0] = self.v0
+        increments = sampler.increments(self.num_simulations, self.num_steps, 2) if sampler is not None else None
+
+        if use_compiled():
+            # z1 and w2 alternate per step, so one (steps, 2, paths) draw is the same stream
+            if increments is None:
+                increments = rng.standard_normal((self.num_steps, 2, self.num_simulations)).transpose(2, 0, 1)
+            heston_paths(S, v, np.ascontiguousarray(increments[:, :, 0].T), np.ascontiguousarray(increments[:, :, 1].T),
+                         dt, self.r, self.kappa, self.theta, self.sigma, self.rho, self.scheme == 'qe')
+            return S
+
+        for t in range(1, self.num_steps + 1):
+            if increments is not None:
+                z1, w2 = increments[:, t - 1, 0], increments[:, t - 1, 1]
+            else:
+                z1 = rng.standard_normal(self.num_simulations)
+                w2 = rng.standard_normal(self.num_simulations)
+            log_return, v[:, t] = self._step(v[:, t-1], z1, w2, dt)
+            S[:, t] = S[:, t-1] * np.exp(log_return)
+
+        return S
+
+    def simulate_terminal(self, num_paths, rng, running_average=False, sampler=None):
+        # rolling-state version of simulate_price_paths: only the current S and v vectors are kept,
+        # so memory is O(num_paths) instead of O(num_paths * num_steps)
+        S, S_average, _ = self._roll(num_paths, rng, running_average=running_average, sampler=sampler)
+        if running_average:
+            return S, S_average
+        return S
+
+    def _roll(self, num_paths, rng, antithetic=False, moment_matching=False, running_average=False, sampler=None):
+        # returns terminal S, the running average of S (or None) and the sum of the spot shocks
+        # rho z1 + sqrt(1 - rho^2) w2, which drives the black-scholes control variate
+        # with a qmc.py sampler the whole (num_paths, num_steps, 2) block of normals is drawn up front,
+        # so memory is O(num_paths * num_steps) for that batch
+        dt = self.T / self.num_steps
+        rho_bar = np.sqrt(1 - self.rho ** 2)
+        S = np.full(num_paths, float(self.S0))
+        v = np.full(num_paths, float(self.v0))
+        S_sum = np.zeros(num_paths) if running_average else None
+        shock_sum = np.zeros(num_paths)
+
+        increments = sampler.increments(num_paths, self.num_steps, 2) if sampler is not None else None
+
+        if use_compiled():
+            # the same draws, in blocks of steps, each block advanced by one fused kernel call
+            block = step_block(num_paths, self.num_steps)
+            for start in range(0, self.num_steps, block):
+                stop = min(start + block, self.num_steps)
+                if increments is not None:
+                    z1 = np.ascontiguousarray(increments[:, start:stop, 0].T)
+                    w2 = np.ascontiguousarray(increments[:, start:stop, 1].T)
+                else:
+                    z1, w2 = np.empty((2, stop - start, num_paths))
+                    for t in range(stop - start):
+                        z1[t] = draw_normals(rng, num_paths, antithetic, moment_matching)
+                        w2[t] = draw_normals(rng, num_paths, antithetic, moment_matching)
+                heston_steps(S, v, shock_sum, S_sum if running_average else shock_sum, z1, w2, dt, self.r,
+                             self.kappa, self.theta, self.sigma, self.rho, self.scheme == 'qe', running_average)
+            return S, (S_sum / self.num_steps if running_average else None), shock_sum
+
+        for t in range(self.num_steps):
+            if increments is not None:
+                z1, w2 = increments[:, t, 0], increments[:, t, 1]
+            else:
+                z1 = draw_normals(rng, num_paths, antithetic, moment_matching)
+                w2 = draw_normals(rng, num_paths, antithetic, moment_matching)
+            shock_sum += self.rho * z1 + rho_bar * w2
+
+            log_return, v = self._step(v, z1, w2, dt)
+            S *= np.exp(log_return)
+            if running_average:
+                S_sum += S
+
+        return S, (S_sum / self.num_steps if running_average else None), shock_sum
+
+    def _step(self, v, z1, w2, dt):
+        # one time step of the variance v (vector) driven by the normals z1 (variance) and w2 (independent spot
+        # shock); returns (log return of S, new v)
+        if self.scheme == 'qe':
+            return self._qe_step(v, z1, w2, dt)
+        # spot moves with the start-of-step variance; using the updated v (correlated with z1, hence the spot
+        # shock) breaks the martingale property of the discounted spot and biases prices down
+        z2 = self.rho * z1 + np.sqrt(1 - self.rho ** 2) * w2
+        log_return = (self.r - 0.5 * v) * dt + np.sqrt(v * dt) * z2
+        v_next = np.maximum(v + self.kappa * (self.theta - v) * dt + self.sigma * np.sqrt(v * dt) * z1, 0)
+        return log_return, v_next
+
+    def _qe_step(self, v, z1, w2, dt, psi_critical=1.5):
+        # andersen (2008): v_next is drawn from a distribution with the exact conditional mean m and variance s2
+        # of the cir process - a squared gaussian a (b + z)^2 when psi = s2 / m^2 is small, otherwise a point mass
+        # at 0 mixed with an exponential (the uniform is ndtr(z1), so samplers and antithetics still work)
+        kappa, theta, sigma, rho = self.kappa, self.theta, self.sigma, self.rho
+        decay = np.exp(-kappa * dt)
+        m = theta + (v - theta) * decay
+        s2 = v * sigma ** 2 * decay * (1 - decay) / kappa + theta * sigma ** 2 * (1 - decay) ** 2 / (2 * kappa)
+        psi = s2 / m ** 2
+        quadratic = psi <= psi_critical
+
+        # log spot from the trapezoid rule for the integrated variance (gamma1 = gamma2 = 1/2)
+        K1 = 0.5 * dt * (kappa * rho / sigma - 0.5) - rho / sigma
+        K2 = 0.5 * dt * (kappa * rho / sigma - 0.5) + rho / sigma
+        K3 = 0.5 * dt * (1 - rho ** 2)
+        A = K2 + 0.5 * K3
+
+        # each branch only on its own paths (as the scalar kernel does): on the exponential paths 1 - 2 A a can be
+        # <= 0, so evaluating the quadratic branch there would take logs of negatives
+        m, psi, z1, quadratic = np.broadcast_arrays(m, psi, z1, quadratic)
+        v_next = np.empty(m.shape)
+        K0 = np.empty(m.shape)
+        inv_psi = 2 / psi[quadratic]
+        b2 = inv_psi - 1 + np.sqrt(inv_psi * (inv_psi - 1))
+        a = m[quadratic] / (1 + b2)
+        v_next[quadratic] = a * (np.sqrt(b2) + z1[quadratic]) ** 2
+        # K0 is the per-path martingale correction, it replaces -rho kappa theta dt / sigma so that E[S_next] = S e^(r dt)
+        K0[quadratic] = -A * b2 * a / (1 - 2 * A * a) + 0.5 * np.log(1 - 2 * A * a)
+
+        exponential = ~quadratic
+        p = (psi[exponential] - 1) / (psi[exponential] + 1)
+        beta = (1 - p) / m[exponential]
+        u = ndtr(z1[exponential])
+        v_next[exponential] = np.where(u <= p, 0.0, np.log((1 - p) / np.maximum(1 - u, 1e-300)) / beta)
+        K0[exponential] = -np.log(p + beta * (1 - p) / (beta - A))
+        K0 -= (K1 + 0.5 * K3) * v
+        log_return = self.r * dt + K0 + K1 * v + K2 * v_next + np.sqrt(K3 * (v + v_next)) * w2
+        return log_return, v_next
+
+    def option_price(self, option_type='call', antithetic=False, moment_matching=False, control_variates=(), sampler=None,
+                     workers=None, backend='process'):
+        return self.estimate(option_type, antithetic, moment_matching, control_variates, sampler, workers, backend)['price']
+
+    def price_and_std_error(self, option_type='call'):
+        result = self.estimate(option_type)
+        return result['price'], result['std_error']
+
+    @instrument('heston')
+    def estimate(self, option_type='call', antithetic=False, moment_matching=False, control_variates=(), sampler=None,
+                 workers=None, backend='process'):
+        # paths are simulated batch_size at a time and merged through running payoff/control sums
+        # control_variates can hold 'spot' (terminal spot, mean S0 e^rT) and 'black_scholes' (the same option on a
+        # gbm path driven by the same spot shocks with the expected average variance, priced in closed form)
+        # workers: shard the paths over that many processes/threads (see parallel.py), each with its own stream
+        # spawned from seed; reproducible for a fixed seed and worker count. None keeps the single-stream run
+        if option_type not in ('call', 'put'):
+            raise ValueError("Invalid option type. Must be 'call' or 'put'.")
+        if set(control_variates) - {'spot', 'black_scholes'}:
+            raise ValueError("control_variates can only contain 'spot' and 'black_scholes'")
+        if sampler is not None and (antithetic or moment_matching):
+            raise ValueError("antithetic and moment_matching apply to pseudo-random draws, not to a sampler")
+        if sampler is not None and workers is not None:
+            raise ValueError("a sampler holds one sequence and cannot be sharded across workers")
+
+        # expected average variance over [0, T] under the cir dynamics
+        kappa_T = self.kappa * self.T
+        bs_variance = self.theta + (self.v0 - self.theta) * (1 - np.exp(-kappa_T)) / kappa_T if kappa_T > 0 else self.v0
+        bs_model = BlackScholesModel(self.S0, self.X, self.T, self.r, np.sqrt(bs_variance))
+        growth = np.exp(self.r * self.T)
+        control_means = [self.S0 * growth if name == 'spot'
+                         else (bs_model.call_price() if option_type == 'call' else bs_model.put_price()) * growth
+                         for name in control_variates]
+
+        record('heston', paths=self.num_simulations, path_steps=self.num_simulations * self.num_steps)
+        if workers is None:
+            accumulator = self._accumulate(option_type, antithetic, moment_matching, tuple(control_variates),
+                                           control_means, bs_variance, self.num_simulations,
+                                           np.random.default_rng(self.seed), sampler)
+        else:
+            shard = partial(self._shard, option_type, antithetic, moment_matching, tuple(control_variates),
+                            control_means, bs_variance)
+            accumulator = run_sharded(shard, self.num_simulations, self.seed, workers, backend,
+                                      multiple=2 if antithetic else 1)
+        return accumulator.result(np.exp(-self.r * self.T))
+
+    def _shard(self, option_type, antithetic, moment_matching, control_variates, control_means, bs_variance,
+               num_paths, seed_sequence):
+        return self._accumulate(option_type, antithetic, moment_matching, control_variates, control_means,
+                                bs_variance, num_paths, np.random.default_rng(seed_sequence))
+
+    def _accumulate(self, option_type, antithetic, moment_matching, control_variates, control_means, bs_variance,
+                    num_paths, rng, sampler=None):
+        # payoff and control sums of num_paths paths drawn from rng, batch_size at a time
+        sign = 1.0 if option_type == 'call' else -1.0
+        accumulator = PayoffAccumulator(control_means)
+        for start in range(0, num_paths, self.batch_size):
+            ST, _, shock_sum = self._roll(min(self.batch_size, num_paths - start), rng, antithetic,
+                                          moment_matching, sampler=sampler)
+            payoffs = np.maximum(sign * (ST - self.X), 0)
+
+            controls = []
+            for name in control_variates:
+                if name == 'spot':
+                    controls.append(ST)
+                else:
+                    gbm_ST = self.S0 * np.exp((self.r - 0.5 * bs_variance) * self.T
+                                              + np.sqrt(bs_variance * self.T / self.num_steps) * shock_sum)
+                    controls.append(np.maximum(sign * (gbm_ST - self.X), 0))
+            accumulator.add(payoffs, controls, antithetic)
+        return accumulator
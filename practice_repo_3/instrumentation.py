@@ -0,0 +1,161 @@
+
+import cProfile
+import functools
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# lightweight counters for the pricing engines
+# the engine entry points are wrapped with @instrument and report their work (paths, time steps, tree nodes,
+# solver iterations, cache hits, ...) with record(). nothing is collected unless a Report is active, and then the
+# cost is one list check per engine call (never per path or per node), so the hooks stay in the code for good.
+#
+#     with profile() as report:
+#         HestonModel(...).estimate('call')
+#     print(report)                      # table per engine
+#     report.to_json('run.json'); report.to_prometheus()
+#
+# counts are recorded in the calling process: engines sharded over worker processes report their totals at
+# the top-level call
+
+_active = []  # reports currently collecting; empty means instrumentation is off
+_lock = threading.Lock()
+
+
+class Report:
+    def __init__(self):
+        self.engines = {}       # engine -> {counter: value}, always with calls and seconds
+        self.wall_seconds = None
+        self.peak_memory = None  # bytes, when captured with memory=True
+        self.profile = None      # pstats.Stats, when captured with cprofile=True
+        self._start = time.perf_counter()
+
+    def add(self, engine, counts):
+        with _lock:
+            counters = self.engines.setdefault(engine, {'calls': 0, 'seconds': 0.0})
+            for name, value in counts.items():
+                counters[name] = counters.get(name, 0) + value
+
+    def to_dict(self):
+        return {
+            'wall_seconds': self.wall_seconds if self.wall_seconds is not None else time.perf_counter() - self._start,
+            'peak_memory_bytes': self.peak_memory,
+            'engines': {engine: dict(counters) for engine, counters in self.engines.items()},
+        }
+
+    def to_frame(self):
+        # pandas only here: the engines import this module, and instrumentation off must not cost an import
+        import pandas as pd
+        return pd.DataFrame.from_dict(self.engines, orient='index').fillna(0)
+
+    def to_json(self, path=None):
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def to_prometheus(self, prefix='pricing'):
+        # text exposition format, one counter family per recorded quantity, labelled by engine
+        families = {}
+        for engine, counters in self.engines.items():
+            for name, value in counters.items():
+                families.setdefault(name, []).append((engine, value))
+        lines = []
+        for name, samples in families.items():
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines += [f'{metric}{{engine="{engine}"}} {float(value):g}' for engine, value in samples]
+        return "\n".join(lines) + "\n"
+
+    def profile_text(self, limit=20, sort='cumulative'):
+        if self.profile is None:
+            return ""
+        stream = io.StringIO()
+        self.profile.stream = stream
+        self.profile.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def __str__(self):
+        if not self.engines:
+            return "no instrumented engine calls"
+        return self.to_frame().to_string(float_format=lambda v: f"{v:.4g}")
+
+
+def record(engine, **counts):
+    # adds counts to every active report; a no-op when instrumentation is off
+    for report in _active:
+        report.add(engine, counts)
+
+
+def enabled():
+    return bool(_active)
+
+
+def instrument(engine):
+    # decorator counting calls and wall time of an engine entry point
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(engine, calls=1, seconds=time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile(cprofile=False, memory=False):
+    # collects everything the engines record inside the block; cprofile / memory also capture a cProfile of
+    # the block and its tracemalloc peak (both slow the block down, use them for one call at a time)
+    report = Report()
+    profiler = cProfile.Profile() if cprofile else None
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif memory:
+        tracemalloc.reset_peak()
+    _active.append(report)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield report
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            report.profile = pstats.Stats(profiler)
+        _active.remove(report)
+        if memory:
+            report.peak_memory = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+        report.wall_seconds = time.perf_counter() - report._start
+
+
+def profile_call(function, *args, cprofile=True, memory=True, **kwargs):
+    # one call with cProfile and tracemalloc capture, returns (result, report)
+    with profile(cprofile=cprofile, memory=memory) as report:
+        result = function(*args, **kwargs)
+    return result, report
+
+
+def enable():
+    # long-running collection (a service or batch job): returns the Report, stop it with disable(report)
+    report = Report()
+    _active.append(report)
+    return report
+
+
+def disable(report):
+    if report in _active:
+        _active.remove(report)
+    report.wall_seconds = time.perf_counter() - report._start
+    return report
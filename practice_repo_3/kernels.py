@@ -0,0 +1,208 @@
+
+import math
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # optional, the models fall back to their numpy loops
+    numba = None
+
+# compiled inner loops for the engines that step sequentially (tree layers, path time steps)
+# numpy vectorizes these loops across nodes/paths only, and every step allocates a handful of temporaries; the
+# kernels here run one fused scalar update per path (or tree row) over all the steps, in place, with prange
+# across paths. they are compiled with numba when it is installed and picked at runtime:
+#     kernels.set_backend('numpy')    # or 'numba' / 'auto' (default), also via PRICING_KERNELS=numpy
+# the random numbers are still drawn by the models in exactly the same order, so both backends give the same
+# prices for a seed up to floating point rounding. without numba the functions below are plain python - far
+# too slow for real use, 'auto' never picks them, but set_backend('python') runs them to check parity
+
+BACKENDS = ('auto', 'numba', 'numpy', 'python')
+_backend = 'auto'
+
+
+def available():
+    return numba is not None
+
+
+def set_backend(name):
+    # returns the previous setting, so callers can restore it
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+    if name == 'numba' and numba is None:
+        raise ImportError("the numba backend needs numba installed (pip install numba)")
+    previous, _backend = _backend, name
+    return previous
+
+
+# the environment setting goes through the same checks, so a typo fails at import instead of meaning 'auto'
+if os.environ.get('PRICING_KERNELS', 'auto') not in BACKENDS:
+    raise ValueError(f"PRICING_KERNELS={os.environ['PRICING_KERNELS']!r}, must be one of {BACKENDS}")
+set_backend(os.environ.get('PRICING_KERNELS', 'auto'))
+
+
+def get_backend():
+    # the backend actually in use
+    if _backend == 'python':
+        return 'python'
+    return 'numba' if numba is not None and _backend != 'numpy' else 'numpy'
+
+
+def use_compiled():
+    # whether the models go through the kernels (compiled, or interpreted under the 'python' backend)
+    return get_backend() != 'numpy'
+
+
+def _jit(parallel=False):
+    if numba is None:
+        return lambda function: function
+    return numba.njit(cache=True, parallel=parallel)
+
+
+prange = numba.prange if numba is not None else range
+
+
+@_jit(parallel=True)
+def tree_backward_induction(values, levels, strikes, disc_up, disc_down, sign, exercise):
+    # values: (strikes, N + 1) terminal payoffs, rolled back in place; node i of layer j sits at price level
+    # levels[N - j + 2 i]; exercise[j] marks the layers where early exercise is allowed
+    n_strikes, width = values.shape
+    N = width - 1
+    result = np.empty(n_strikes)
+    for k in prange(n_strikes):
+        row = values[k]
+        for j in range(N - 1, -1, -1):
+            for i in range(j + 1):
+                value = disc_up * row[i + 1] + disc_down * row[i]
+                if exercise[j]:
+                    intrinsic = sign * (levels[N - j + 2 * i] - strikes[k])
+                    if intrinsic > value:
+                        value = intrinsic
+                row[i] = value
+        result[k] = row[0]
+    return result
+
+
+@_jit(parallel=True)
+def gbm_paths(paths, z, drift_dt, vol_sqrt_dt):
+    # paths: (num_paths, num_steps + 1) with column 0 filled; z: (num_steps, num_paths) in draw order
+    for p in prange(paths.shape[0]):
+        S = paths[p, 0]
+        for t in range(z.shape[0]):
+            S = S * math.exp(drift_dt + vol_sqrt_dt * z[t, p])
+            paths[p, t + 1] = S
+
+
+@_jit()
+def _heston_euler_step(v, z1, w2, dt, r, kappa, theta, sigma, rho):
+    # scalar form of HestonModel._step (full truncation, spot on the start-of-step variance)
+    z2 = rho * z1 + math.sqrt(1 - rho * rho) * w2
+    log_return = (r - 0.5 * v) * dt + math.sqrt(v * dt) * z2
+    v_next = v + kappa * (theta - v) * dt + sigma * math.sqrt(v * dt) * z1
+    return log_return, max(v_next, 0.0)
+
+
+@_jit()
+def _heston_qe_step(v, z1, w2, dt, r, kappa, theta, sigma, rho, psi_critical):
+    # scalar form of HestonModel._qe_step, only the branch the path takes is evaluated
+    decay = math.exp(-kappa * dt)
+    m = theta + (v - theta) * decay
+    s2 = v * sigma ** 2 * decay * (1 - decay) / kappa + theta * sigma ** 2 * (1 - decay) ** 2 / (2 * kappa)
+    psi = s2 / (m * m)
+
+    K1 = 0.5 * dt * (kappa * rho / sigma - 0.5) - rho / sigma
+    K2 = 0.5 * dt * (kappa * rho / sigma - 0.5) + rho / sigma
+    K3 = 0.5 * dt * (1 - rho ** 2)
+    A = K2 + 0.5 * K3
+
+    if psi <= psi_critical:
+        inv_psi = 2 / psi
+        b2 = inv_psi - 1 + math.sqrt(inv_psi * (inv_psi - 1))
+        a = m / (1 + b2)
+        v_next = a * (math.sqrt(b2) + z1) ** 2
+        K0 = -A * b2 * a / (1 - 2 * A * a) + 0.5 * math.log(1 - 2 * A * a)
+    else:
+        p = (psi - 1) / (psi + 1)
+        beta = (1 - p) / m
+        u = 0.5 * math.erfc(-z1 / math.sqrt(2.0))
+        v_next = 0.0 if u <= p else math.log((1 - p) / max(1 - u, 1e-300)) / beta
+        K0 = -math.log(p + beta * (1 - p) / (beta - A))
+    K0 -= (K1 + 0.5 * K3) * v
+    log_return = r * dt + K0 + K1 * v + K2 * v_next + math.sqrt(K3 * (v + v_next)) * w2
+    return log_return, v_next
+
+
+@_jit()
+def _heston_step(v, z1, w2, dt, r, kappa, theta, sigma, rho, qe):
+    if qe:
+        return _heston_qe_step(v, z1, w2, dt, r, kappa, theta, sigma, rho, 1.5)
+    return _heston_euler_step(v, z1, w2, dt, r, kappa, theta, sigma, rho)
+
+
+@_jit(parallel=True)
+def heston_steps(S, v, shock_sum, S_sum, z1, w2, dt, r, kappa, theta, sigma, rho, qe, running_average):
+    # advances the rolling state (S, v, sum of spot shocks, running sum of S) of every path by z1.shape[0]
+    # steps; z1 / w2: (steps, paths). S_sum is only touched when running_average is set
+    rho_bar = math.sqrt(1 - rho * rho)
+    for p in prange(S.shape[0]):
+        spot, variance, shock = S[p], v[p], shock_sum[p]
+        total = S_sum[p] if running_average else 0.0
+        for t in range(z1.shape[0]):
+            shock += rho * z1[t, p] + rho_bar * w2[t, p]
+            log_return, variance = _heston_step(variance, z1[t, p], w2[t, p], dt, r, kappa, theta, sigma, rho, qe)
+            spot *= math.exp(log_return)
+            total += spot
+        S[p], v[p], shock_sum[p] = spot, variance, shock
+        if running_average:
+            S_sum[p] = total
+
+
+@_jit(parallel=True)
+def heston_paths(S, v, z1, w2, dt, r, kappa, theta, sigma, rho, qe):
+    # full (num_paths, num_steps + 1) spot and variance matrices with column 0 filled; z1 / w2: (steps, paths)
+    for p in prange(S.shape[0]):
+        for t in range(z1.shape[0]):
+            log_return, variance = _heston_step(v[p, t], z1[t, p], w2[t, p], dt, r, kappa, theta, sigma, rho, qe)
+            v[p, t + 1] = variance
+            S[p, t + 1] = S[p, t] * math.exp(log_return)
+
+
+@_jit(parallel=True)
+def cev_steps(S, shock_sum, z, dt, drift, sigma, gamma):
+    # log-euler cev steps with the start-of-step local vol sigma S^(gamma - 1); z: (steps, paths)
+    sqrt_dt = math.sqrt(dt)
+    for p in prange(S.shape[0]):
+        spot, shock = S[p], shock_sum[p]
+        for t in range(z.shape[0]):
+            vol = sigma * spot ** (gamma - 1)
+            shock += z[t, p]
+            spot *= math.exp((drift - 0.5 * vol * vol) * dt + vol * sqrt_dt * z[t, p])
+        S[p], shock_sum[p] = spot, shock
+
+
+@_jit()
+def psor(lower, diagonal, upper, rhs, floor, values, omega, tol, max_iter):
+    # projected sor for the tridiagonal complementarity problem A v >= rhs, v >= floor (american exercise);
+    # values holds the starting guess and is updated in place, returns the sweeps used
+    n = values.shape[0]
+    for iteration in range(1, max_iter + 1):
+        error = 0.0
+        for i in range(n):
+            residual = rhs[i] - diagonal[i] * values[i]
+            if i > 0:
+                residual -= lower[i] * values[i - 1]
+            if i < n - 1:
+                residual -= upper[i] * values[i + 1]
+            value = max(floor[i], values[i] + omega * residual / diagonal[i])
+            error = max(error, abs(value - values[i]))
+            values[i] = value
+        if error < tol:
+            return iteration
+    return max_iter
+
+
+def step_block(num_paths, num_steps, max_values=2 ** 20):
+    # steps drawn (and advanced by one kernel call) at a time, so the block of normals stays near max_values
+    return int(min(num_steps, max(1, max_values // max(num_paths, 1))))
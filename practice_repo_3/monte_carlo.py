@@ -1,36 +1,108 @@
-
-import numpy as np
-
-class MonteCarloModel:
-    def __init__(self, S0, X, T, r, sigma, q=0.0, num_simulations=10000, num_steps=252):
-        self.S0 = S0
-        self.X = X
-        self.T = T
-        self.r = r
-        self.sigma = sigma
-        self.q = q
-        self.num_simulations = num_simulations
-        self.num_steps = num_steps
-
-    def simulate_price_paths(self):
-        dt = self.T / self.num_steps
-        price_paths = np.zeros((self.num_simulations, self.num_steps + 1))
-        price_paths[:, 0] = self.S0
-
-        for t in range(1, self.num_steps + 1):
-            z = np.random.standard_normal(self.num_simulations)
-            price_paths[:, t] = price_paths[:, t-1] * np.exp(
-                (self.r - self.q - 0.5 * self.sigma ** 2) * dt + self.sigma * np.sqrt(dt) * z
-            )
-
-        return price_paths
-
-    def option_price(self, option_type='call'):
-        price_paths = self.simulate_price_paths()
-        if option_type == 'call':
-            payoffs = np.maximum(price_paths[:, -1] - self.X, 0)
-        else:
-            payoffs = np.maximum(self.X - price_paths[:, -1], 0)
-        
-        option_price = np.exp(-self.r * self.T) * np.mean(payoffs)
-        return option_price
+
+from functools import partial
+
+import numpy as np
+
+from instrumentation import instrument, record
+from kernels import gbm_paths, use_compiled
+from parallel import run_sharded
+from variance_reduction import PayoffAccumulator, draw_normals
+
+class MonteCarloModel:
+    def __init__(self, S0, X, T, r, sigma, q=0.0, num_simulations=10000, num_steps=252, seed=None):
+        self.S0 = S0
+        self.X = X
+        self.T = T
+        self.r = r
+        self.sigma = sigma
+        self.q = q
+        self.num_simulations = num_simulations
+        self.num_steps = num_steps
+        self.seed = seed
+
+    def simulate_price_paths(self, sampler=None):
+        # sampler: optional backend from qmc.py (PseudoRandomSampler / SobolSampler), default is a Generator seeded with seed
+        dt = self.T / self.num_steps
+        rng = np.random.default_rng(self.seed)
+        price_paths = np.zeros((self.num_simulations, self.num_steps + 1))
+        price_paths[:, 0] = self.S0
+        increments = sampler.increments(self.num_simulations, self.num_steps)[:, :, 0] if sampler is not None else None
+
+        if use_compiled():
+            # one (steps, paths) draw is the same stream as a draw per step
+            z = increments.T if increments is not None else rng.standard_normal((self.num_steps, self.num_simulations))
+            gbm_paths(price_paths, np.ascontiguousarray(z), (self.r - self.q - 0.5 * self.sigma ** 2) * dt,
+                      self.sigma * np.sqrt(dt))
+            return price_paths
+
+        for t in range(1, self.num_steps + 1):
+            z = increments[:, t - 1] if increments is not None else rng.standard_normal(self.num_simulations)
+            price_paths[:, t] = price_paths[:, t-1] * np.exp(
+                (self.r - self.q - 0.5 * self.sigma ** 2) * dt + self.sigma * np.sqrt(dt) * z
+            )
+
+        return price_paths
+
+    def option_price(self, option_type='call', antithetic=False, moment_matching=False, control_variates=(), sampler=None,
+                     workers=None, backend='process'):
+        return self.estimate(option_type, antithetic, moment_matching, control_variates, sampler, workers, backend)['price']
+
+    @instrument('monte_carlo')
+    def estimate(self, option_type='call', antithetic=False, moment_matching=False, control_variates=(), sampler=None,
+                 workers=None, backend='process'):
+        # returns price, std_error and vr_factor (variance per path of the plain estimator / of this one)
+        # control_variates: ('spot',) uses the discounted terminal spot, whose mean is S0 e^-qT
+        # (a black-scholes control would be the payoff itself under gbm, so it is not offered here)
+        # workers: shard the paths over that many processes/threads (see parallel.py), each with its own stream
+        # spawned from seed; reproducible for a fixed seed and worker count. None keeps the single-stream run
+        if option_type not in ('call', 'put'):
+            raise ValueError("Invalid option type. Must be 'call' or 'put'.")
+        if set(control_variates) - {'spot'}:
+            raise ValueError("MonteCarloModel supports only the 'spot' control variate")
+
+        # sampler: optional qmc.py backend (e.g. SobolSampler), replaces the pseudo-random draws
+        if sampler is not None and (antithetic or moment_matching):
+            raise ValueError("antithetic and moment_matching apply to pseudo-random draws, not to a sampler")
+        if sampler is not None and workers is not None:
+            raise ValueError("a sampler holds one sequence and cannot be sharded across workers")
+
+        record('monte_carlo', paths=self.num_simulations, path_steps=self.num_simulations * self.num_steps)
+        if workers is None:
+            accumulator = self._accumulate(option_type, antithetic, moment_matching, tuple(control_variates),
+                                           self.num_simulations, np.random.default_rng(self.seed), sampler)
+        else:
+            shard = partial(self._shard, option_type, antithetic, moment_matching, tuple(control_variates))
+            accumulator = run_sharded(shard, self.num_simulations, self.seed, workers, backend,
+                                      multiple=2 if antithetic else 1)
+        return accumulator.result(np.exp(-self.r * self.T))
+
+    def _shard(self, option_type, antithetic, moment_matching, control_variates, num_paths, seed_sequence):
+        return self._accumulate(option_type, antithetic, moment_matching, control_variates, num_paths,
+                                np.random.default_rng(seed_sequence))
+
+    def _accumulate(self, option_type, antithetic, moment_matching, control_variates, num_paths, rng, sampler=None):
+        dt = self.T / self.num_steps
+        # only the terminal price matters for a european payoff, so the steps are summed in log space
+        log_return = (self.r - self.q - 0.5 * self.sigma ** 2) * self.T + self.sigma * np.sqrt(dt) * self._shock_sums(
+            num_paths, rng, antithetic, moment_matching, sampler)
+        ST = self.S0 * np.exp(log_return)
+        if option_type == 'call':
+            payoffs = np.maximum(ST - self.X, 0)
+        else:
+            payoffs = np.maximum(self.X - ST, 0)
+
+        control_means = [self.S0 * np.exp((self.r - self.q) * self.T)] if control_variates else []
+        accumulator = PayoffAccumulator(control_means)
+        accumulator.add(payoffs, [ST] if control_variates else (), antithetic)
+        return accumulator
+
+    def _shock_sums(self, num_paths, rng, antithetic, moment_matching, sampler):
+        # every path's sum of normals over the steps, drawn one step at a time (the draw order of the cev and
+        # heston engines), so memory stays at one value per path instead of a (paths, steps) matrix
+        # the sum has no per-step nonlinearity for a compiled kernel to fuse, so both backends take this path
+        if sampler is not None:
+            return sampler.increments(num_paths, self.num_steps)[:, :, 0].sum(axis=1)
+        shock_sum = np.zeros(num_paths)
+        for _ in range(self.num_steps):
+            shock_sum += draw_normals(rng, num_paths, antithetic, moment_matching)
+        return shock_sum
@@ -0,0 +1,53 @@
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+# sharded execution for the monte carlo engines
+# the paths are split into one shard per worker, every shard gets its own independent Generator stream
+# (SeedSequence.spawn) and returns partial sums (a PayoffAccumulator); the partial sums are merged in shard
+# order, so for a given seed and worker count the result is bit-for-bit identical however the pool schedules
+# the shards
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def spawn_seeds(seed, count):
+    # independent child streams of one root seed (int, None or SeedSequence)
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return root.spawn(count)
+
+
+def shard_sizes(num_paths, shards, multiple=1):
+    # splits num_paths into `shards` near-equal parts, each a multiple of `multiple` (2 for antithetic pairs)
+    if num_paths % multiple:
+        raise ValueError(f"num_paths must be a multiple of {multiple}")
+    units, extra = divmod(num_paths // multiple, shards)
+    return [(units + (i < extra)) * multiple for i in range(shards)]
+
+
+def run_sharded(worker, num_paths, seed=None, workers=None, backend='process', multiple=1):
+    # worker(num_paths, seed_sequence) -> partial result with a merge(other) method
+    # backend: 'process' (true multi-core, worker and its arguments must be picklable) or 'thread'
+    # (no pickling, scales as far as numpy releases the GIL); workers None or 0 means one per cpu core
+    if backend not in ('process', 'thread'):
+        raise ValueError("backend must be 'process' or 'thread'")
+    workers = workers or default_workers()
+    sizes = shard_sizes(num_paths, workers, multiple)
+    seeds = spawn_seeds(seed, workers)
+
+    if workers == 1:
+        parts = [worker(sizes[0], seeds[0])]
+    else:
+        executor = ProcessPoolExecutor if backend == 'process' else ThreadPoolExecutor
+        with executor(max_workers=workers) as pool:
+            # map returns in submission order, which fixes the merge order
+            parts = list(pool.map(worker, sizes, seeds))
+
+    total = parts[0]
+    for part in parts[1:]:
+        total.merge(part)
+    return total
@@ -0,0 +1,192 @@
+
+import numpy as np
+from scipy.interpolate import CubicSpline
+from scipy.linalg import solve_banded
+
+from instrumentation import instrument, record
+from kernels import psor
+
+# finite-difference (pde) pricer for european and american options
+# black-scholes in log-spot x = ln S and time to expiry tau: V_tau = 0.5 sigma^2 V_xx + (r - q - 0.5 sigma^2) V_x - r V
+# on a uniform x grid, stepped with crank-nicolson. the kinked payoff makes plain crank-nicolson ring around the
+# strike (oscillating gamma), so the first steps are rannacher smoothing: fully implicit half steps.
+# one solve gives the whole price-vs-spot curve at every grid node, so any number of spots is priced by
+# interpolation, and delta, gamma and theta come off the same grid. several strikes
+# are solved at once as one block-tridiagonal system (one banded solve per time step for all of them)
+# early exercise: 'penalty' (forsyth-vetzal penalty iteration, a few banded solves per step) or 'psor' (projected
+# sor, through kernels.psor: compiled with numba, very slow interpreted)
+
+
+class FiniteDifferenceModel:
+    def __init__(self, S0, X, T, r, sigma, q=0.0, space_steps=400, time_steps=200, rannacher_steps=4, width=5.0):
+        # rannacher_steps: implicit half steps replacing the first rannacher_steps / 2 crank-nicolson steps
+        # width: the grid covers the spots and strikes +- width standard deviations of ln S_T
+        if T <= 0:
+            raise ValueError("Time to maturity T must be positive")
+        if sigma <= 0:
+            raise ValueError("Volatility sigma must be positive")
+        if rannacher_steps % 2 or rannacher_steps // 2 > time_steps:
+            raise ValueError("rannacher_steps must be even and at most 2 * time_steps")
+        self.S0 = S0
+        self.X = X
+        self.T = T
+        self.r = r
+        self.sigma = sigma
+        self.q = q
+        self.space_steps = space_steps
+        self.time_steps = time_steps
+        self.rannacher_steps = rannacher_steps
+        self.width = width
+
+    def grid(self, spots, strikes):
+        # uniform log-spot nodes with the first spot exactly on a node
+        spread = self.width * self.sigma * np.sqrt(self.T)
+        low = min(np.log(spots).min(), np.log(strikes).min()) - spread
+        high = max(np.log(spots).max(), np.log(strikes).max()) + spread
+        h = (high - low) / self.space_steps
+        anchor = np.log(spots[0])
+        offset = int(round((anchor - low) / h))
+        return anchor + h * (np.arange(self.space_steps + 1) - offset)
+
+    @instrument('pde')
+    def solve(self, option_type='call', exercise='european', spots=None, strikes=None, method='penalty', tol=1e-8,
+              max_iter=100):
+        # the full grid: {'x': log-spot nodes, 'strikes', 'values' and 'theta': (nodes, strikes) at tau = T,
+        # 'iterations': early exercise iterations over all steps}
+        if option_type not in ('call', 'put'):
+            raise ValueError("Invalid option type. Must be 'call' or 'put'.")
+        if exercise not in ('european', 'american'):
+            raise ValueError("exercise must be 'european' or 'american'")
+        if method not in ('penalty', 'psor'):
+            raise ValueError("method must be 'penalty' or 'psor'")
+        spots = np.atleast_1d(np.asarray(self.S0 if spots is None else spots, dtype=float))
+        strikes = np.atleast_1d(np.asarray(self.X if strikes is None else strikes, dtype=float))
+        if np.any(spots <= 0) or np.any(strikes <= 0):
+            raise ValueError("spots and strikes must be positive")
+
+        x = self.grid(spots, strikes)
+        h = x[1] - x[0]
+        S = np.exp(x)[:, None]
+        sign = 1.0 if option_type == 'call' else -1.0
+        payoff = np.maximum(sign * (S - strikes), 0)  # (nodes, strikes)
+        american = exercise == 'american'
+
+        # L V_i = a V_{i-1} + b V_i + c V_{i+1}, central differences
+        drift = self.r - self.q - 0.5 * self.sigma ** 2
+        a = 0.5 * self.sigma ** 2 / h ** 2 - drift / (2 * h)
+        b = -self.sigma ** 2 / h ** 2 - self.r
+        c = 0.5 * self.sigma ** 2 / h ** 2 + drift / (2 * h)
+
+        def boundaries(tau):
+            # far-field values: deep in the money the option is the discounted forward (or intrinsic if higher)
+            forward = sign * (S[[0, -1]] * np.exp(-self.q * tau) - strikes * np.exp(-self.r * tau))
+            if american:
+                forward = np.maximum(forward, sign * (S[[0, -1]] - strikes))
+            return np.maximum(forward, 0)
+
+        n_inner, n_strikes = self.space_steps - 1, strikes.size
+        # every strike's interior nodes are one block of the stacked system, the blocks are not coupled
+        block_start = np.arange(n_inner * n_strikes) % n_inner == 0
+
+        def banded(weight):
+            # I - weight * L on the stacked interior nodes, in solve_banded's (1, 1) layout
+            ab = np.empty((3, n_inner * n_strikes))
+            ab[0] = np.where(block_start, 0.0, -weight * c)
+            ab[1] = 1 - weight * b
+            ab[2] = np.where(np.roll(block_start, -1), 0.0, -weight * a)
+            return ab
+
+        dt = self.T / self.time_steps
+        schedule = [(1.0, dt / 2)] * self.rannacher_steps + [(0.5, dt)] * (self.time_steps - self.rannacher_steps // 2)
+        matrices = {}
+        values = payoff.copy()
+        floor = payoff[1:-1].ravel(order='F')
+        iterations = 0
+        tau = 0.0
+        for implicit, step in schedule:
+            weight = implicit * step
+            if weight not in matrices:
+                matrices[weight] = banded(weight)
+            ab = matrices[weight]
+
+            explicit = a * values[:-2] + b * values[1:-1] + c * values[2:]
+            rhs = values[1:-1] + (1 - implicit) * step * explicit
+            tau += step
+            edges = boundaries(tau)
+            rhs[0] += weight * a * edges[0]
+            rhs[-1] += weight * c * edges[1]
+            rhs = rhs.ravel(order='F')
+
+            if not american:
+                inner = solve_banded((1, 1), ab, rhs, check_finite=False)
+            elif method == 'penalty':
+                inner, used = self._penalty(ab, rhs, floor, values[1:-1].ravel(order='F'), tol, max_iter)
+                iterations += used
+            else:
+                inner = values[1:-1].ravel(order='F').copy()
+                # lower[i] couples node i to i - 1, upper[i] to i + 1 (solve_banded keeps them shifted)
+                lower = np.concatenate([[0.0], ab[2, :-1]])
+                upper = np.concatenate([ab[0, 1:], [0.0]])
+                iterations += psor(lower, ab[1], upper, rhs, floor, inner, 1.2, tol, max_iter)
+
+            values = np.empty_like(values)
+            values[1:-1] = inner.reshape(n_inner, n_strikes, order='F')
+            values[[0, -1]] = edges
+
+        # theta from the pde itself, dV/dt = -dV/dtau = -L V, and zero where an american option is exercised
+        theta = np.zeros_like(values)
+        theta[1:-1] = -(a * values[:-2] + b * values[1:-1] + c * values[2:])
+        if american:
+            theta[values <= payoff + tol * strikes] = 0.0
+
+        record('pde', nodes=(self.space_steps + 1) * len(schedule) * n_strikes, iterations=iterations)
+        return {'x': x, 'strikes': strikes, 'values': values, 'theta': theta, 'iterations': iterations}
+
+    @staticmethod
+    def _penalty(ab, rhs, floor, guess, tol, max_iter):
+        # (A + P) v = rhs + P floor with P = 1 / tol on the nodes below the exercise value, repeated until the
+        # set of penalized nodes stops changing
+        large = 1 / tol
+        active = guess <= floor
+        for iteration in range(1, max_iter + 1):
+            penalized = ab.copy()
+            penalized[1] += large * active
+            values = solve_banded((1, 1), penalized, rhs + large * active * floor, check_finite=False)
+            now_active = values < floor
+            if np.array_equal(now_active, active):
+                return values, iteration
+            active = now_active
+        return values, max_iter
+
+    def greeks(self, option_type='call', exercise='european', spots=None, strikes=None, method='penalty',
+               richardson=False):
+        # price, delta, gamma and theta (per year, dV/dt) at the given spots, from one solve
+        # arrays are (spots, strikes) when both are given as arrays, 1-d when one is, scalars otherwise
+        # richardson: (4 V(2 space, 2 time steps) - V) / 3, cancels the leading second-order error (most of it
+        # for american exercise, where the free boundary converges more slowly)
+        result = self._greeks(option_type, exercise, spots, strikes, method)
+        if richardson:
+            fine = FiniteDifferenceModel(self.S0, self.X, self.T, self.r, self.sigma, self.q, 2 * self.space_steps,
+                                         2 * self.time_steps, self.rannacher_steps, self.width)
+            refined = fine._greeks(option_type, exercise, spots, strikes, method)
+            result = {name: (4 * refined[name] - values) / 3 for name, values in result.items()}
+        squeeze = tuple(axis for axis, given in enumerate((spots, strikes)) if given is None or np.ndim(given) == 0)
+        return {name: values.squeeze(axis=squeeze) if squeeze else values for name, values in result.items()}
+
+    def _greeks(self, option_type, exercise, spots, strikes, method):
+        grid = self.solve(option_type, exercise, spots, strikes, method)
+        at = np.log(np.atleast_1d(np.asarray(self.S0 if spots is None else spots, dtype=float)))
+        curve = CubicSpline(grid['x'], grid['values'], axis=0)
+        price = curve(at)
+        V_x, V_xx = curve(at, 1), curve(at, 2)
+        S = np.exp(at)[:, None]
+        # theta jumps to zero at the exercise boundary, so it is interpolated linearly between nodes
+        position = np.clip(np.searchsorted(grid['x'], at) - 1, 0, grid['x'].size - 2)
+        weight = ((at - grid['x'][position]) / (grid['x'][1] - grid['x'][0]))[:, None]
+        theta = (1 - weight) * grid['theta'][position] + weight * grid['theta'][position + 1]
+        return {'price': price, 'delta': V_x / S, 'gamma': (V_xx - V_x) / S ** 2, 'theta': theta}
+
+    def price(self, option_type='call', exercise='european', spots=None, strikes=None, method='penalty',
+              richardson=False):
+        result = self.greeks(option_type, exercise, spots, strikes, method, richardson)['price']
+        return float(result) if np.ndim(result) == 0 else result
@@ -0,0 +1,176 @@
+
+import numpy as np
+import pandas as pd
+
+from black_scholes import call_mask, check_positive, price_batch
+from greeks import greeks_batch
+from instrumentation import instrument, record
+
+# scenario revaluation of a whole book of european options
+# a scenario is a set of market moves: a relative spot move and an absolute vol move per underlying, an absolute
+# rate move and a horizon (time decay). every position is repriced under every scenario in one broadcasted
+# (scenarios x positions) computation; positions are taken in chunks so the temporaries stay within chunk_cells
+# values however large the book is. the scenario p&l feeds historical and monte carlo value-at-risk
+
+SCENARIO_FIELDS = ('spot', 'vol', 'rate', 'horizon')
+
+
+class Portfolio:
+    def __init__(self, positions):
+        # positions needs S0, X, T, r, sigma and quantity columns; q defaults to 0, option_type to 'call' and
+        # underlying to a single unnamed one (per-underlying shocks are matched on that column)
+        for column in ('S0', 'X', 'T', 'r', 'sigma', 'quantity'):
+            if column not in positions.columns:
+                raise ValueError(f"The positions DataFrame must contain a '{column}' column.")
+        self.positions = positions
+        self.S0 = positions['S0'].to_numpy(dtype=float)
+        self.X = positions['X'].to_numpy(dtype=float)
+        self.T = positions['T'].to_numpy(dtype=float)
+        self.r = positions['r'].to_numpy(dtype=float)
+        self.sigma = positions['sigma'].to_numpy(dtype=float)
+        self.q = positions['q'].to_numpy(dtype=float) if 'q' in positions else np.zeros_like(self.S0)
+        self.quantity = positions['quantity'].to_numpy(dtype=float)
+        self.is_call = np.broadcast_to(call_mask(positions['option_type'].to_numpy() if 'option_type' in positions
+                                                 else 'call'), self.S0.shape)
+        for name, values in (('S0', self.S0), ('X', self.X), ('T', self.T), ('sigma', self.sigma)):
+            check_positive(name, values)
+
+        underlying = positions['underlying'] if 'underlying' in positions else pd.Series('', index=positions.index)
+        self.underlying_codes, self.underlyings = pd.factorize(underlying)
+
+        # base prices and the sensitivities used by the delta-gamma-vega approximation, computed once
+        self.greeks = greeks_batch(self.S0, self.X, self.T, self.r, self.sigma, self.q, self.is_call)
+        self.value = float(self.quantity @ self.greeks['price'])
+
+    def __len__(self):
+        return self.S0.size
+
+    @instrument('portfolio')
+    def scenario_pnl(self, scenarios, method='full', chunk_cells=2 ** 20):
+        # total book p&l per scenario, shape (n_scenarios,), without ever holding the full cube
+        total = None
+        for _, pnl in self._chunks(scenarios, method, chunk_cells):
+            part = pnl.sum(axis=1)
+            total = part if total is None else total + part
+        return total
+
+    @instrument('portfolio')
+    def pnl_cube(self, scenarios, method='full', chunk_cells=2 ** 20, out=None):
+        # p&l of every position under every scenario, shape (n_scenarios, n_positions)
+        # out can be a preallocated array or np.memmap when the cube itself does not fit in memory
+        for columns, pnl in self._chunks(scenarios, method, chunk_cells):
+            if out is None:
+                out = np.empty((pnl.shape[0], len(self)))
+            out[:, columns] = pnl
+        return out
+
+    def _chunks(self, scenarios, method, chunk_cells):
+        if method not in ('full', 'delta_gamma_vega'):
+            raise ValueError("method must be 'full' or 'delta_gamma_vega'")
+        shocks = self._shocks(scenarios)
+        n_scenarios = shocks['rate'].shape[0]
+        chunk = max(1, chunk_cells // n_scenarios)
+        record('portfolio', cells=n_scenarios * len(self))
+        for start in range(0, len(self), chunk):
+            columns = slice(start, min(start + chunk, len(self)))
+            yield columns, self._chunk_pnl(shocks, columns, method)
+
+    def _shocks(self, scenarios):
+        # scenarios: DataFrame or dict with any of spot, vol, rate, horizon (missing ones are zero)
+        # spot and vol can be one move per scenario for every underlying, or a (scenarios x underlyings) array /
+        # DataFrame with one column per underlying; horizon is in years
+        # returns (scenarios, 1) or (scenarios, underlyings) arrays
+        if set(scenarios.keys()) - set(SCENARIO_FIELDS):
+            raise ValueError(f"scenarios can only contain {SCENARIO_FIELDS}")
+        n_scenarios = max((len(scenarios[name]) for name in scenarios.keys() if np.ndim(scenarios[name])), default=1)
+        shocks = {}
+        for name in SCENARIO_FIELDS:
+            value = scenarios[name] if name in scenarios.keys() else 0.0
+            if isinstance(value, pd.DataFrame) and value.shape[1] > 1:
+                missing = set(self.underlyings) - set(value.columns)
+                if missing:
+                    raise ValueError(f"no {name} shocks for underlyings {sorted(missing)}")
+                value = value[list(self.underlyings)]
+            value = np.asarray(value, dtype=float)
+            if value.ndim == 2 and value.shape[1] > 1:
+                if name not in ('spot', 'vol') or value.shape[1] != len(self.underlyings):
+                    raise ValueError(f"{name} shocks need one value per scenario"
+                                     + (f" or one column per underlying ({len(self.underlyings)})"
+                                        if name in ('spot', 'vol') else ""))
+                shocks[name] = value
+            else:
+                shocks[name] = np.broadcast_to(value.reshape(-1), (n_scenarios,))[:, None]
+        if np.any(shocks['spot'] <= -1):
+            raise ValueError("spot shocks are relative moves and must be greater than -1")
+        return shocks
+
+    def _chunk_pnl(self, shocks, columns, method):
+        codes = self.underlying_codes[columns]
+
+        def expand(name):
+            # (scenarios, 1) common moves broadcast as they are, per-underlying moves are gathered per position
+            value = shocks[name]
+            return value[:, codes] if value.shape[1] > 1 else value
+
+        spot = expand('spot')
+        vol = expand('vol')
+        rate, horizon = shocks['rate'], shocks['horizon']
+        S0 = self.S0[columns]
+        quantity = self.quantity[columns]
+
+        if method == 'full':
+            base = self.greeks['price'][columns]
+            # vols are floored and the remaining life at a day fraction so extreme scenarios stay priceable
+            # (an option that expires inside the horizon is worth about its intrinsic value)
+            shocked = price_batch(S0 * (1 + spot), self.X[columns], np.maximum(self.T[columns] - horizon, 1e-6),
+                                  self.r[columns] + rate, np.maximum(self.sigma[columns] + vol, 1e-4),
+                                  self.q[columns], self.is_call[columns])
+            return quantity * (shocked - base)
+
+        # second order in spot, first order in vol, rate and time
+        dS = S0 * spot
+        g = {name: self.greeks[name][columns] for name in ('delta', 'gamma', 'vega', 'rho', 'theta')}
+        return quantity * (g['delta'] * dS + 0.5 * g['gamma'] * dS ** 2 + g['vega'] * vol
+                           + g['rho'] * rate + g['theta'] * horizon)
+
+    def historical_var(self, spot_returns, vol_changes=None, level=0.99, horizon_days=1, method='full',
+                       chunk_cells=2 ** 20):
+        # full historical simulation: every row of spot_returns (relative moves over the VaR horizon, a Series or
+        # one column per underlying) and of vol_changes (absolute) is one scenario
+        scenarios = {'spot': spot_returns, 'horizon': horizon_days / 365}
+        if vol_changes is not None:
+            scenarios['vol'] = vol_changes
+        pnl = self.scenario_pnl(scenarios, method, chunk_cells)
+        return {**var_es(pnl, level), 'pnl': pnl}
+
+    def monte_carlo_var(self, spot_returns, vol_changes=None, n_scenarios=10000, level=0.99, horizon_days=1,
+                        method='full', seed=None, chunk_cells=2 ** 20):
+        # moves drawn from a zero-mean normal with the covariance of the daily history (spot returns and vol
+        # changes jointly, so the spot/vol correlation is kept), scaled to horizon_days
+        history = self._shocks({'spot': spot_returns, 'vol': 0.0 if vol_changes is None else vol_changes})
+        width = history['spot'].shape[1]
+        sample = np.hstack([history['spot'], history['vol']]) if vol_changes is not None else history['spot']
+        covariance = np.atleast_2d(np.cov(sample, rowvar=False)) * horizon_days
+        rng = np.random.default_rng(seed)
+        draws = rng.multivariate_normal(np.zeros(sample.shape[1]), covariance, size=n_scenarios, method='cholesky')
+
+        scenarios = {'spot': np.maximum(draws[:, :width], -0.999), 'horizon': horizon_days / 365}
+        if vol_changes is not None:
+            scenarios['vol'] = draws[:, width:]
+        pnl = self.scenario_pnl(scenarios, method, chunk_cells)
+        return {**var_es(pnl, level), 'pnl': pnl}
+
+
+def var_es(pnl, level=0.99):
+    # value-at-risk and expected shortfall of a p&l sample, both reported as positive losses
+    losses = -np.asarray(pnl, dtype=float)
+    var = float(np.quantile(losses, level))
+    return {'var': var, 'es': float(losses[losses >= var].mean()), 'level': level}
+
+
+def scenario_grid(spot=(0.0,), vol=(0.0,), rate=(0.0,), horizon=0.0):
+    # every combination of the given moves, e.g. a spot x vol stress ladder
+    spot, vol, rate = np.meshgrid(np.asarray(spot, dtype=float), np.asarray(vol, dtype=float),
+                                  np.asarray(rate, dtype=float), indexing='ij')
+    return pd.DataFrame({'spot': spot.ravel(), 'vol': vol.ravel(), 'rate': rate.ravel(),
+                         'horizon': np.full(spot.size, float(horizon))})
@@ -0,0 +1,135 @@
+
+import json
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from numpy.polynomial import chebyshev
+from scipy.fft import dct
+
+from instrumentation import instrument, record
+from parallel import default_workers
+
+# precomputed price surface for fast what-if queries
+# the model is priced once on a tensor grid of chebyshev-lobatto nodes (e.g. S0 x sigma x T); the values are
+# turned into chebyshev coefficients with a dct per axis, and queries evaluate that polynomial for whole arrays
+# of points at once. for smooth prices the error falls geometrically with the node count, and the size of the
+# highest-order coefficients says how far it has fallen (error_estimate), so expensive models (american trees,
+# heston) can be answered at lookup speed with a known accuracy
+
+
+class PricingGrid:
+    def __init__(self, axes, values, metadata=None):
+        # axes: {name: (low, high, n_nodes)} in query order; values: prices on the nodes, shape (n_1, ..., n_d)
+        self.axes = {name: (float(low), float(high), int(n)) for name, (low, high, n) in axes.items()}
+        self.values = np.asarray(values, dtype=float)
+        if self.values.shape != tuple(n for _, _, n in self.axes.values()):
+            raise ValueError("values must have one entry per grid node")
+        self.metadata = dict(metadata or {})
+        self.coefficients = self.values
+        for axis, (_, _, n) in enumerate(self.axes.values()):
+            if n < 2:
+                raise ValueError("every axis needs at least two nodes")
+            # dct-I of the node values gives the chebyshev coefficients (end terms counted once)
+            coefficients = dct(self.coefficients, type=1, axis=axis) / (n - 1)
+            ends = [slice(None)] * coefficients.ndim
+            for k in (0, n - 1):
+                ends[axis] = k
+                coefficients[tuple(ends)] *= 0.5
+            self.coefficients = coefficients
+
+    @staticmethod
+    def nodes(low, high, n):
+        # chebyshev-lobatto points cos(pi j / (n - 1)) mapped onto [low, high], from high to low
+        return 0.5 * (low + high) + 0.5 * (high - low) * np.cos(np.pi * np.arange(n) / (n - 1))
+
+    @classmethod
+    @instrument('pricing_grid_build')
+    def build(cls, price_fn, axes, vectorized=False, workers=None, backend='process', metadata=None):
+        # price_fn takes the axis names as keyword arguments: price_fn(S0=..., sigma=..., T=...)
+        # vectorized=True passes arrays (one call per chunk of nodes), otherwise one call per node
+        # workers: evaluate the nodes on a process ('process', price_fn must be picklable) or thread pool
+        axes = {name: (float(low), float(high), int(n)) for name, (low, high, n) in axes.items()}
+        mesh = np.meshgrid(*(cls.nodes(*spec) for spec in axes.values()), indexing='ij')
+        points = {name: grid.ravel() for name, grid in zip(axes, mesh)}
+        total = mesh[0].size
+        record('pricing_grid_build', nodes=total)
+
+        workers = 1 if workers is None else (workers or default_workers())
+        chunks = np.array_split(np.arange(total), max(1, min(total, 4 * workers)))
+        jobs = [{name: values[chunk] for name, values in points.items()} for chunk in chunks]
+        evaluate = _evaluate_vectorized if vectorized else _evaluate_points
+        if workers == 1:
+            parts = [evaluate(price_fn, job) for job in jobs]
+        else:
+            executor = ProcessPoolExecutor if backend == 'process' else ThreadPoolExecutor
+            with executor(max_workers=workers) as pool:
+                parts = list(pool.map(evaluate, [price_fn] * len(jobs), jobs))
+        values = np.concatenate(parts).reshape(mesh[0].shape)
+        return cls(axes, values, metadata)
+
+    @instrument('pricing_grid')
+    def __call__(self, derivative=None, **points):
+        # interpolated prices at arrays of points (broadcast against each other), e.g. grid(S0=s, sigma=v, T=t)
+        # derivative: {axis name: order}, e.g. {'S0': 1} for delta or {'S0': 2} for gamma, taken analytically
+        # from the chebyshev series; points outside the grid raise instead of extrapolating
+        missing = set(self.axes) - set(points)
+        if missing or set(points) - set(self.axes):
+            raise ValueError(f"query needs exactly the grid axes {list(self.axes)}")
+        coordinates = np.broadcast_arrays(*(np.asarray(points[name], dtype=float) for name in self.axes))
+        shape = coordinates[0].shape
+        record('pricing_grid', lookups=coordinates[0].size)
+
+        coefficients = self.coefficients
+        for axis, (name, (low, high, _)) in enumerate(self.axes.items()):
+            order = (derivative or {}).get(name, 0)
+            if order:
+                coefficients = chebyshev.chebder(coefficients, m=order, scl=2 / (high - low), axis=axis)
+
+        result = None
+        for axis, (name, (low, high, _)) in enumerate(self.axes.items()):
+            x = coordinates[axis].ravel()
+            if np.any((x < low - 1e-12 * abs(low)) | (x > high + 1e-12 * abs(high))):
+                raise ValueError(f"{name} outside the grid range [{low}, {high}]")
+            t = np.clip((2 * x - low - high) / (high - low), -1, 1)
+            basis = chebyshev.chebvander(t, coefficients.shape[axis] - 1)  # (points, terms)
+            if result is None:
+                result = np.tensordot(basis, coefficients, axes=(1, 0))  # (points, rest...)
+            else:
+                result = np.einsum('pk,pk...->p...', basis, result)
+        return result.reshape(shape)
+
+    def error_estimate(self):
+        # for a smooth function the interpolation error is the coefficients that were cut off (plus as much again
+        # aliased onto the kept ones); with geometric decay the cut-off part along an axis is no bigger than the
+        # last coefficient slice, and |T_k| <= 1, so 2 * sum |c| over the last slice of every axis bounds the error
+        return float(sum(2 * np.abs(np.take(self.coefficients, -1, axis=axis)).sum()
+                         for axis in range(self.coefficients.ndim)))
+
+    def validate(self, price_fn, n_points=200, seed=0, vectorized=False):
+        # measured error at random points inside the grid against the model itself
+        rng = np.random.default_rng(seed)
+        points = {name: rng.uniform(low, high, n_points) for name, (low, high, _) in self.axes.items()}
+        exact = _evaluate_vectorized(price_fn, points) if vectorized else _evaluate_points(price_fn, points)
+        errors = np.abs(self(**points) - exact)
+        return {'max_error': float(errors.max()), 'mean_error': float(errors.mean()),
+                'error_estimate': self.error_estimate()}
+
+    def save(self, path):
+        # one .npz file: node values plus the axes and metadata as json
+        np.savez_compressed(path, values=self.values,
+                            spec=json.dumps({'axes': self.axes, 'metadata': self.metadata}))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            spec = json.loads(str(data['spec']))
+            return cls({name: tuple(axis) for name, axis in spec['axes'].items()}, data['values'], spec['metadata'])
+
+
+def _evaluate_points(price_fn, points):
+    names = list(points)
+    return np.array([float(price_fn(**dict(zip(names, values)))) for values in zip(*points.values())])
+
+
+def _evaluate_vectorized(price_fn, points):
+    return np.asarray(price_fn(**points), dtype=float)
@@ -0,0 +1,97 @@
+
+import warnings
+
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+# sampling backends for the path simulators
+# every sampler returns standard normal increments of shape (n_paths, n_steps, n_factors), so a simulator
+# moves factor j over step t with sqrt(dt) * z[:, t, j] whichever backend produced z
+
+
+class PseudoRandomSampler:
+    # plain pseudo-random normals from a seedable Generator, error decays like 1/sqrt(N)
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def increments(self, n_paths, n_steps, n_factors=1):
+        return self.rng.standard_normal((n_paths, n_steps, n_factors))
+
+
+class SobolSampler:
+    # scrambled sobol points -> inverse normal -> brownian bridge
+    # the bridge spends the first (best distributed) sobol dimensions on the coarse shape of each path:
+    # dimension 0 fixes W_T, the next ones the midpoints, and so on down to the single steps
+    # consecutive calls continue the same sequence, so batches of a run stay low-discrepancy
+    # (use powers of two for n_paths to keep the sobol balance properties)
+
+    def __init__(self, seed=None, scramble=True, bridge=True):
+        self.seed = seed
+        self.scramble = scramble
+        self.bridge = bridge
+        self._engine = None
+        self._shape = None
+
+    def increments(self, n_paths, n_steps, n_factors=1):
+        if self._engine is None or self._shape != (n_steps, n_factors):
+            self._engine = qmc.Sobol(d=n_steps * n_factors, scramble=self.scramble, seed=self.seed)
+            self._shape = (n_steps, n_factors)
+        with warnings.catch_warnings():
+            # scipy warns on every draw that is not a power of two; the caller chose the batch size
+            warnings.simplefilter('ignore', UserWarning)
+            points = self._engine.random(n_paths)
+
+        # unscrambled sobol starts at exactly 0, keep the inverse normal finite
+        z = ndtri(np.clip(points, 1e-12, 1 - 1e-12))
+        # dimension k * n_factors + j drives the k-th bridge point of factor j, so every factor gets
+        # the leading dimensions for its coarse shape
+        z = z.reshape(n_paths, n_steps, n_factors)
+        if self.bridge:
+            z = brownian_bridge_increments(z)
+        return z
+
+
+def _bridge_plan(n_steps):
+    # construction order of the bridge: (point, left, right), W_0 = 0 and right=None for the terminal point
+    plan = [(n_steps, 0, None)]
+    intervals = [(0, n_steps)]
+    while intervals:
+        next_intervals = []
+        for left, right in intervals:
+            if right - left > 1:
+                mid = (left + right) // 2
+                plan.append((mid, left, right))
+                next_intervals += [(left, mid), (mid, right)]
+        intervals = next_intervals
+    return plan
+
+
+def brownian_bridge_increments(z):
+    # z: (n_paths, n_steps, n_factors) iid normals in importance order along axis 1
+    # returns iid normal increments of the same shape (in units of sqrt(dt))
+    n_steps = z.shape[1]
+    W = np.zeros((z.shape[0], n_steps + 1, z.shape[2]))
+    for k, (point, left, right) in enumerate(_bridge_plan(n_steps)):
+        if right is None:
+            W[:, point] = np.sqrt(point) * z[:, k]
+        else:
+            # W_point given W_left and W_right is normal with the linear interpolation as mean
+            weight = (point - left) / (right - left)
+            std = np.sqrt((point - left) * (right - point) / (right - left))
+            W[:, point] = (1 - weight) * W[:, left] + weight * W[:, right] + std * z[:, k]
+    return np.diff(W, axis=1)
+
+
+def randomized_qmc(price_fn, replications=16, seed=None, **sampler_options):
+    # runs price_fn(sampler) with independently scrambled sobol samplers; the spread across replications
+    # gives an honest error estimate for qmc, which a single low-discrepancy run cannot
+    seeds = np.random.SeedSequence(seed).spawn(replications)
+    prices = np.array([price_fn(SobolSampler(seed=np.random.default_rng(child), **sampler_options))
+                       for child in seeds])
+    return {
+        'price': prices.mean(),
+        'std_error': prices.std(ddof=1) / np.sqrt(replications),
+        'replications': prices,
+    }
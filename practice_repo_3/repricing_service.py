@@ -0,0 +1,393 @@
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from black_scholes import call_mask, check_positive
+from greeks import greeks_batch
+from heston import HestonModel
+from instrumentation import record
+from parallel import default_workers
+
+# long-running repricing service on asyncio
+# quotes (a new spot, optionally a new vol, per instrument) only overwrite the instrument's state and mark it
+# dirty, so a burst of updates to one instrument costs one reprice: the latest quote wins. the pricing loop
+# wakes up when something is dirty, waits batch_interval for the rest of the burst, reprices every dirty
+# black-scholes instrument in one greeks_batch call and publishes the results to the subscribers' queues.
+# instruments with model 'heston' are priced by monte carlo in an executor (one job per instrument in flight,
+# quotes arriving meanwhile are coalesced into the next job) so they never hold up the vectorized batches.
+#
+#     service = RepricingService(instruments)
+#     results = service.subscribe()            # asyncio.Queue of DataFrames, one per batch
+#     task = asyncio.create_task(service.run())
+#     service.submit('SPY-450C', 452.1)       # or submit_many(ids, spots) from the feed
+#     ...
+#     await service.stop(); print(service.report())
+#
+# submit must be called from the event loop thread (loop.call_soon_threadsafe from anywhere else)
+
+HESTON_COLUMNS = ('kappa', 'theta', 'xi', 'v0', 'rho')  # xi: vol of variance (HestonModel's sigma)
+
+
+class LatencyHistogram:
+    # fixed log-spaced buckets (cumulative counts, prometheus style): observe() is O(batch) whatever the history
+    def __init__(self, bounds=None):
+        self.bounds = np.asarray(np.geomspace(1e-5, 10.0, 61) if bounds is None else bounds, dtype=float)
+        self.counts = np.zeros(self.bounds.size + 1, dtype=np.int64)  # last bucket: above the largest bound
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        seconds = np.atleast_1d(np.asarray(seconds, dtype=float))
+        self.counts += np.bincount(np.searchsorted(self.bounds, seconds), minlength=self.counts.size)
+        self.count += seconds.size
+        self.total += float(seconds.sum())
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the q-quantile
+        if not self.count:
+            return np.nan
+        bucket = np.searchsorted(np.cumsum(self.counts), max(1, int(np.ceil(q * self.count))))
+        return float(self.bounds[bucket]) if bucket < self.bounds.size else np.inf
+
+    def summary(self):
+        return {'count': self.count, 'mean': self.total / self.count if self.count else np.nan,
+                'p50': self.quantile(0.5), 'p90': self.quantile(0.9), 'p99': self.quantile(0.99)}
+
+    def to_prometheus(self, metric):
+        lines = [f"# TYPE {metric} histogram"]
+        cumulative = np.cumsum(self.counts)
+        lines += [f'{metric}_bucket{{le="{bound:g}"}} {count}' for bound, count in zip(self.bounds, cumulative)]
+        lines += [f'{metric}_bucket{{le="+Inf"}} {self.count}', f"{metric}_sum {self.total:g}",
+                  f"{metric}_count {self.count}"]
+        return "\n".join(lines)
+
+
+def heston_price(S0, X, T, r, kappa, theta, xi, v0, rho, is_call, num_simulations, num_steps, seed):
+    # one heston monte carlo price, module level so it can run in a process pool
+    model = HestonModel(S0, X, T, r, kappa, theta, xi, v0, rho, num_simulations=num_simulations,
+                        num_steps=num_steps, seed=seed, scheme='qe')
+    return model.estimate('call' if is_call else 'put', control_variates=('black_scholes',))
+
+
+class RepricingService:
+    def __init__(self, instruments, batch_interval=0.002, max_batch=100000, executor=None,
+                 heston_simulations=20000, heston_steps=32, queue_size=100):
+        # instruments: DataFrame indexed by instrument id with S0, X, T, r and sigma columns (the starting
+        # market); q defaults to 0, option_type to 'call' and model to 'black_scholes'. 'heston' rows also need
+        # the HESTON_COLUMNS. executor runs the heston jobs (a process pool over all cores when None)
+        for column in ('S0', 'X', 'T', 'r', 'sigma'):
+            if column not in instruments.columns:
+                raise ValueError(f"The instruments DataFrame must contain a '{column}' column.")
+        if not instruments.index.is_unique:
+            raise ValueError("instrument ids (the DataFrame index) must be unique")
+        self.ids = instruments.index
+        self.spot = instruments['S0'].to_numpy(dtype=float).copy()
+        self.sigma = instruments['sigma'].to_numpy(dtype=float).copy()
+        self.X = instruments['X'].to_numpy(dtype=float)
+        self.T = instruments['T'].to_numpy(dtype=float)
+        self.r = instruments['r'].to_numpy(dtype=float)
+        self.q = instruments['q'].to_numpy(dtype=float) if 'q' in instruments else np.zeros_like(self.spot)
+        self.is_call = np.broadcast_to(call_mask(instruments['option_type'].to_numpy() if 'option_type' in instruments
+                                                 else 'call'), self.spot.shape)
+        for name, values in (('S0', self.spot), ('X', self.X), ('T', self.T), ('sigma', self.sigma)):
+            check_positive(name, values)
+
+        model = instruments['model'].to_numpy() if 'model' in instruments else np.full(len(self.ids), 'black_scholes')
+        if set(model) - {'black_scholes', 'heston'}:
+            raise ValueError("model must be 'black_scholes' or 'heston'")
+        self.heavy = model == 'heston'
+        if self.heavy.any():
+            missing = [column for column in HESTON_COLUMNS if column not in instruments.columns]
+            if missing:
+                raise ValueError(f"heston instruments need the columns {missing}")
+            self.heston = instruments[list(HESTON_COLUMNS)].to_numpy(dtype=float)
+
+        self.batch_interval = batch_interval
+        self.max_batch = max_batch
+        self.executor = executor
+        self.heston_simulations = heston_simulations
+        self.heston_steps = heston_steps
+        self.queue_size = queue_size
+
+        self.dirty = np.zeros(len(self.ids), dtype=bool)
+        self.received = np.zeros(len(self.ids))  # arrival time of the latest quote not yet priced
+        self.in_flight = np.zeros(len(self.ids), dtype=bool)  # heston jobs running
+        self.counters = {'quotes': 0, 'coalesced': 0, 'rejected': 0, 'batches': 0, 'repriced': 0, 'heavy_jobs': 0,
+                         'heavy_errors': 0}
+        self.histograms = {'quote_to_publish': LatencyHistogram(), 'batch_compute': LatencyHistogram(),
+                           'heavy_compute': LatencyHistogram()}
+        self._subscribers = []
+        self._wakeup = None
+        self._running = False
+        self._heavy_tasks = set()
+
+    def subscribe(self):
+        # a bounded queue of result DataFrames (indexed by instrument id); a slow subscriber loses its oldest
+        # batches rather than holding the service up
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.append(queue)
+        return queue
+
+    def submit(self, instrument, S0, sigma=None):
+        self.submit_many([instrument], [S0], None if sigma is None else [sigma])
+
+    def submit_many(self, instruments, S0, sigma=None):
+        # one quote per entry; quotes for unknown instruments or with a non-positive spot / vol are rejected
+        index = self.ids.get_indexer(instruments)
+        S0 = np.asarray(S0, dtype=float)
+        sigma = np.full(S0.shape, np.nan) if sigma is None else np.asarray(sigma, dtype=float)
+        with np.errstate(invalid='ignore'):
+            valid = (index >= 0) & (S0 > 0) & ((sigma > 0) | np.isnan(sigma))
+        self.counters['quotes'] += index.size
+        self.counters['rejected'] += int(index.size - valid.sum())
+        index, S0, sigma = index[valid], S0[valid], sigma[valid]
+
+        # a quote overwriting one that was never priced is coalesced (also repeats within this call)
+        unique = np.unique(index)
+        self.counters['coalesced'] += index.size - unique.size + int(self.dirty[unique].sum())
+        self.spot[index] = S0
+        quoted = ~np.isnan(sigma)
+        self.sigma[index[quoted]] = sigma[quoted]
+        self.dirty[index] = True
+        self.received[index] = time.perf_counter()
+        if self._wakeup is not None and index.size:
+            self._wakeup.set()
+
+    async def run(self):
+        # the pricing loop, until stop()
+        self._wakeup = asyncio.Event()
+        self._running = True
+        own_executor = self.executor is None and self.heavy.any()
+        if own_executor:
+            self.executor = ProcessPoolExecutor(default_workers())
+        if self.dirty.any():
+            self._wakeup.set()
+        try:
+            while self._running:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                # let the rest of the burst arrive; it coalesces into the same batch
+                await asyncio.sleep(self.batch_interval)
+                ready = np.flatnonzero(self.dirty & ~self.in_flight)
+                light = ready[~self.heavy[ready]]
+                if light.size > self.max_batch:
+                    light = light[:self.max_batch]
+                    self._wakeup.set()
+                if light.size:
+                    self._reprice(light)
+                for i in ready[self.heavy[ready]]:
+                    task = asyncio.create_task(self._reprice_heavy(i))
+                    self._heavy_tasks.add(task)
+                    task.add_done_callback(self._heavy_tasks.discard)
+            if self._heavy_tasks:
+                await asyncio.gather(*self._heavy_tasks)
+        finally:
+            if own_executor:
+                self.executor.shutdown()
+                self.executor = None
+
+    async def stop(self):
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _reprice(self, index):
+        received = self.received[index]
+        self.dirty[index] = False
+        start = time.perf_counter()
+        greeks = greeks_batch(self.spot[index], self.X[index], self.T[index], self.r[index], self.sigma[index],
+                              self.q[index], self.is_call[index])
+        frame = pd.DataFrame({'S0': self.spot[index], 'sigma': self.sigma[index], **greeks}, index=self.ids[index])
+        now = time.perf_counter()
+        frame['latency'] = now - received
+        self.histograms['batch_compute'].observe(now - start)
+        self.histograms['quote_to_publish'].observe(frame['latency'].to_numpy())
+        self.counters['batches'] += 1
+        self.counters['repriced'] += index.size
+        record('repricing_service', batches=1, repriced=index.size)
+        self._publish(frame)
+
+    async def _reprice_heavy(self, i):
+        received, S0 = self.received[i], self.spot[i]
+        self.dirty[i] = False
+        self.in_flight[i] = True
+        start = time.perf_counter()
+        try:
+            # the instrument's position as the seed: common random numbers, so reprices move with the quotes
+            # and not with the simulation noise
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, heston_price, S0, self.X[i], self.T[i], self.r[i], *self.heston[i],
+                bool(self.is_call[i]), self.heston_simulations, self.heston_steps, int(i))
+        except Exception as error:
+            # a failed job (bad parameters, broken pool) is published as an error row with a nan price; the
+            # instrument is priced again on its next quote, not retried here, so a persistent failure cannot spin
+            self.counters['heavy_errors'] += 1
+            record('repricing_service', heavy_errors=1)
+            self._publish(pd.DataFrame({'S0': [S0], 'price': [np.nan], 'std_error': [np.nan],
+                                        'latency': [time.perf_counter() - received],
+                                        'error': [f"{type(error).__name__}: {error}"]}, index=self.ids[[i]]))
+            return
+        finally:
+            self.in_flight[i] = False
+            if self.dirty[i]:
+                self._wakeup.set()
+        now = time.perf_counter()
+        self.histograms['heavy_compute'].observe(now - start)
+        self.histograms['quote_to_publish'].observe(now - received)
+        self.counters['heavy_jobs'] += 1
+        record('repricing_service', heavy_jobs=1)
+        self._publish(pd.DataFrame({'S0': [S0], 'price': [result['price']], 'std_error': [result['std_error']],
+                                    'latency': [now - received]}, index=self.ids[[i]]))
+
+    def _publish(self, frame):
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(frame)
+
+    def report(self):
+        # latency quantiles in milliseconds (bucket upper bounds) and the counters
+        frame = pd.DataFrame({name: histogram.summary() for name, histogram in self.histograms.items()}).T
+        frame[['mean', 'p50', 'p90', 'p99']] *= 1e3
+        return frame.rename(columns=lambda c: c if c == 'count' else f"{c} ms"), dict(self.counters)
+
+    def to_prometheus(self, prefix='repricing'):
+        lines = []
+        for name, value in self.counters.items():
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+        lines += [histogram.to_prometheus(f"{prefix}_{name}_seconds") for name, histogram in self.histograms.items()]
+        return "\n".join(lines) + "\n"
+
+
+class SimulatedFeed:
+    # stand-in quote feed for testing and load generation: every instrument's spot follows its own gbm, and
+    # quotes come in bursts of `burst` random instruments (so some repeat) at `rate` quotes per second
+    def __init__(self, instruments, rate=100000, burst=1000, daily_vol=0.01, seed=0):
+        self.ids = instruments.index
+        self.spot = instruments['S0'].to_numpy(dtype=float).copy()
+        self.rate = rate
+        self.burst = burst
+        self.daily_vol = daily_vol
+        self.rng = np.random.default_rng(seed)
+
+    async def bursts(self, duration):
+        # yields (positions, spots) on schedule; a burst that comes due late is sent at once (no sleep)
+        interval = self.burst / self.rate
+        start = time.perf_counter()
+        sent = 0
+        while time.perf_counter() - start < duration:
+            position = self.rng.integers(0, len(self.ids), self.burst)
+            # a tick is taken as one second of trading: 23400 per day
+            self.spot[position] *= np.exp(self.daily_vol / np.sqrt(23400) * self.rng.standard_normal(self.burst))
+            yield position, self.spot[position]
+            sent += 1
+            await asyncio.sleep(max(0.0, start + sent * interval - time.perf_counter()))
+
+    async def run(self, service, duration):
+        # in-process: quotes go straight into the service
+        async for position, spot in self.bursts(duration):
+            service.submit_many(self.ids[position], spot)
+
+    async def serve(self, duration, host='127.0.0.1', port=0):
+        # over tcp: one json line {"ids": [...], "S0": [...]} per burst to every client; returns the server
+        # (its port is server.sockets[0].getsockname()[1]) and the task streaming the quotes
+        clients = []
+
+        async def connected(reader, writer):
+            clients.append(writer)
+
+        async def stream():
+            async for position, spot in self.bursts(duration):
+                line = (json.dumps({'ids': self.ids[position].tolist(), 'S0': spot.tolist()}) + "\n").encode()
+                for writer in clients:
+                    writer.write(line)
+                await asyncio.gather(*(writer.drain() for writer in clients))
+            for writer in clients:
+                writer.close()
+
+        server = await asyncio.start_server(connected, host, port)
+        return server, stream
+
+
+async def consume_socket(service, host, port):
+    # client side of SimulatedFeed.serve (or any feed speaking the same json lines), until the feed closes
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while line := await reader.readline():
+            quote = json.loads(line)
+            service.submit_many(quote['ids'], quote['S0'], quote.get('sigma'))
+    finally:
+        writer.close()
+
+
+def demo_instruments(n_instruments, n_heston=0, seed=0):
+    # a chain of random contracts, the first n_heston of them priced with heston monte carlo
+    rng = np.random.default_rng(seed)
+    instruments = pd.DataFrame({
+        'S0': 100.0,
+        'X': rng.uniform(70, 130, n_instruments),
+        'T': rng.uniform(0.05, 2.0, n_instruments),
+        'r': 0.03,
+        'sigma': rng.uniform(0.1, 0.6, n_instruments),
+        'option_type': np.where(rng.random(n_instruments) < 0.5, 'call', 'put'),
+        'model': np.where(np.arange(n_instruments) < n_heston, 'heston', 'black_scholes'),
+        'kappa': 2.0, 'theta': 0.04, 'xi': 0.5, 'v0': 0.04, 'rho': -0.7,
+    }, index=pd.Index([f"OPT{i:06d}" for i in range(n_instruments)], name='instrument'))
+    return instruments
+
+
+async def run_demo(n_instruments=10000, rate=100000, burst=1000, duration=5.0, n_heston=0, socket=False):
+    # a feed and the service side by side for `duration` seconds; returns (latency table, counters)
+    instruments = demo_instruments(n_instruments, n_heston)
+    service = RepricingService(instruments)
+    feed = SimulatedFeed(instruments, rate, burst)
+    results = service.subscribe()
+
+    async def drain():
+        while True:
+            await results.get()
+
+    pricing = asyncio.create_task(service.run())
+    consumer = asyncio.create_task(drain())
+    if socket:
+        server, stream = await feed.serve(duration)
+        port = server.sockets[0].getsockname()[1]
+        client = asyncio.create_task(consume_socket(service, '127.0.0.1', port))
+        await asyncio.sleep(0.05)  # let the client connect before quotes flow
+        await stream()
+        await client
+        server.close()
+    else:
+        await feed.run(service, duration)
+    await service.stop()
+    await pricing
+    consumer.cancel()
+    return service.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Repricing service against a simulated quote feed")
+    parser.add_argument('--instruments', type=int, default=10000)
+    parser.add_argument('--rate', type=float, default=100000, help="quotes per second")
+    parser.add_argument('--burst', type=int, default=1000, help="quotes per feed message")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds")
+    parser.add_argument('--heston', type=int, default=0, help="instruments priced by heston monte carlo")
+    parser.add_argument('--socket', action='store_true', help="feed over a local tcp socket")
+    args = parser.parse_args(argv)
+
+    latency, counters = asyncio.run(run_demo(args.instruments, args.rate, args.burst, args.duration, args.heston,
+                                             args.socket))
+    print(latency.to_string(float_format=lambda v: f"{v:.4g}"))
+    print(", ".join(f"{name} {value:,}" for name, value in counters.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+
+import numpy as np
+
+# streaming volatility estimators for many tickers at once
+# every estimator keeps its state in flat per-ticker arrays and takes one bar for all (or a subset of the)
+# tickers per update() call, so the cost of a new bar is O(1) per ticker however long the history is; rolling
+# windows are ring buffers with running sums. volatility() returns annualized values, nan until a ticker has
+# min_periods observations. tickers whose value in a bar is missing (nan) keep their state for that bar
+
+
+class _RollingSums:
+    # per-ticker ring buffer of the last `window` bar values (n_fields per bar) and their running sums
+    def __init__(self, n_tickers, window, n_fields):
+        self.window = window
+        self.buffer = np.zeros((window, n_tickers, n_fields))
+        self.sums = np.zeros((n_tickers, n_fields))
+        self.count = np.zeros(n_tickers, dtype=np.int64)  # observations in the window, at most window
+        self.position = np.zeros(n_tickers, dtype=np.int64)
+
+    def push(self, index, values):
+        slot = self.position[index]
+        self.sums[index] += values - self.buffer[slot, index]
+        self.buffer[slot, index] = values
+        self.count[index] = np.minimum(self.count[index] + 1, self.window)
+        self.position[index] = (slot + 1) % self.window
+        # adding and subtracting accumulates rounding error; every time a ticker's buffer wraps around its sums
+        # are recomputed from the buffer, which bounds the error at O(1) amortized cost per bar
+        wrapped = index[self.position[index] == 0]
+        if wrapped.size:
+            self.sums[wrapped] = self.buffer[:, wrapped].sum(axis=0)
+
+
+class _StreamingEstimator:
+    def __init__(self, n_tickers, periods_per_year=252, min_periods=2):
+        # periods_per_year annualizes the per-bar volatility (252 for daily bars, 252 * 390 for minute bars)
+        self.n_tickers = n_tickers
+        self.periods_per_year = periods_per_year
+        self.min_periods = min_periods
+
+    def _select(self, index, *columns):
+        # the tickers in this bar (index None means all of them, in order) with their prices; tickers with a
+        # missing or non-positive price are left out
+        index = np.arange(self.n_tickers) if index is None else np.asarray(index, dtype=np.int64)
+        columns = [np.broadcast_to(np.asarray(column, dtype=float), index.shape) for column in columns]
+        with np.errstate(invalid='ignore'):
+            valid = np.logical_and.reduce([np.isfinite(column) & (column > 0) for column in columns])
+        return index[valid], [column[valid] for column in columns]
+
+    def replay(self, *history):
+        # feeds whole histories bar by bar, one (bars, tickers) array or DataFrame per update() argument,
+        # e.g. to warm the state up from daily data before streaming
+        for bar in zip(*(np.asarray(column, dtype=float) for column in history)):
+            self.update(*bar)
+        return self
+
+    def _annualize(self, variance, count):
+        with np.errstate(invalid='ignore'):
+            volatility = np.sqrt(np.maximum(variance, 0) * self.periods_per_year)
+        return np.where(count >= self.min_periods, volatility, np.nan)
+
+
+class CloseToCloseVolatility(_StreamingEstimator):
+    # rolling sample standard deviation of log returns, the streaming form of historical_volatility
+    def __init__(self, n_tickers, window=252, periods_per_year=252, min_periods=None):
+        super().__init__(n_tickers, periods_per_year, max(2, window if min_periods is None else min_periods))
+        self.last_close = np.full(n_tickers, np.nan)
+        self.returns = _RollingSums(n_tickers, window, 2)  # sum of r and of r^2
+
+    def update(self, close, index=None):
+        index, (close,) = self._select(index, close)
+        previous = self.last_close[index]
+        self.last_close[index] = close
+        seen = np.isfinite(previous)
+        r = np.log(close[seen] / previous[seen])
+        self.returns.push(index[seen], np.stack([r, r * r], axis=1))
+
+    def volatility(self):
+        n = self.returns.count
+        total, squares = self.returns.sums.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = (squares - total ** 2 / n) / (n - 1)
+        return self._annualize(variance, n)
+
+
+class EWMAVolatility(_StreamingEstimator):
+    # riskmetrics exponentially weighted variance: var = decay * var + (1 - decay) * r^2, seeded with the
+    # first squared return
+    def __init__(self, n_tickers, decay=0.94, periods_per_year=252, min_periods=1):
+        super().__init__(n_tickers, periods_per_year, min_periods)
+        self.decay = decay
+        self.last_close = np.full(n_tickers, np.nan)
+        self.variance = np.full(n_tickers, np.nan)
+        self.count = np.zeros(n_tickers, dtype=np.int64)
+
+    def update(self, close, index=None):
+        index, (close,) = self._select(index, close)
+        previous = self.last_close[index]
+        self.last_close[index] = close
+        index, r = index[np.isfinite(previous)], np.log(close / previous)[np.isfinite(previous)]
+        variance = self.variance[index]
+        self.variance[index] = np.where(np.isnan(variance), r * r, self.decay * variance + (1 - self.decay) * r * r)
+        self.count[index] += 1
+
+    def volatility(self):
+        return self._annualize(self.variance, self.count)
+
+
+class ParkinsonVolatility(_StreamingEstimator):
+    # high-low range estimator, rolling mean of ln(H/L)^2 / (4 ln 2)
+    def __init__(self, n_tickers, window=20, periods_per_year=252, min_periods=None):
+        super().__init__(n_tickers, periods_per_year, window if min_periods is None else min_periods)
+        self.bars = _RollingSums(n_tickers, window, 1)
+
+    def update(self, high, low, index=None):
+        index, (high, low) = self._select(index, high, low)
+        self.bars.push(index, (np.log(high / low) ** 2 / (4 * np.log(2)))[:, None])
+
+    def volatility(self):
+        n = self.bars.count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self._annualize(self.bars.sums[:, 0] / n, n)
+
+
+class GarmanKlassVolatility(_StreamingEstimator):
+    # open-high-low-close estimator, rolling mean of 0.5 ln(H/L)^2 - (2 ln 2 - 1) ln(C/O)^2
+    def __init__(self, n_tickers, window=20, periods_per_year=252, min_periods=None):
+        super().__init__(n_tickers, periods_per_year, window if min_periods is None else min_periods)
+        self.bars = _RollingSums(n_tickers, window, 1)
+
+    def update(self, open, high, low, close, index=None):
+        index, (open, high, low, close) = self._select(index, open, high, low, close)
+        value = 0.5 * np.log(high / low) ** 2 - (2 * np.log(2) - 1) * np.log(close / open) ** 2
+        self.bars.push(index, value[:, None])
+
+    def volatility(self):
+        n = self.bars.count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self._annualize(self.bars.sums[:, 0] / n, n)
+
+
+class YangZhangVolatility(_StreamingEstimator):
+    # overnight (previous close to open) variance + k * open-to-close variance + (1 - k) * rogers-satchell,
+    # with k = 0.34 / (1.34 + (n + 1) / (n - 1)); handles opening gaps and drift. a ticker's first bar only
+    # provides the previous close
+    def __init__(self, n_tickers, window=20, periods_per_year=252, min_periods=None):
+        super().__init__(n_tickers, periods_per_year, max(2, window if min_periods is None else min_periods))
+        self.last_close = np.full(n_tickers, np.nan)
+        self.bars = _RollingSums(n_tickers, window, 5)  # overnight, overnight^2, open-close, open-close^2, rs
+
+    def update(self, open, high, low, close, index=None):
+        index, (open, high, low, close) = self._select(index, open, high, low, close)
+        previous = self.last_close[index]
+        self.last_close[index] = close
+        seen = np.isfinite(previous)
+        index, open, high, low, close = index[seen], open[seen], high[seen], low[seen], close[seen]
+
+        overnight = np.log(open / previous[seen])
+        open_close = np.log(close / open)
+        rogers_satchell = np.log(high / close) * np.log(high / open) + np.log(low / close) * np.log(low / open)
+        self.bars.push(index, np.stack([overnight, overnight ** 2, open_close, open_close ** 2, rogers_satchell],
+                                       axis=1))
+
+    def volatility(self):
+        n = self.bars.count
+        overnight, overnight_sq, open_close, open_close_sq, rogers_satchell = self.bars.sums.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            overnight_var = (overnight_sq - overnight ** 2 / n) / (n - 1)
+            open_close_var = (open_close_sq - open_close ** 2 / n) / (n - 1)
+            k = 0.34 / (1.34 + (n + 1) / (n - 1))
+            variance = overnight_var + k * open_close_var + (1 - k) * rogers_satchell / n
+        return self._annualize(variance, n)
@@ -0,0 +1,108 @@
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_pipeline import _NpyWriter, count_rows, read_chunks, run_pipeline
+from black_scholes import price_batch
+from greeks import greeks_batch
+from volatality import IV_BELOW_INTRINSIC, IV_OK
+
+
+def _chain(n=500, seed=0):
+    # a chain priced at known vols, with a couple of quotes under intrinsic value that cannot be inverted
+    rng = np.random.default_rng(seed)
+    chain = pd.DataFrame({'S0': 100.0, 'strike': rng.uniform(70, 130, n), 'T': rng.uniform(0.1, 2.0, n),
+                          'r': 0.03, 'option_type': np.where(rng.random(n) < 0.5, 'call', 'put'),
+                          'true_vol': rng.uniform(0.1, 0.6, n)})
+    chain['lastPrice'] = price_batch(chain['S0'], chain['strike'], chain['T'], chain['r'], chain['true_vol'],
+                                     option_type=chain['option_type'])
+    chain.loc[[3, 7], 'lastPrice'] = 0.0
+    return chain
+
+
+def _check_results(results, chain):
+    assert len(results) == len(chain)
+    np.testing.assert_allclose(results['strike'], chain['strike'], rtol=1e-15)
+    np.testing.assert_array_equal(np.asarray(results['option_type']).astype(str), chain['option_type'])
+    status = np.asarray(results['ivStatus'])
+    assert (status[[3, 7]] == IV_BELOW_INTRINSIC).all()
+    ok = status == IV_OK
+    assert ok.sum() == len(chain) - 2
+    np.testing.assert_allclose(results['impliedVol'][ok], chain['true_vol'][ok], rtol=1e-7)
+    expected = greeks_batch(chain['S0'][ok], chain['strike'][ok], chain['T'][ok], chain['r'][ok],
+                            chain['true_vol'][ok], option_type=chain['option_type'][ok])
+    for name in ('price', 'delta', 'gamma', 'vega', 'theta', 'rho'):
+        np.testing.assert_allclose(results[name][ok], expected[name], rtol=1e-6, atol=1e-9)
+        assert np.isnan(results[name][~ok]).all()
+
+
+def test_csv_to_npy(tmp_path):
+    chain = _chain()
+    chain.to_csv(tmp_path / 'chain.csv', index=False)
+    stats = run_pipeline(str(tmp_path / 'chain.csv'), str(tmp_path / 'results.npy'), chunk_size=64)
+    assert stats['rows'] == len(chain)
+    assert stats['chunks'] == 8
+    assert stats['iv_failures'] == 2
+    _check_results(np.load(tmp_path / 'results.npy'), chain)
+
+
+def test_parquet_to_npy(tmp_path):
+    pytest.importorskip('pyarrow')
+    chain = _chain()
+    chain.to_parquet(tmp_path / 'chain.parquet', index=False)
+    run_pipeline(str(tmp_path / 'chain.parquet'), str(tmp_path / 'results.npy'), chunk_size=100)
+    _check_results(np.load(tmp_path / 'results.npy'), chain)
+
+
+def test_npy_to_csv_with_workers(tmp_path):
+    # a structured .npy input, read through the memory map, priced in a process pool, written in order
+    chain = _chain(200)
+    records = np.rec.fromarrays([chain[name].to_numpy(dtype=None if name != 'option_type' else 'U4')
+                                 for name in chain.columns], names=list(chain.columns))
+    np.save(tmp_path / 'chain.npy', records)
+    run_pipeline(str(tmp_path / 'chain.npy'), str(tmp_path / 'results.csv'), chunk_size=30, workers=2)
+    _check_results(pd.read_csv(tmp_path / 'results.csv'), chain)
+
+
+def test_defaults_fill_missing_columns(tmp_path):
+    chain = _chain(50).drop(columns=['S0', 'r'])
+    chain.to_csv(tmp_path / 'chain.csv', index=False)
+    run_pipeline(str(tmp_path / 'chain.csv'), str(tmp_path / 'results.csv'), defaults={'S0': 100.0, 'r': 0.03})
+    _check_results(pd.read_csv(tmp_path / 'results.csv'), _chain(50))
+
+
+def test_count_rows_matches_parser(tmp_path):
+    # quoted line breaks, a blank line and no final newline: the count has to agree with read_chunks
+    path = tmp_path / 'chain.csv'
+    path.write_text('strike,lastPrice,note\n100,10.5,"two\nlines"\n\n110,5.0,x\n95,12.0,y')
+    assert count_rows(str(path)) == 3
+    assert sum(len(chunk) for chunk in read_chunks(str(path), 2)) == 3
+
+
+def test_failed_run_raises_original_error(tmp_path):
+    chain = _chain(300).drop(columns=['S0'])
+    chain.to_csv(tmp_path / 'chain.csv', index=False)
+    for output in ('results.npy', 'results.csv'):
+        with pytest.raises(ValueError, match="No 'S0' column"):
+            run_pipeline(str(tmp_path / 'chain.csv'), str(tmp_path / output), chunk_size=100)
+        assert not os.path.exists(tmp_path / output)
+
+
+def test_failure_after_first_chunk_removes_output(tmp_path):
+    # the first chunk is written before the bad one is read, the partial file must not be left behind
+    chain = _chain(300)
+    chain.loc[250, 'option_type'] = 'straddle'
+    chain.to_csv(tmp_path / 'chain.csv', index=False)
+    with pytest.raises(ValueError, match="Invalid option type"):
+        run_pipeline(str(tmp_path / 'chain.csv'), str(tmp_path / 'results.npy'), chunk_size=100)
+    assert not os.path.exists(tmp_path / 'results.npy')
+
+
+def test_npy_writer_checks_row_count(tmp_path):
+    writer = _NpyWriter(str(tmp_path / 'short.npy'), 5)
+    writer.write(pd.DataFrame({'price': [1.0, 2.0]}))
+    with pytest.raises(ValueError, match="wrote 2 rows"):
+        writer.close()
@@ -0,0 +1,71 @@
+
+import json
+
+import pytest
+
+import benchmarks
+from benchmarks import SUITE, compare_results, run_suite
+
+
+def _run(case, **sizes):
+    run, items, check = SUITE[case](**sizes)
+    return items, check(run())
+
+
+# every suite case small enough for a test run, with the error its reference check must come back under
+# (four standard errors, about 0.1 each at 20000 paths, for the monte carlo cases)
+@pytest.mark.parametrize('case, sizes, tolerance', [
+    ('black_scholes', dict(n_contracts=2000, n_check=200), 1e-10),
+    ('greeks', dict(n_contracts=2000, n_check=200), 1e-10),
+    ('implied_vol', dict(n_contracts=2000), 1e-6),
+    ('binomial_tree', dict(N=400), 1e-2),
+    ('gbm_monte_carlo', dict(num_simulations=20000, num_steps=4), 0.4),
+    ('heston_monte_carlo', dict(num_simulations=20000, num_steps=16), 0.4),
+    ('heston_cos', dict(n_strikes=50), 1e-7),
+    ('cev_monte_carlo', dict(num_simulations=20000, num_steps=50), 0.4)])
+def test_suite_cases_check_against_their_reference(case, sizes, tolerance):
+    items, error = _run(case, **sizes)
+    assert items > 0
+    assert 0 <= error < tolerance
+
+
+def _results(**cases):
+    return {'meta': {}, 'cases': {name: dict(zip(('seconds', 'peak_mb', 'error'), values))
+                                  for name, values in cases.items()}}
+
+
+def test_compare_flags_regressions_and_improvements():
+    baseline = _results(a=(1.0, 10.0, 1e-3), b=(1.0, 10.0, 1e-14), gone=(1.0, 1.0, 0.0))
+    current = _results(a=(1.3, 7.0, 1e-3), b=(1.1, 10.0, 1e-13), new=(1.0, 1.0, 0.0))
+    rows = compare_results(current, baseline).set_index(['case', 'metric'])['status']
+    assert rows[('a', 'seconds')] == 'regression'
+    assert rows[('a', 'peak_mb')] == 'improved'
+    assert rows[('a', 'error')] == 'ok'
+    assert rows[('b', 'seconds')] == 'ok'
+    # a tenfold error at machine precision is below error_floor
+    assert rows[('b', 'error')] == 'ok'
+    assert compare_results(current, baseline, error_floor=0.0).set_index(['case', 'metric']).loc[
+        ('b', 'error'), 'status'] == 'regression'
+    # cases missing on either side are not compared
+    assert set(rows.index.get_level_values('case')) == {'a', 'b'}
+
+
+def test_run_suite_records_the_run():
+    results = run_suite(['heston_cos'], repeats=1, curves=False)
+    case = results['cases']['heston_cos']
+    assert set(case) == {'seconds', 'throughput', 'peak_mb', 'error'}
+    assert case['error'] < 1e-7 and case['throughput'] > 0
+    assert results['meta']['repeats'] == 1 and 'kernels' in results['meta']
+    json.dumps(results)
+
+
+def test_main_exits_nonzero_on_a_regression(tmp_path, capsys):
+    path = tmp_path / 'results.json'
+    assert benchmarks.main(['heston_cos', '--suite', '--no-curves', '--repeats', '1', '--json', str(path)]) == 0
+    baseline = json.loads(path.read_text())
+    # a baseline ten times faster than anything this run can manage
+    baseline['cases']['heston_cos']['seconds'] /= 10
+    slower = tmp_path / 'baseline.json'
+    slower.write_text(json.dumps(baseline))
+    assert benchmarks.main(['heston_cos', '--suite', '--no-curves', '--repeats', '1', '--compare', str(slower)]) == 1
+    assert 'regression' in capsys.readouterr().out
@@ -0,0 +1,66 @@
+
+import numpy as np
+import pytest
+
+from binomial_tree import BinomialTreeModel
+from black_scholes import price_batch
+
+# european prices converge to black-scholes; the american put has no closed form, its reference is the
+# well-known 6.0903 for S0 = X = 100, T = 1, r = 5%, sigma = 20%
+
+AMERICAN_PUT = 6.0903
+STRIKES = np.array([80.0, 90.0, 100.0, 110.0, 120.0])
+
+
+@pytest.mark.parametrize('option_type', ['call', 'put'])
+def test_european_converges_to_black_scholes(option_type):
+    exact = price_batch(100.0, 100.0, 1.0, 0.05, 0.2, option_type=option_type)
+    tree = BinomialTreeModel(100, 100, 1.0, 0.05, 0.2, 2000)
+    assert abs(tree.price(option_type) - exact) < 2e-3
+    # richardson removes the leading 1/N error term
+    assert abs(tree.price(option_type, richardson=True) - exact) < 1e-5
+
+
+def test_american_put():
+    tree = BinomialTreeModel(100, 100, 1.0, 0.05, 0.2, 2000)
+    assert tree.price('put', 'american') == pytest.approx(AMERICAN_PUT, abs=1e-3)
+    assert BinomialTreeModel(100, 100, 1.0, 0.05, 0.2, 500).price('put', 'american', richardson=True) \
+        == pytest.approx(AMERICAN_PUT, abs=2e-4)
+
+
+def test_american_call_without_dividends_is_european():
+    tree = BinomialTreeModel(100, 90, 2.0, 0.05, 0.3, 400)
+    assert tree.price('call', 'american') == pytest.approx(tree.price('call'), rel=1e-12)
+
+
+def test_bermudan_between_european_and_american():
+    tree = BinomialTreeModel(100, 110, 1.0, 0.05, 0.25, 400)
+    european, american = tree.price('put'), tree.price('put', 'american')
+    quarterly = tree.price('put', 'bermudan', exercise_dates=[0.25, 0.5, 0.75])
+    monthly = tree.price('put', 'bermudan', exercise_dates=np.arange(1, 12) / 12)
+    assert european < quarterly < monthly < american
+    # exercise at every step is american, no exercise date before expiry is european
+    every_step = tree.price('put', 'bermudan', exercise_dates=np.arange(400) / 400)
+    assert every_step == pytest.approx(american, rel=1e-12)
+    assert tree.price('put', 'bermudan', exercise_dates=[1.5]) == pytest.approx(european, rel=1e-12)
+
+
+@pytest.mark.parametrize('exercise', ['european', 'american'])
+def test_strike_vector_matches_single_strikes(exercise):
+    tree = BinomialTreeModel(100, 100, 0.5, 0.03, 0.3, 300)
+    values = tree.price('put', exercise, strikes=STRIKES)
+    singles = [BinomialTreeModel(100, X, 0.5, 0.03, 0.3, 300).price('put', exercise) for X in STRIKES]
+    np.testing.assert_allclose(values, singles, rtol=1e-13)
+    assert (np.diff(values) > 0).all()
+
+
+def test_errors():
+    with pytest.raises(ValueError, match="Volatility"):
+        BinomialTreeModel(100, 100, 1.0, 0.05, 0.0, 100)
+    tree = BinomialTreeModel(100, 100, 1.0, 0.05, 0.2, 100)
+    with pytest.raises(ValueError, match="exercise_dates"):
+        tree.price('put', 'bermudan')
+    with pytest.raises(ValueError, match="exercise must be"):
+        tree.price('put', 'asian')
+    with pytest.raises(ValueError, match="Invalid option type"):
+        tree.price('straddle')
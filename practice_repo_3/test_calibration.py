@@ -0,0 +1,94 @@
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calibration import HestonCalibrator
+from heston import heston_cos_prices
+
+PARAMETERS = HestonCalibrator.PARAMETERS
+
+
+def _surface(params, expiries, strikes=np.linspace(70, 130, 13), S0=100.0, r=0.03):
+    # out-of-the-money quotes priced with far more cos terms and a wider interval than the calibrator uses
+    rows = []
+    for T in expiries:
+        calls = heston_cos_prices(S0, strikes, T, r, *params, 'call', n_terms=8192, truncation=40)
+        puts = heston_cos_prices(S0, strikes, T, r, *params, 'put', n_terms=8192, truncation=40)
+        for strike, call, put in zip(strikes, calls, puts):
+            rows.append({'strike': strike, 'T': T, 'option_type': 'call' if strike >= S0 else 'put',
+                         'lastPrice': call if strike >= S0 else put})
+    return pd.DataFrame(rows)
+
+
+def test_recovers_parameters():
+    true = (1.8, 0.05, 0.7, 0.03, -0.65)
+    calibrator = HestonCalibrator(_surface(true, (0.1, 0.25, 0.5, 1.0, 2.0)), 100.0, 0.03)
+    result = calibrator.calibrate()
+    assert result['success']
+    np.testing.assert_allclose([result[name] for name in PARAMETERS], true, rtol=1e-4, atol=1e-6)
+    assert result['price_rmse'] < 1e-7
+    assert np.nanmax(np.abs(calibrator.implied_vol_errors())) < 1e-6
+
+
+def test_long_expiries_get_enough_terms():
+    # large vol of vol out to ten years: the term count grows with maturity and the fit stays exact
+    true = (0.5, 0.06, 1.2, 0.04, -0.8)
+    calibrator = HestonCalibrator(_surface(true, (0.25, 1.0, 3.0, 10.0)), 100.0, 0.03)
+    result = calibrator.calibrate()
+    np.testing.assert_allclose([result[name] for name in PARAMETERS], true, rtol=1e-3, atol=1e-5)
+    assert result['price_rmse'] < 1e-6
+    terms = [w.size for _, _, w, _, _ in calibrator._plan]
+    assert terms == sorted(terms) and terms[-1] >= 2048
+
+
+def test_fixed_terms():
+    calibrator = HestonCalibrator(_surface((1.8, 0.05, 0.7, 0.03, -0.65), (0.5, 1.0)), 100.0, 0.03, n_terms=512)
+    calibrator.calibrate()
+    assert [w.size for _, _, w, _, _ in calibrator._plan] == [512, 512]
+
+
+def test_analytic_jacobian_matches_finite_differences():
+    calibrator = HestonCalibrator(_surface((1.8, 0.05, 0.7, 0.03, -0.65), (0.25, 1.0)), 100.0, 0.03)
+    params = np.array([1.5, 0.04, 0.6, 0.035, -0.5])
+    jacobian = calibrator.jacobian(params)
+    numerical = np.empty_like(jacobian)
+    for j in range(params.size):
+        step = 1e-6 * max(abs(params[j]), 1e-2)
+        up, down = params.copy(), params.copy()
+        up[j] += step
+        down[j] -= step
+        numerical[:, j] = (calibrator.residuals(up) - calibrator.residuals(down)) / (2 * step)
+    np.testing.assert_allclose(jacobian, numerical, rtol=1e-5, atol=1e-8)
+
+
+def test_warm_start_after_move():
+    expiries = (0.25, 0.5, 1.0, 2.0)
+    calibrator = HestonCalibrator(_surface((1.8, 0.05, 0.7, 0.03, -0.65), expiries), 100.0, 0.03)
+    cold = calibrator.calibrate()
+    moved = (1.9, 0.052, 0.68, 0.032, -0.63)
+    calibrator.set_prices(_surface(moved, expiries)['lastPrice'].to_numpy())
+    warm = calibrator.calibrate()
+    np.testing.assert_allclose([warm[name] for name in PARAMETERS], moved, rtol=1e-4, atol=1e-6)
+    assert warm['nfev'] < cold['nfev']
+
+
+def test_unusable_quotes_are_left_out():
+    chain = _surface((1.8, 0.05, 0.7, 0.03, -0.65), (0.5, 1.0))
+    chain.loc[0, 'lastPrice'] = 0.0          # at the no-arbitrage lower bound, no implied vol
+    chain.loc[5, 'lastPrice'] = 1e3          # above any no-arbitrage bound
+    calibrator = HestonCalibrator(chain, 100.0, 0.03)
+    assert not calibrator.valid[[0, 5]].any()
+    assert (calibrator.weights[[0, 5]] == 0).all()
+    result = calibrator.calibrate()
+    np.testing.assert_allclose(result['kappa'], 1.8, rtol=1e-3)
+
+
+def test_errors():
+    chain = _surface((1.8, 0.05, 0.7, 0.03, -0.65), (0.5,))
+    with pytest.raises(ValueError, match="'T' column"):
+        HestonCalibrator(chain.drop(columns=['T']), 100.0, 0.03)
+    with pytest.raises(ValueError, match="weighting"):
+        HestonCalibrator(chain, 100.0, 0.03, weighting='iv')
+    with pytest.raises(ValueError, match="calibrate"):
+        HestonCalibrator(chain, 100.0, 0.03).model(100, 1.0)
@@ -0,0 +1,73 @@
+
+import numpy as np
+import pytest
+
+from black_scholes import price_batch
+from cev import CEVModel
+
+S0, T, r, q, vol = 100.0, 1.0, 0.03, 0.01, 0.25
+STRIKES = np.array([70.0, 85.0, 100.0, 115.0, 130.0])
+
+
+def _model(gamma, **options):
+    # sigma scaled so the local vol at S0 is `vol` for every gamma
+    return CEVModel(S0, 100.0, T, r, vol * S0 ** (1 - gamma), gamma, q, **options)
+
+
+def test_gamma_one_is_black_scholes():
+    np.testing.assert_allclose(_model(1.0).price('put', STRIKES), price_batch(S0, STRIKES, T, r, vol, q, 'put'),
+                               rtol=1e-14)
+
+
+@pytest.mark.parametrize('gamma', [0.999, 1.001])
+def test_closed_form_is_continuous_at_gamma_one(gamma):
+    # both chi-square branches approach black-scholes from their side
+    bs = price_batch(S0, STRIKES, T, r, vol, q, 'call')
+    np.testing.assert_allclose(_model(gamma).price('call', STRIKES), bs, atol=2e-3)
+
+
+@pytest.mark.parametrize('gamma', [0.3, 0.5, 1.5, 2.0])
+def test_put_call_parity(gamma):
+    model = _model(gamma)
+    parity = S0 * np.exp(-q * T) - STRIKES * np.exp(-r * T)
+    np.testing.assert_allclose(model.price('call', STRIKES) - model.price('put', STRIKES), parity, atol=1e-10)
+    # mixed labels come back element by element
+    mixed = model.price(np.array(['call', 'put', 'call', 'put', 'call']), STRIKES)
+    np.testing.assert_allclose(mixed[::2], model.price('call', STRIKES)[::2], rtol=1e-14)
+    assert model.call_price() == pytest.approx(float(model.price('call', [100.0])[0]), rel=1e-14)
+
+
+@pytest.mark.parametrize('gamma, option_type', [(0.5, 'call'), (0.5, 'put'), (1.5, 'call'), (1.5, 'put')])
+def test_simulator_matches_closed_form(gamma, option_type):
+    model = _model(gamma, num_simulations=100000, num_steps=100, seed=1)
+    result = model.estimate(option_type, control_variates=('black_scholes',))
+    assert abs(result['price'] - model.price(option_type)) < 4 * result['std_error']
+    # the gbm twin at the starting local vol removes almost all of the noise
+    assert result['vr_factor'] > 20
+
+
+def test_batched_estimate_and_forward():
+    whole = _model(0.5, num_simulations=6000, num_steps=20, seed=2).estimate('put')
+    batched = _model(0.5, num_simulations=6000, num_steps=20, seed=2, batch_size=1000).estimate('put')
+    assert abs(batched['price'] - whole['price']) < 4 * whole['std_error']
+    forward = _model(0.5, num_steps=20).simulate_terminal(200000, np.random.default_rng(3))
+    assert abs(forward.mean() - S0 * np.exp((r - q) * T)) < 4 * forward.std() / np.sqrt(forward.size)
+
+
+def test_smile_direction():
+    skew = _model(0.5).smile(STRIKES)
+    smile = _model(1.5).smile(STRIKES)
+    assert (skew['ivStatus'] == 0).all() and (smile['ivStatus'] == 0).all()
+    # vol falls with the strike below gamma = 1 and rises above it, through the starting local vol at the money
+    assert (np.diff(skew['impliedVol']) < 0).all()
+    assert (np.diff(smile['impliedVol']) > 0).all()
+    assert skew['impliedVol'][2] == pytest.approx(vol, abs=2e-3)
+    # out-of-the-money options by default
+    assert list(skew['option_type']) == ['put', 'put', 'put', 'call', 'call']
+
+
+def test_errors():
+    with pytest.raises(ValueError, match='Invalid option type'):
+        _model(0.5).estimate('straddle')
+    with pytest.raises(ValueError, match='control_variates'):
+        _model(0.5).estimate('call', control_variates=('heston',))
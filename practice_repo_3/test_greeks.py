@@ -0,0 +1,75 @@
+
+import numpy as np
+import pytest
+
+from black_scholes import BlackScholesModel, price_batch
+from greeks import Greeks, greeks_batch
+
+# every greek of the fused kernel against a central finite difference of the quantity it differentiates
+# (theta and the other time greeks are dV/dt = -dV/dT), over a spread of moneyness, maturity and carry
+
+rng = np.random.default_rng(0)
+N = 200
+BOOK = dict(S0=rng.uniform(60, 140, N), X=rng.uniform(60, 140, N), T=rng.uniform(0.05, 3.0, N),
+            r=rng.uniform(-0.01, 0.08, N), sigma=rng.uniform(0.05, 0.8, N), q=rng.uniform(0.0, 0.05, N),
+            option_type=np.where(rng.random(N) < 0.5, 'call', 'put'))
+
+FIRST_ORDER = [('delta', 'price', 'S0', 1), ('vega', 'price', 'sigma', 1), ('theta', 'price', 'T', -1),
+               ('rho', 'price', 'r', 1), ('gamma', 'delta', 'S0', 1)]
+SECOND_ORDER = [('vanna', 'delta', 'sigma', 1), ('charm', 'delta', 'T', -1), ('speed', 'gamma', 'S0', 1),
+                ('color', 'gamma', 'T', -1), ('zomma', 'gamma', 'sigma', 1), ('veta', 'vega', 'T', -1),
+                ('volga', 'vega', 'sigma', 1)]
+
+
+def _bumped(base, variable, sign):
+    step = 1e-5 * np.maximum(np.abs(BOOK[variable]), 1.0) if variable == 'r' else 1e-5 * BOOK[variable]
+    up = greeks_batch(**{**BOOK, variable: BOOK[variable] + step})[base]
+    down = greeks_batch(**{**BOOK, variable: BOOK[variable] - step})[base]
+    return sign * (up - down) / (2 * step)
+
+
+def test_price_matches_scalar_model():
+    greeks = greeks_batch(**BOOK)
+    for i in range(0, N, 17):
+        model = BlackScholesModel(*(BOOK[name][i] for name in ('S0', 'X', 'T', 'r', 'sigma', 'q')))
+        expected = model.call_price() if BOOK['option_type'][i] == 'call' else model.put_price()
+        assert greeks['price'][i] == pytest.approx(expected, rel=1e-12, abs=1e-12)
+    np.testing.assert_allclose(greeks['price'], price_batch(**BOOK), rtol=1e-13, atol=1e-13)
+
+
+@pytest.mark.parametrize('name, base, variable, sign', FIRST_ORDER + SECOND_ORDER)
+def test_greek_matches_finite_difference(name, base, variable, sign):
+    expected = _bumped(base, variable, sign)
+    scale = np.abs(greeks_batch(**BOOK)[base]).max()
+    np.testing.assert_allclose(greeks_batch(**BOOK)[name], expected, rtol=1e-5, atol=1e-7 * scale)
+
+
+def test_put_call_parity():
+    calls = greeks_batch(**{**BOOK, 'option_type': 'call'})
+    puts = greeks_batch(**{**BOOK, 'option_type': 'put'})
+    T, q, r = BOOK['T'], BOOK['q'], BOOK['r']
+    forward = BOOK['S0'] * np.exp(-q * T) - BOOK['X'] * np.exp(-r * T)
+    np.testing.assert_allclose(calls['price'] - puts['price'], forward, atol=1e-10)
+    np.testing.assert_allclose(calls['delta'] - puts['delta'], np.exp(-q * T), atol=1e-12)
+    for name in ('gamma', 'vega', 'vanna', 'speed', 'zomma', 'volga', 'veta', 'color'):
+        np.testing.assert_allclose(calls[name], puts[name], rtol=1e-12, atol=1e-12)
+
+
+def test_greeks_class_units():
+    # the per-greek methods quote theta per day and vega / rho per 1%, all_greeks follows them
+    greeks = Greeks(100, 105, 0.75, 0.04, 0.25, q=0.01)
+    for option_type in ('call', 'put'):
+        fused = greeks.all_greeks(option_type)
+        single = (greeks.delta(option_type), greeks.gamma(), greeks.theta(option_type), greeks.vega(),
+                  greeks.rho(option_type))
+        np.testing.assert_allclose(fused, single, rtol=1e-12)
+
+
+def test_broadcasting_and_errors():
+    greeks = greeks_batch(100.0, [90.0, 100.0, 110.0], 1.0, 0.03, 0.2, option_type=[True, False, True])
+    assert greeks['delta'].shape == (3,)
+    assert greeks['delta'][1] < 0 < greeks['delta'][0]
+    with pytest.raises(ValueError, match="sigma must be positive"):
+        greeks_batch(100.0, 100.0, 1.0, 0.03, [0.2, 0.0])
+    with pytest.raises(ValueError, match="Invalid option type"):
+        greeks_batch(100.0, 100.0, 1.0, 0.03, 0.2, option_type='straddle')
@@ -0,0 +1,148 @@
+
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import kernels
+from black_scholes import BlackScholesModel
+from heston import HestonModel, heston_characteristic_function, heston_cos_prices
+
+# a hard case for discretizations (andersen 2008): strong vol of vol and correlation, the feller condition
+# 2 kappa theta >= sigma^2 far from holding
+HARD = dict(S0=100, X=100, T=1.0, r=0.03, kappa=0.5, theta=0.04, sigma=1.0, v0=0.04, rho=-0.9)
+
+
+def _cos(params, strikes, option_type='call', **options):
+    return heston_cos_prices(params['S0'], strikes, params['T'], params['r'], params['kappa'], params['theta'],
+                             params['sigma'], params['v0'], params['rho'], option_type, **options)
+
+
+def test_qe_coarse_grid_matches_cos():
+    # eight steps a year: qe stays within the monte carlo error, full-truncation euler is far off
+    reference = _cos(HARD, [100.0])[0]
+    qe = HestonModel(**HARD, num_simulations=100000, num_steps=8, seed=1, scheme='qe').estimate('call')
+    assert abs(qe['price'] - reference) < 4 * qe['std_error']
+    euler = HestonModel(**HARD, num_simulations=100000, num_steps=8, seed=1).estimate('call')
+    assert euler['price'] - reference > 20 * euler['std_error']
+
+
+def test_qe_martingale():
+    # the K0 correction makes the discounted spot a martingale step by step
+    model = HestonModel(**HARD, num_simulations=200000, num_steps=4, seed=2, scheme='qe')
+    S = model.simulate_terminal(200000, np.random.default_rng(2))
+    forward = HARD['S0'] * np.exp(HARD['r'] * HARD['T'])
+    assert abs(S.mean() - forward) < 4 * S.std() / np.sqrt(S.size)
+
+
+def test_qe_step_only_evaluates_taken_branch():
+    # positive correlation and low vol of vol put 1 - 2 A a <= 0 on the exponential-branch paths; nothing
+    # there may reach a log or a square root of a negative number
+    model = HestonModel(100, 100, 1.0, 0.03, 0.5, 0.04, 0.3, 0.04, 0.9, scheme='qe')
+    v = np.array([0.0, 1e-4, 0.01, 0.2, 2.0])
+    z = np.linspace(-2, 2, 5)
+    with np.errstate(all='raise'):
+        for dt in (0.01, 0.25, 1.0):
+            log_return, v_next = model._qe_step(v, z, z, dt)
+            assert np.isfinite(log_return).all() and (v_next >= 0).all()
+
+
+def test_qe_step_matches_scalar_kernel():
+    model = HestonModel(**HARD, scheme='qe')
+    rng = np.random.default_rng(0)
+    v, z1, w2 = rng.gamma(0.5, 0.1, 200), rng.standard_normal(200), rng.standard_normal(200)
+    log_return, v_next = model._qe_step(v, z1, w2, 0.125)
+    scalar = [kernels._heston_qe_step(*args, 0.125, HARD['r'], HARD['kappa'], HARD['theta'], HARD['sigma'],
+                                      HARD['rho'], 1.5) for args in zip(v, z1, w2)]
+    np.testing.assert_allclose(log_return, [s[0] for s in scalar], rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(v_next, [s[1] for s in scalar], rtol=1e-12, atol=1e-15)
+
+
+# feller condition holds, so full-truncation euler at daily steps is close to unbiased
+MILD = dict(S0=100, X=105, T=0.5, r=0.02, kappa=2.0, theta=0.04, sigma=0.3, v0=0.05, rho=-0.7)
+
+
+def test_rolling_state_matches_full_paths():
+    # simulate_terminal draws the same stream as simulate_price_paths, step by step
+    model = HestonModel(**MILD, num_simulations=2000, num_steps=50, seed=3)
+    paths = model.simulate_price_paths()
+    S, S_average = model.simulate_terminal(2000, np.random.default_rng(3), running_average=True)
+    np.testing.assert_allclose(S, paths[:, -1], rtol=1e-12)
+    np.testing.assert_allclose(S_average, paths[:, 1:].mean(axis=1), rtol=1e-12)
+
+
+def test_single_batch_estimate_matches_full_paths():
+    model = HestonModel(**MILD, num_simulations=4000, num_steps=20, seed=4)
+    payoffs = np.maximum(model.simulate_price_paths()[:, -1] - MILD['X'], 0)
+    result = model.estimate('call')
+    assert result['price'] == pytest.approx(np.exp(-MILD['r'] * MILD['T']) * payoffs.mean(), rel=1e-12)
+    assert result['std_error'] == pytest.approx(np.exp(-MILD['r'] * MILD['T']) * payoffs.std(ddof=1) / np.sqrt(4000),
+                                                rel=1e-9)
+
+
+def test_small_batches_keep_memory_bounded():
+    model = HestonModel(**MILD, num_simulations=20000, num_steps=252, batch_size=1000, seed=5)
+    tracemalloc.start()
+    model.estimate('put')
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # the full path matrices would take 2 * 20000 * 253 * 8 bytes, about 80 mb
+    assert peak < 5e6
+
+
+def test_euler_daily_steps_match_cos():
+    reference = _cos(MILD, [MILD['X']])[0]
+    for batch_size in (100000, 7000):
+        result = HestonModel(**MILD, num_simulations=100000, num_steps=252, batch_size=batch_size,
+                             seed=6).estimate('call')
+        assert abs(result['price'] - reference) < 4 * result['std_error']
+
+
+def test_cos_reference_value():
+    # fang & oosterlee (2008), table 4: S0 = K = 100, T = 1, r = 0, reference call 5.785155450
+    price = heston_cos_prices(100, 100, 1.0, 0.0, 1.5768, 0.0398, 0.5751, 0.0175, -0.5711)[0]
+    assert price == pytest.approx(5.785155450, abs=1e-7)
+
+
+def test_cos_black_scholes_limit():
+    # v0 = theta and no vol of vol: constant variance, the price error closes like sigma^2
+    strikes = np.array([80.0, 100.0, 120.0])
+    exact = [BlackScholesModel(100, K, 1.0, 0.03, 0.2).call_price() for K in strikes]
+    np.testing.assert_allclose(heston_cos_prices(100, strikes, 1.0, 0.03, 1.0, 0.04, 1e-3, 0.04, 0.0), exact, atol=1e-5)
+
+
+def test_characteristic_function_moments():
+    phi = heston_characteristic_function(np.array([0.0, -1j]), 2.0, **{k: HARD[k] for k in
+                                                                       ('r', 'kappa', 'theta', 'sigma', 'v0', 'rho')})
+    # total mass one, and E[S_T / S0] is the forward factor
+    np.testing.assert_allclose(phi, [1.0, np.exp(2 * HARD['r'])], rtol=1e-12)
+
+
+def test_strike_grid_matches_single_strikes_and_parity():
+    strikes = np.linspace(50, 200, 31)
+    calls = _cos(HARD, strikes)
+    puts = _cos(HARD, strikes, 'put')
+    np.testing.assert_allclose(calls, [_cos(HARD, [K])[0] for K in strikes], rtol=1e-9, atol=1e-10)
+    np.testing.assert_allclose(calls - puts, HARD['S0'] - strikes * np.exp(-HARD['r'] * HARD['T']), atol=1e-10)
+    # monotone and convex in the strike, never below intrinsic
+    assert (np.diff(calls) <= 0).all() and (np.diff(calls, 2) > -1e-10).all()
+    assert (puts >= np.maximum(strikes * np.exp(-HARD['r'] * HARD['T']) - HARD['S0'], 0)).all()
+
+
+def test_adaptive_terms_match_a_long_expansion():
+    # on the same truncation range the adaptive term count reaches the price of a long fixed expansion,
+    # from a tenth of a year to ten years; a wide range is needed for strong vol of vol
+    for T in (0.1, 1.0, 10.0):
+        params = {**HARD, 'T': T}
+        adaptive = _cos(params, [90.0, 100.0, 110.0], truncation=40)
+        np.testing.assert_allclose(adaptive, _cos(params, [90.0, 100.0, 110.0], n_terms=8192, truncation=40),
+                                   atol=1e-7)
+
+
+def test_cos_price_method():
+    model = HestonModel(**MILD)
+    assert isinstance(model.cos_price('put'), float)
+    assert model.cos_price('put') == pytest.approx(_cos(MILD, [MILD['X']], 'put')[0], rel=1e-12)
+    np.testing.assert_allclose(model.cos_price(strikes=[90, 105]), _cos(MILD, [90, 105]), rtol=1e-12)
+    with pytest.raises(ValueError, match='Invalid option type'):
+        model.cos_price('straddle')
@@ -0,0 +1,95 @@
+
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import instrumentation
+from binomial_tree import BinomialTreeModel
+from black_scholes import price_batch
+from instrumentation import disable, enable, enabled, instrument, profile, profile_call, record
+
+
+def test_off_by_default():
+    assert not enabled()
+    # nothing to record into, and no error either
+    record('black_scholes', contracts=10)
+    assert instrumentation._active == []
+
+
+def test_engines_do_not_import_pandas():
+    # importing an engine must not pay for pandas while instrumentation is off
+    code = "import sys, binomial_tree, heston, pde; print('pandas' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+
+
+def test_profile_counts_engine_work():
+    with profile() as report:
+        BinomialTreeModel(100, 100, 1.0, 0.05, 0.2, 50).price('put', 'american')
+        price_batch(np.full(7, 100.0), np.linspace(80, 120, 7), 1.0, 0.03, 0.2)
+        price_batch(np.full(3, 100.0), np.linspace(90, 110, 3), 1.0, 0.03, 0.2)
+    assert not enabled()
+    assert report.engines['binomial_tree']['calls'] == 1
+    assert report.engines['binomial_tree']['nodes'] == 51 * 52 // 2
+    assert report.engines['black_scholes']['calls'] == 2
+    assert report.engines['black_scholes']['contracts'] == 10
+    assert report.wall_seconds >= report.engines['black_scholes']['seconds'] > 0
+
+
+def test_instrument_records_failed_calls():
+    @instrument('failing')
+    def fail():
+        raise RuntimeError("boom")
+
+    with profile() as report:
+        with pytest.raises(RuntimeError):
+            fail()
+    assert report.engines['failing']['calls'] == 1
+
+
+def test_nested_reports_both_collect():
+    with profile() as outer:
+        record('engine', paths=5)
+        with profile() as inner:
+            record('engine', paths=2)
+    assert outer.engines['engine']['paths'] == 7
+    assert inner.engines['engine']['paths'] == 2
+
+
+def test_enable_disable():
+    report = enable()
+    try:
+        record('service', batches=3)
+    finally:
+        disable(report)
+    record('service', batches=100)
+    assert report.engines['service']['batches'] == 3
+    assert report.wall_seconds is not None
+
+
+def test_exports(tmp_path):
+    with profile() as report:
+        record('heston', calls=2, paths=1000)
+        record('cev', calls=1)
+    data = json.loads(report.to_json(tmp_path / 'run.json'))
+    assert data['engines']['heston'] == {'calls': 2, 'seconds': 0.0, 'paths': 1000}
+    assert json.loads((tmp_path / 'run.json').read_text()) == data
+
+    text = report.to_prometheus()
+    assert '# TYPE pricing_paths_total counter' in text
+    assert 'pricing_paths_total{engine="heston"} 1000' in text
+    assert 'pricing_calls_total{engine="cev"} 1' in text
+
+    frame = report.to_frame()
+    assert frame.loc['cev', 'paths'] == 0
+    assert 'heston' in str(report)
+
+
+def test_profile_call_captures_memory_and_profile():
+    result, report = profile_call(np.ones, 10 ** 6)
+    assert result.shape == (10 ** 6,)
+    assert report.peak_memory >= 8 * 10 ** 6
+    assert 'ones' in report.profile_text()
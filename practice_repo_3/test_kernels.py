@@ -0,0 +1,113 @@
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import kernels
+from binomial_tree import BinomialTreeModel
+from cev import CEVModel
+from heston import HestonModel
+from monte_carlo import MonteCarloModel
+
+# parity of the kernels with the numpy code paths, on problems small enough for the interpreted loops
+# 'python' runs the kernel functions uncompiled and 'numba' compiled (skipped without numba). the interpreted
+# tree does the same arithmetic in the same order and must match exactly; compiled code may contract
+# multiply-adds, so it and the simulations are held to rounding
+
+HESTON = dict(S0=100, X=100, T=1.0, r=0.03, kappa=1.0, theta=0.09, sigma=1.0, v0=0.09, rho=-0.3, seed=0)
+
+
+@pytest.fixture(params=['python', 'numba'])
+def backends(request):
+    # runs a call under 'numpy' and under the kernel backend and returns both results; the backend is
+    # restored afterwards
+    if request.param == 'numba':
+        pytest.importorskip('numba')
+    previous = kernels.set_backend('numpy')
+
+    def both(call):
+        kernels.set_backend('numpy')
+        expected = call()
+        kernels.set_backend(request.param)
+        return expected, call()
+
+    both.exact = request.param == 'python'
+    yield both
+    kernels.set_backend(previous)
+
+
+@pytest.mark.parametrize('option_type', ['call', 'put'])
+@pytest.mark.parametrize('exercise, options', [
+    ('european', {}),
+    ('american', {}),
+    ('bermudan', {'exercise_dates': [0.25, 0.5, 0.75]}),
+    ('american', {'strikes': [80.0, 95.0, 100.0, 120.0]}),
+    ('american', {'richardson': True}),
+])
+def test_binomial_tree(backends, option_type, exercise, options):
+    model = BinomialTreeModel(100, 100, 1.0, 0.05, 0.2, 60)
+    expected, actual = backends(lambda: model.price(option_type, exercise, **options))
+    if backends.exact:
+        np.testing.assert_array_equal(actual, expected)
+    else:
+        np.testing.assert_allclose(actual, expected, rtol=1e-13, atol=0)
+
+
+def test_gbm_paths(backends):
+    model = lambda: MonteCarloModel(100, 100, 1.0, 0.03, 0.2, num_simulations=200, num_steps=20, seed=0)
+    expected, actual = backends(lambda: model().simulate_price_paths())
+    np.testing.assert_allclose(actual, expected, rtol=1e-13, atol=0)
+
+
+@pytest.mark.parametrize('options', [{}, {'antithetic': True}, {'moment_matching': True}])
+def test_gbm_estimate(backends, options):
+    model = lambda: MonteCarloModel(100, 100, 1.0, 0.03, 0.2, num_simulations=500, num_steps=16, seed=0)
+    expected, actual = backends(lambda: model().estimate('put', **options))
+    for name in ('price', 'std_error'):
+        assert actual[name] == pytest.approx(expected[name], rel=1e-13, abs=0)
+
+
+def test_backend_from_environment():
+    # a misspelled PRICING_KERNELS fails the import rather than silently meaning 'auto'
+    code = "import kernels; print(kernels.get_backend())"
+    run = lambda value: subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                       env={**os.environ, 'PRICING_KERNELS': value})
+    assert run('python').stdout.strip() == 'python'
+    failed = run('numbaa')
+    assert failed.returncode != 0
+    assert "PRICING_KERNELS='numbaa'" in failed.stderr
+
+
+@pytest.mark.parametrize('scheme', ['euler', 'qe'])
+def test_heston_estimate(backends, scheme):
+    model = lambda: HestonModel(**HESTON, num_simulations=500, num_steps=16, scheme=scheme)
+    expected, actual = backends(lambda: model().estimate('call'))
+    for name in ('price', 'std_error'):
+        assert actual[name] == pytest.approx(expected[name], rel=1e-13, abs=0)
+
+
+@pytest.mark.parametrize('scheme', ['euler', 'qe'])
+def test_heston_paths(backends, scheme):
+    model = lambda: HestonModel(**HESTON, num_simulations=200, num_steps=16, scheme=scheme)
+    expected, actual = backends(lambda: model().simulate_price_paths())
+    np.testing.assert_allclose(actual, expected, rtol=1e-13, atol=0)
+
+
+def test_cev_estimate(backends):
+    model = lambda: CEVModel(100, 100, 1.0, 0.03, 0.2 * 100 ** 0.2, 0.8, num_simulations=500, num_steps=16, seed=0)
+    expected, actual = backends(lambda: model().estimate('call'))
+    for name in ('price', 'std_error'):
+        assert actual[name] == pytest.approx(expected[name], rel=1e-13, abs=0)
+
+
+def test_set_backend_restores():
+    previous = kernels.set_backend('python')
+    try:
+        assert kernels.get_backend() == 'python'
+    finally:
+        kernels.set_backend(previous)
+    with pytest.raises(ValueError):
+        kernels.set_backend('fortran')
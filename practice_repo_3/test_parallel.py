@@ -0,0 +1,80 @@
+
+import numpy as np
+import pytest
+
+from black_scholes import BlackScholesModel
+from heston import HestonModel
+from monte_carlo import MonteCarloModel
+from parallel import run_sharded, shard_sizes, spawn_seeds
+from variance_reduction import PayoffAccumulator
+
+S0, X, T, r, sigma = 100.0, 100.0, 0.5, 0.02, 0.2
+
+
+def _normal_shard(num_paths, seed_sequence):
+    accumulator = PayoffAccumulator()
+    accumulator.add(np.random.default_rng(seed_sequence).standard_normal(num_paths))
+    return accumulator
+
+
+@pytest.mark.parametrize('num_paths, shards, multiple', [(10, 3, 1), (100, 4, 2), (7, 7, 1), (3, 5, 1)])
+def test_shard_sizes(num_paths, shards, multiple):
+    sizes = shard_sizes(num_paths, shards, multiple)
+    assert len(sizes) == shards and sum(sizes) == num_paths
+    assert max(sizes) - min(sizes) <= multiple and all(size % multiple == 0 for size in sizes)
+
+
+def test_odd_paths_cannot_be_split_into_pairs():
+    with pytest.raises(ValueError, match='multiple of 2'):
+        shard_sizes(11, 2, 2)
+
+
+def test_spawned_streams_are_independent_children():
+    seeds = spawn_seeds(42, 3)
+    expected = np.random.SeedSequence(42).spawn(3)
+    assert [s.spawn_key for s in seeds] == [s.spawn_key for s in expected]
+    draws = [np.random.default_rng(s).standard_normal(5) for s in seeds]
+    assert not np.allclose(draws[0], draws[1])
+
+
+def test_single_worker_runs_the_first_child_inline():
+    result = run_sharded(_normal_shard, 1000, seed=3, workers=1).result()
+    expected = np.random.default_rng(spawn_seeds(3, 1)[0]).standard_normal(1000).mean()
+    assert result['price'] == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_result_is_fixed_by_seed_and_worker_count(backend):
+    first = run_sharded(_normal_shard, 5000, seed=4, workers=3, backend=backend).result()
+    again = run_sharded(_normal_shard, 5000, seed=4, workers=3, backend=backend).result()
+    assert first['price'] == again['price'] and first['std_error'] == again['std_error']
+    # the shards, drawn one after another and merged in order, give the same sums
+    serial = PayoffAccumulator()
+    for size, child in zip(shard_sizes(5000, 3), spawn_seeds(4, 3)):
+        serial.merge(_normal_shard(size, child))
+    assert first['price'] == serial.result()['price']
+
+
+def test_bad_backend():
+    with pytest.raises(ValueError, match='backend'):
+        run_sharded(_normal_shard, 10, workers=2, backend='cluster')
+
+
+def test_sharded_monte_carlo_matches_black_scholes():
+    model = MonteCarloModel(S0, X, T, r, sigma, num_simulations=60000, num_steps=10, seed=5)
+    threads = model.estimate('put', antithetic=True, workers=3, backend='thread')
+    processes = model.estimate('put', antithetic=True, workers=3, backend='process')
+    assert threads['price'] == processes['price'] and threads['std_error'] == processes['std_error']
+    exact = BlackScholesModel(S0, X, T, r, sigma).put_price()
+    assert abs(threads['price'] - exact) < 4 * threads['std_error']
+    # a different worker count draws different streams
+    assert model.estimate('put', antithetic=True, workers=2, backend='thread')['price'] != threads['price']
+
+
+def test_sharded_heston_is_reproducible():
+    model = HestonModel(S0, X, T, r, 2.0, 0.04, 0.4, 0.04, -0.5, num_simulations=8000, num_steps=20,
+                        batch_size=1500, seed=6, scheme='qe')
+    first = model.estimate('call', control_variates=('black_scholes',), workers=2, backend='thread')
+    second = model.estimate('call', control_variates=('black_scholes',), workers=2, backend='process')
+    assert first['price'] == second['price']
+    assert abs(first['price'] - model.cos_price('call')) < 4 * first['std_error']
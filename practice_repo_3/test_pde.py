@@ -0,0 +1,92 @@
+
+import numpy as np
+import pytest
+
+from binomial_tree import BinomialTreeModel
+from black_scholes import price_batch
+from greeks import greeks_batch
+from pde import FiniteDifferenceModel
+
+# the same well-known american put as test_binomial_tree: S0 = X = 100, T = 1, r = 5%, sigma = 20%
+AMERICAN_PUT = 6.0903
+SPOTS = np.array([80.0, 95.0, 100.0, 110.0, 130.0])
+STRIKES = np.array([90.0, 100.0, 115.0])
+
+
+@pytest.mark.parametrize('option_type', ['call', 'put'])
+def test_european_grid_matches_black_scholes(option_type):
+    model = FiniteDifferenceModel(100.0, 100.0, 0.75, 0.04, 0.25, q=0.01, space_steps=800, time_steps=400)
+    greeks = model.greeks(option_type, spots=SPOTS, strikes=STRIKES)
+    exact = greeks_batch(SPOTS[:, None], STRIKES, 0.75, 0.04, 0.25, 0.01, option_type)
+    assert greeks['price'].shape == (SPOTS.size, STRIKES.size)
+    np.testing.assert_allclose(greeks['price'], exact['price'], atol=2e-3)
+    np.testing.assert_allclose(greeks['delta'], exact['delta'], atol=2e-4)
+    np.testing.assert_allclose(greeks['gamma'], exact['gamma'], atol=2e-5)
+    np.testing.assert_allclose(greeks['theta'], exact['theta'], atol=5e-3)
+
+
+def test_second_order_convergence():
+    # crank-nicolson after rannacher smoothing: doubling both grids cuts the error about fourfold (with the
+    # strike on a node; off the nodes the payoff kink adds an error that moves with its position between them)
+    exact = float(price_batch(100.0, 100.0, 1.0, 0.03, 0.3, 0.0, 'put'))
+    errors = [abs(FiniteDifferenceModel(100.0, 100.0, 1.0, 0.03, 0.3, space_steps=n, time_steps=n // 2).price('put')
+                  - exact) for n in (100, 200, 400)]
+    assert 3 < errors[0] / errors[1] < 5 and 3 < errors[1] / errors[2] < 5
+    richardson = FiniteDifferenceModel(100.0, 100.0, 1.0, 0.03, 0.3, space_steps=100, time_steps=50).price(
+        'put', richardson=True)
+    assert abs(richardson - exact) < errors[2]
+
+
+def test_american_put_matches_the_reference_and_the_tree():
+    model = FiniteDifferenceModel(100.0, 100.0, 1.0, 0.05, 0.2)
+    assert model.price('put', 'american', richardson=True) == pytest.approx(AMERICAN_PUT, abs=2e-4)
+    tree = BinomialTreeModel(100.0, 100.0, 1.0, 0.05, 0.2, 1000)
+    np.testing.assert_allclose(model.price('put', 'american', strikes=STRIKES, richardson=True),
+                               tree.price('put', 'american', strikes=STRIKES, richardson=True), atol=2e-3)
+
+
+def test_early_exercise_premium():
+    model = FiniteDifferenceModel(100.0, 100.0, 1.0, 0.05, 0.2, space_steps=200, time_steps=100)
+    american = model.greeks('put', 'american', spots=SPOTS)
+    european = model.greeks('put', spots=SPOTS)
+    # (the penalty iteration holds the exercise constraint to its tolerance, 1e-8 by default)
+    assert (american['price'] >= european['price'] - 1e-6).all()
+    assert (american['price'] >= np.maximum(100.0 - SPOTS, 0) - 1e-6).all()
+    # deep in the money the put is exercised: worth its intrinsic value, delta -1, no time decay
+    deep = model.greeks('put', 'american', spots=60.0)
+    assert deep['price'] == pytest.approx(40.0, abs=1e-6)
+    assert deep['delta'] == pytest.approx(-1.0, abs=1e-3) and deep['theta'] == 0.0
+    # without dividends an american call is never exercised early
+    assert model.price('call', 'american') == pytest.approx(model.price('call'), abs=1e-6)
+
+
+def test_penalty_and_psor_agree():
+    model = FiniteDifferenceModel(100.0, 100.0, 1.0, 0.05, 0.2, q=0.02, space_steps=100, time_steps=50)
+    penalty = model.solve('put', 'american', method='penalty', tol=1e-10)
+    psor = model.solve('put', 'american', method='psor', tol=1e-10, max_iter=1000)
+    np.testing.assert_allclose(penalty['values'], psor['values'], atol=1e-6)
+    assert penalty['iterations'] > 0 and psor['iterations'] > 0
+
+
+def test_output_shapes():
+    model = FiniteDifferenceModel(100.0, 100.0, 0.5, 0.02, 0.2, space_steps=100, time_steps=50)
+    assert isinstance(model.price(), float)
+    assert model.greeks(spots=SPOTS)['delta'].shape == (SPOTS.size,)
+    assert model.greeks(strikes=STRIKES)['gamma'].shape == (STRIKES.size,)
+    assert model.greeks(spots=SPOTS, strikes=STRIKES)['theta'].shape == (SPOTS.size, STRIKES.size)
+
+
+def test_errors():
+    with pytest.raises(ValueError, match='positive'):
+        FiniteDifferenceModel(100.0, 100.0, 0.0, 0.05, 0.2)
+    with pytest.raises(ValueError, match='rannacher_steps'):
+        FiniteDifferenceModel(100.0, 100.0, 1.0, 0.05, 0.2, rannacher_steps=3)
+    model = FiniteDifferenceModel(100.0, 100.0, 1.0, 0.05, 0.2, space_steps=50, time_steps=20)
+    with pytest.raises(ValueError, match='Invalid option type'):
+        model.solve('straddle')
+    with pytest.raises(ValueError, match='exercise'):
+        model.solve('put', 'bermudan')
+    with pytest.raises(ValueError, match='method'):
+        model.solve('put', 'american', method='lcp')
+    with pytest.raises(ValueError, match='positive'):
+        model.solve('put', spots=[-1.0])
@@ -0,0 +1,111 @@
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import norm
+
+from black_scholes import BlackScholesModel
+from portfolio import Portfolio, scenario_grid, var_es
+
+rng = np.random.default_rng(0)
+N = 60
+BOOK = pd.DataFrame({
+    'underlying': rng.choice(['AAA', 'BBB', 'CCC'], N),
+    'S0': rng.uniform(80, 120, N),
+    'X': rng.uniform(80, 120, N),
+    'T': rng.uniform(0.1, 2.0, N),
+    'r': 0.03,
+    'sigma': rng.uniform(0.15, 0.45, N),
+    'q': rng.uniform(0.0, 0.03, N),
+    'option_type': rng.choice(['call', 'put'], N),
+    'quantity': rng.integers(-10, 11, N),
+})
+SCENARIOS = scenario_grid(spot=[-0.2, -0.05, 0.0, 0.1], vol=[-0.05, 0.0, 0.1], rate=[0.0, 0.01], horizon=10 / 365)
+
+
+def _reprice(row, spot=0.0, vol=0.0, rate=0.0, horizon=0.0):
+    model = BlackScholesModel(row.S0 * (1 + spot), row.X, row.T - horizon, row.r + rate, row.sigma + vol, row.q)
+    return model.call_price() if row.option_type == 'call' else model.put_price()
+
+
+def test_full_revaluation_matches_position_by_position():
+    portfolio = Portfolio(BOOK)
+    cube = portfolio.pnl_cube(SCENARIOS)
+    for i in (0, 7, 23):
+        scenario = SCENARIOS.iloc[i]
+        expected = [row.quantity * (_reprice(row, *scenario) - _reprice(row)) for row in BOOK.itertuples()]
+        np.testing.assert_allclose(cube[i], expected, rtol=1e-10, atol=1e-10)
+    assert portfolio.value == pytest.approx(sum(row.quantity * _reprice(row) for row in BOOK.itertuples()),
+                                            rel=1e-12)
+
+
+def test_chunking_does_not_change_the_result(tmp_path):
+    portfolio = Portfolio(BOOK)
+    total = portfolio.scenario_pnl(SCENARIOS)
+    np.testing.assert_allclose(portfolio.scenario_pnl(SCENARIOS, chunk_cells=100), total, rtol=1e-12)
+    out = np.memmap(tmp_path / 'cube.dat', dtype=float, mode='w+', shape=(len(SCENARIOS), N))
+    cube = portfolio.pnl_cube(SCENARIOS, chunk_cells=50, out=out)
+    assert cube is out
+    np.testing.assert_allclose(cube.sum(axis=1), total, rtol=1e-12)
+
+
+def test_delta_gamma_vega_for_small_moves():
+    # second order in spot, so halving a spot move cuts the error about eightfold; first order in vol, fourfold
+    portfolio = Portfolio(BOOK)
+
+    def error(scenarios):
+        return np.abs(portfolio.scenario_pnl(scenarios, method='delta_gamma_vega')
+                      - portfolio.scenario_pnl(scenarios)).max()
+
+    for name, move, ratio in (('spot', 0.02, 8), ('vol', 0.01, 4)):
+        coarse, fine = error({name: [-move, move]}), error({name: [-move / 2, move / 2]})
+        assert coarse / fine == pytest.approx(ratio, rel=0.15)
+    assert error({'spot': [0.01]}) < 1e-3 * np.abs(portfolio.scenario_pnl({'spot': [0.01]})).max()
+
+
+def test_per_underlying_shocks():
+    portfolio = Portfolio(BOOK)
+    spot = pd.DataFrame({'CCC': [0.0, 0.05], 'AAA': [0.1, 0.0], 'BBB': [0.0, -0.1]})
+    cube = portfolio.pnl_cube({'spot': spot})
+    moves = {'AAA': 0.1, 'BBB': 0.0, 'CCC': 0.0}
+    expected = [row.quantity * (_reprice(row, moves[row.underlying]) - _reprice(row)) for row in BOOK.itertuples()]
+    np.testing.assert_allclose(cube[0], expected, rtol=1e-10, atol=1e-10)
+    with pytest.raises(ValueError, match='no spot shocks'):
+        portfolio.scenario_pnl({'spot': spot[['AAA', 'BBB']]})
+
+
+def test_var_and_expected_shortfall():
+    pnl = np.arange(-99.0, 1.0)
+    result = var_es(pnl, level=0.95)
+    assert result['var'] == pytest.approx(np.quantile(-pnl, 0.95))
+    assert result['es'] == pytest.approx(np.mean(-pnl[-pnl >= result['var']]))
+    # a normal p&l sample: VaR and ES approach their closed forms
+    sample = np.random.default_rng(1).standard_normal(400000)
+    result = var_es(sample, 0.99)
+    assert result['var'] == pytest.approx(norm.ppf(0.99), rel=0.01)
+    assert result['es'] == pytest.approx(norm.pdf(norm.ppf(0.99)) / 0.01, rel=0.01)
+
+
+def test_monte_carlo_var_of_a_linear_book():
+    # long call minus put at one strike is a forward: its p&l is linear in the spot move, so with normal moves
+    # VaR is z * sigma of the position value change
+    book = pd.DataFrame({'S0': 100.0, 'X': 100.0, 'T': 1.0, 'r': 0.0, 'sigma': 0.2, 'q': 0.0,
+                         'option_type': ['call', 'put'], 'quantity': [1.0, -1.0]})
+    daily = pd.Series(np.random.default_rng(2).normal(0, 0.01, 1000))
+    result = Portfolio(book).monte_carlo_var(daily, n_scenarios=200000, level=0.99, seed=3)
+    assert result['var'] == pytest.approx(norm.ppf(0.99) * 100 * daily.std(), rel=0.02)
+    # historical simulation on the same history: its 99% loss
+    historical = Portfolio(book).historical_var(daily, level=0.99)
+    assert historical['var'] == pytest.approx(np.quantile(-100 * daily, 0.99), rel=1e-6)
+
+
+def test_errors():
+    with pytest.raises(ValueError, match="'quantity'"):
+        Portfolio(BOOK.drop(columns='quantity'))
+    portfolio = Portfolio(BOOK)
+    with pytest.raises(ValueError, match='scenarios can only contain'):
+        portfolio.scenario_pnl({'dividend': [0.01]})
+    with pytest.raises(ValueError, match='greater than -1'):
+        portfolio.scenario_pnl({'spot': [-1.0]})
+    with pytest.raises(ValueError, match="method must be"):
+        portfolio.scenario_pnl(SCENARIOS, method='delta')
@@ -0,0 +1,100 @@
+
+import numpy as np
+import pytest
+
+from black_scholes import price_batch
+from greeks import greeks_batch
+from pricing_grid import PricingGrid
+
+AXES = {'S0': (70.0, 130.0, 33), 'sigma': (0.1, 0.5, 17), 'T': (0.25, 2.0, 17)}
+
+
+def _black_scholes(S0, sigma, T):
+    return price_batch(S0, 100.0, T, 0.03, sigma, 0.01, 'put')
+
+
+@pytest.fixture(scope='module')
+def grid():
+    return PricingGrid.build(_black_scholes, AXES, vectorized=True)
+
+
+def _random_points(n, seed):
+    rng = np.random.default_rng(seed)
+    return {name: rng.uniform(low, high, n) for name, (low, high, _) in AXES.items()}
+
+
+def test_polynomials_are_reproduced_exactly():
+    polynomial = lambda x, y: 3 * x ** 4 - x * y ** 2 + 2 * y - 1
+    grid = PricingGrid.build(polynomial, {'x': (-1.0, 2.0, 5), 'y': (0.0, 1.0, 3)}, vectorized=True)
+    x, y = np.random.default_rng(0).uniform([-1, 0], [2, 1], (50, 2)).T
+    np.testing.assert_allclose(grid(x=x, y=y), polynomial(x, y), atol=1e-12)
+    assert grid.error_estimate() > 0
+
+
+def test_black_scholes_surface(grid):
+    points = _random_points(2000, 1)
+    error = np.abs(grid(**points) - _black_scholes(**points)).max()
+    assert error < 1e-4
+    # the trailing coefficients bound the measured error
+    assert error <= grid.error_estimate()
+    # the nodes themselves come back exactly
+    S0, sigma, T = (PricingGrid.nodes(*AXES[name])[[3, 5, 7]] for name in AXES)
+    np.testing.assert_allclose(grid(S0=S0, sigma=sigma, T=T), _black_scholes(S0, sigma, T), atol=1e-12)
+
+
+def test_derivatives_are_the_greeks(grid):
+    points = _random_points(500, 2)
+    greeks = greeks_batch(points['S0'], 100.0, points['T'], 0.03, points['sigma'], 0.01, 'put')
+    np.testing.assert_allclose(grid(derivative={'S0': 1}, **points), greeks['delta'], atol=1e-4)
+    np.testing.assert_allclose(grid(derivative={'S0': 2}, **points), greeks['gamma'], atol=1e-4)
+
+
+def test_queries_broadcast(grid):
+    S0 = np.linspace(80, 120, 5)[:, None]
+    prices = grid(S0=S0, sigma=0.2, T=np.array([0.5, 1.0]))
+    assert prices.shape == (5, 2)
+    np.testing.assert_allclose(prices, _black_scholes(S0, 0.2, np.array([0.5, 1.0])), atol=1e-4)
+
+
+def test_point_by_point_and_threaded_builds_agree():
+    axes = {'S0': (80.0, 120.0, 9), 'sigma': (0.15, 0.35, 5)}
+    price = lambda S0, sigma: float(price_batch(S0, 100.0, 1.0, 0.03, sigma))
+    serial = PricingGrid.build(price, axes)
+    threaded = PricingGrid.build(price, axes, workers=3, backend='thread')
+    np.testing.assert_array_equal(serial.values, threaded.values)
+    vectorized = PricingGrid.build(lambda S0, sigma: price_batch(S0, 100.0, 1.0, 0.03, sigma), axes, vectorized=True)
+    np.testing.assert_allclose(serial.values, vectorized.values, rtol=1e-14)
+
+
+def test_validate_reports_the_measured_error():
+    axes = {'S0': (80.0, 120.0, 9), 'sigma': (0.15, 0.35, 5)}
+    price = lambda S0, sigma: price_batch(S0, 100.0, 1.0, 0.03, sigma)
+    grid = PricingGrid.build(price, axes, vectorized=True)
+    report = grid.validate(price, n_points=300, seed=4, vectorized=True)
+    rng = np.random.default_rng(4)
+    points = {name: rng.uniform(low, high, 300) for name, (low, high, _) in axes.items()}
+    assert report['max_error'] == pytest.approx(np.abs(grid(**points) - price(**points)).max(), rel=1e-12)
+    # a coarse grid: the estimate stays conservative, and finer nodes cut the error
+    assert report['mean_error'] <= report['max_error'] <= report['error_estimate']
+    finer = PricingGrid.build(price, {'S0': (80.0, 120.0, 17), 'sigma': (0.15, 0.35, 9)}, vectorized=True)
+    assert finer.validate(price, vectorized=True)['max_error'] < report['max_error'] / 10
+
+
+def test_save_and_load(grid, tmp_path):
+    path = tmp_path / 'grid.npz'
+    PricingGrid(grid.axes, grid.values, {'model': 'black_scholes put'}).save(path)
+    loaded = PricingGrid.load(path)
+    assert loaded.axes == grid.axes and loaded.metadata == {'model': 'black_scholes put'}
+    points = _random_points(20, 3)
+    np.testing.assert_array_equal(loaded(**points), grid(**points))
+
+
+def test_errors(grid):
+    with pytest.raises(ValueError, match='outside the grid'):
+        grid(S0=150.0, sigma=0.2, T=1.0)
+    with pytest.raises(ValueError, match='exactly the grid axes'):
+        grid(S0=100.0, sigma=0.2)
+    with pytest.raises(ValueError, match='one entry per grid node'):
+        PricingGrid({'x': (0, 1, 3)}, np.zeros(4))
+    with pytest.raises(ValueError, match='at least two nodes'):
+        PricingGrid({'x': (0, 1, 1)}, np.zeros(1))
@@ -0,0 +1,76 @@
+
+import numpy as np
+import pytest
+from scipy.special import ndtr
+
+from black_scholes import BlackScholesModel
+from heston import HestonModel, heston_cos_prices
+from monte_carlo import MonteCarloModel
+from qmc import PseudoRandomSampler, SobolSampler, _bridge_plan, brownian_bridge_increments, randomized_qmc
+
+S0, X, T, r, sigma = 100.0, 95.0, 1.0, 0.03, 0.3
+
+
+@pytest.mark.parametrize('n_steps', [1, 2, 7, 16, 50])
+def test_bridge_plan_builds_every_point_once(n_steps):
+    plan = _bridge_plan(n_steps)
+    assert sorted(point for point, _, _ in plan) == list(range(1, n_steps + 1))
+    built = {0}
+    for point, left, right in plan:
+        # each point is conditioned only on points that already exist
+        assert left in built and (right is None or right in built)
+        built.add(point)
+
+
+@pytest.mark.parametrize('n_steps', [4, 12])
+def test_bridge_is_an_orthogonal_map(n_steps):
+    # the bridge is linear in z; iid normals stay iid exactly when its matrix is orthogonal
+    basis = np.eye(n_steps)[:, :, None]
+    matrix = brownian_bridge_increments(basis)[:, :, 0]
+    np.testing.assert_allclose(matrix @ matrix.T, np.eye(n_steps), atol=1e-12)
+    # the first dimension alone sets the terminal value W_T = sqrt(n_steps) z_0
+    z = np.random.default_rng(0).standard_normal((5, n_steps, 2))
+    np.testing.assert_allclose(brownian_bridge_increments(z).sum(axis=1), np.sqrt(n_steps) * z[:, 0], rtol=1e-12)
+
+
+def test_sobol_sampler_continues_its_sequence():
+    whole = SobolSampler(seed=1).increments(1024, 8, 2)
+    batched = SobolSampler(seed=1)
+    np.testing.assert_array_equal(np.concatenate([batched.increments(512, 8, 2), batched.increments(512, 8, 2)]),
+                                  whole)
+    assert whole.shape == (1024, 8, 2)
+    assert np.isfinite(SobolSampler(scramble=False).increments(16, 4)).all()
+
+
+def test_sobol_points_are_balanced():
+    # every dimension of a scrambled sobol block of 2^k points has one point per 1/2^k stratum
+    z = SobolSampler(seed=2, bridge=False).increments(256, 3, 1)[:, :, 0]
+    strata = (ndtr(z) * 256).astype(int)
+    for column in strata.T:
+        np.testing.assert_array_equal(np.sort(column), np.arange(256))
+
+
+def test_randomized_qmc_beats_pseudo_random():
+    exact = BlackScholesModel(S0, X, T, r, sigma).call_price()
+    model = MonteCarloModel(S0, X, T, r, sigma, num_simulations=4096, num_steps=16, seed=3)
+    qmc_result = randomized_qmc(lambda sampler: model.option_price('call', sampler=sampler), replications=16, seed=3)
+    assert abs(qmc_result['price'] - exact) < 4 * qmc_result['std_error']
+    # each replication against a plain run of the same size
+    pseudo = model.estimate('call', sampler=PseudoRandomSampler(4))
+    assert qmc_result['replications'].std(ddof=1) < pseudo['std_error'] / 4
+
+
+def test_sobol_heston_matches_cos():
+    params = dict(kappa=2.0, theta=0.04, sigma=0.5, v0=0.04, rho=-0.7)
+    reference = heston_cos_prices(S0, X, T, r, option_type='put', **params)[0]
+    model = HestonModel(S0, X, T, r, **params, num_simulations=4096, num_steps=16, scheme='qe')
+    result = randomized_qmc(lambda sampler: model.estimate('put', sampler=sampler)['price'], replications=8, seed=5)
+    assert abs(result['price'] - reference) < 4 * result['std_error']
+
+
+def test_sampler_rejects_pseudo_random_options():
+    model = MonteCarloModel(S0, X, T, r, sigma, num_simulations=64, num_steps=4)
+    with pytest.raises(ValueError, match='pseudo-random'):
+        model.estimate('call', antithetic=True, sampler=SobolSampler())
+    with pytest.raises(ValueError, match='sharded'):
+        model.estimate('call', sampler=SobolSampler(), workers=2)
@@ -0,0 +1,149 @@
+
+import asyncio
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from greeks import greeks_batch
+from heston import heston_cos_prices
+from repricing_service import LatencyHistogram, RepricingService, demo_instruments, run_demo
+
+
+class BrokenExecutor(Executor):
+    # every job fails, like a pool whose worker died
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(RuntimeError('worker died'))
+        return future
+
+
+async def _serve(service, quotes, settle=0.05):
+    # runs the service, feeds it quotes (a list of submit_many argument tuples) in one burst and collects every
+    # published frame until it has been quiet for `settle` seconds
+    results = service.subscribe()
+    pricing = asyncio.create_task(service.run())
+    for quote in quotes:
+        service.submit_many(*quote)
+    frames = []
+    while True:
+        try:
+            frames.append(await asyncio.wait_for(results.get(), settle))
+        except asyncio.TimeoutError:
+            break
+    await service.stop()
+    await pricing
+    return frames
+
+
+def test_burst_is_coalesced_into_one_batch():
+    instruments = demo_instruments(50)
+    ids = instruments.index
+    service = RepricingService(instruments)
+    quotes = [(ids[:10], np.full(10, 101.0)), (ids[5:15], np.full(10, 102.0), np.full(10, 0.3)),
+              (ids[[0, 0]], [103.0, 104.0])]
+    frames = asyncio.run(_serve(service, quotes))
+    assert len(frames) == 1
+    frame = frames[0].sort_index()
+    assert list(frame.index) == list(ids[:15])
+    # the latest quote wins, a quote without a vol keeps the last one
+    expected_spot = np.r_[104.0, np.full(4, 101.0), np.full(10, 102.0)]
+    expected_sigma = np.r_[instruments['sigma'].to_numpy()[:5], np.full(10, 0.3)]
+    np.testing.assert_array_equal(frame['S0'], expected_spot)
+    np.testing.assert_array_equal(frame['sigma'], expected_sigma)
+    greeks = greeks_batch(expected_spot, instruments['X'][:15], instruments['T'][:15], 0.03, expected_sigma, 0.0,
+                          instruments['option_type'][:15])
+    for name in ('price', 'delta', 'gamma', 'vega'):
+        np.testing.assert_allclose(frame[name], greeks[name], rtol=1e-14)
+    _, counters = service.report()
+    assert counters['quotes'] == 22 and counters['coalesced'] == 7
+    assert counters['batches'] == 1 and counters['repriced'] == 15
+
+
+def test_bad_quotes_are_rejected():
+    instruments = demo_instruments(5)
+    service = RepricingService(instruments)
+    service.submit_many(['OPT000000', 'nope', 'OPT000001', 'OPT000002'], [101.0, 100.0, -1.0, 99.0],
+                        [0.2, 0.2, 0.2, 0.0])
+    assert service.counters['rejected'] == 3
+    assert list(np.flatnonzero(service.dirty)) == [0]
+
+
+def test_large_bursts_are_split_by_max_batch():
+    instruments = demo_instruments(25)
+    service = RepricingService(instruments, max_batch=10)
+    frames = asyncio.run(_serve(service, [(instruments.index, np.full(25, 101.0))]))
+    assert [len(frame) for frame in frames] == [10, 10, 5]
+
+
+def test_heston_instruments_run_in_the_executor():
+    instruments = demo_instruments(4, n_heston=2)
+    with ThreadPoolExecutor(2) as executor:
+        service = RepricingService(instruments, executor=executor, heston_simulations=20000, heston_steps=16)
+        frames = asyncio.run(_serve(service, [(instruments.index, np.full(4, 105.0))], settle=2.0))
+    heavy = pd.concat([frame for frame in frames if 'std_error' in frame]).sort_index()
+    assert list(heavy.index) == list(instruments.index[:2])
+    for name, row in heavy.iterrows():
+        spec = instruments.loc[name]
+        reference = heston_cos_prices(105.0, spec['X'], spec['T'], spec['r'], spec['kappa'], spec['theta'],
+                                      spec['xi'], spec['v0'], spec['rho'], spec['option_type'])[0]
+        assert abs(row['price'] - reference) < 4 * row['std_error']
+    _, counters = service.report()
+    assert counters['heavy_jobs'] == 2 and counters['repriced'] == 2 and counters['heavy_errors'] == 0
+
+
+def test_failed_heston_jobs_are_published_and_counted():
+    instruments = demo_instruments(3, n_heston=1)
+    service = RepricingService(instruments, executor=BrokenExecutor())
+    frames = asyncio.run(_serve(service, [(instruments.index, np.full(3, 101.0))]))
+    errors = [frame for frame in frames if 'error' in frame]
+    assert len(errors) == 1
+    assert np.isnan(errors[0]['price'].iloc[0]) and 'worker died' in errors[0]['error'].iloc[0]
+    _, counters = service.report()
+    assert counters['heavy_errors'] == 1 and counters['heavy_jobs'] == 0
+    assert 'repricing_heavy_errors_total 1' in service.to_prometheus()
+    # nothing is retried until the next quote
+    assert not service.dirty.any() and not service.in_flight.any()
+
+
+def test_slow_subscriber_keeps_the_latest_batches():
+    instruments = demo_instruments(10)
+    service = RepricingService(instruments, queue_size=2)
+    queue = service.subscribe()
+    for spot in (101.0, 102.0, 103.0):
+        service.spot[:] = spot
+        service._reprice(np.arange(10))
+    assert queue.qsize() == 2
+    assert queue.get_nowait()['S0'].iloc[0] == 102.0
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram(bounds=[0.001, 0.01, 0.1])
+    histogram.observe([0.0005] * 50 + [0.005] * 40 + [0.05] * 9 + [1.0])
+    assert histogram.summary()['count'] == 100
+    assert (histogram.quantile(0.5), histogram.quantile(0.9), histogram.quantile(0.99)) == (0.001, 0.01, 0.1)
+    assert histogram.quantile(1.0) == np.inf
+    text = histogram.to_prometheus('latency_seconds')
+    assert 'latency_seconds_bucket{le="0.01"} 90' in text and 'latency_seconds_count 100' in text
+    assert np.isnan(LatencyHistogram().quantile(0.5))
+
+
+def test_demo_over_a_socket():
+    latency, counters = asyncio.run(run_demo(200, rate=5000, burst=100, duration=0.2, socket=True))
+    assert counters['quotes'] > 0 and counters['repriced'] > 0 and counters['rejected'] == 0
+    # every quote was priced or folded into a later one, except those still pending when the service stopped
+    assert counters['quotes'] - 200 <= counters['repriced'] + counters['coalesced'] <= counters['quotes']
+    assert latency.loc['quote_to_publish', 'count'] == counters['repriced']
+
+
+def test_errors():
+    instruments = demo_instruments(3)
+    with pytest.raises(ValueError, match="'sigma'"):
+        RepricingService(instruments.drop(columns='sigma'))
+    with pytest.raises(ValueError, match='unique'):
+        RepricingService(pd.concat([instruments, instruments]))
+    with pytest.raises(ValueError, match="model must be"):
+        RepricingService(instruments.assign(model='sabr'))
+    with pytest.raises(ValueError, match='heston instruments need'):
+        RepricingService(demo_instruments(3, n_heston=1).drop(columns='xi'))
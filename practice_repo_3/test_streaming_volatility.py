@@ -0,0 +1,97 @@
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from streaming_volatility import (CloseToCloseVolatility, EWMAVolatility, GarmanKlassVolatility,
+                                  ParkinsonVolatility, YangZhangVolatility)
+from volatality import VolatilityMeasures
+
+TICKERS = 6
+rng = np.random.default_rng(0)
+CLOSES = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.015, (300, TICKERS)), axis=0)))
+
+
+def _ohlc(days, tickers, vol, steps=390, seed=1):
+    # daily bars of a driftless gbm sampled `steps` times a day, with an overnight gap of a tenth of the day's variance
+    rng = np.random.default_rng(seed)
+    daily = vol / np.sqrt(252)
+    gap = rng.normal(0, daily * np.sqrt(0.1), (days, tickers))
+    path = np.cumsum(rng.normal(0, daily * np.sqrt(0.9 / steps), (days, steps, tickers)), axis=1)
+    start = np.cumsum(gap + np.concatenate([np.zeros((1, tickers)), path[:-1, -1]]), axis=0)
+    log_open = start
+    log_path = start[:, None, :] + path
+    high = np.maximum(np.exp(log_open), np.exp(log_path.max(axis=1)))
+    low = np.minimum(np.exp(log_open), np.exp(log_path.min(axis=1)))
+    return 100 * np.exp(log_open), 100 * high, 100 * low, 100 * np.exp(log_path[:, -1])
+
+
+def test_close_to_close_matches_historical_volatility():
+    window = 60
+    estimator = CloseToCloseVolatility(TICKERS, window=window)
+    for day, bar in enumerate(CLOSES.to_numpy()):
+        estimator.update(bar)
+        if day in (30, 60, 61, 200, 299):
+            volatility = estimator.volatility()
+            if day < window:
+                assert np.isnan(volatility).all()
+                continue
+            expected = [VolatilityMeasures(CLOSES[t].iloc[:day + 1]).historical_volatility(window)
+                        for t in range(TICKERS)]
+            np.testing.assert_allclose(volatility, expected, rtol=1e-10)
+
+
+def test_ewma_matches_the_recursion():
+    estimator = EWMAVolatility(TICKERS, decay=0.94).replay(CLOSES)
+    squares = np.log(CLOSES / CLOSES.shift(1)).iloc[1:] ** 2
+    # seeded with the first squared return, then decay * var + (1 - decay) * r^2
+    expected = squares.ewm(alpha=0.06, adjust=False).mean().iloc[-1] * 252
+    np.testing.assert_allclose(estimator.volatility(), np.sqrt(expected), rtol=1e-10)
+
+
+def test_parkinson_matches_its_rolling_mean():
+    _, high, low, _ = _ohlc(80, TICKERS, 0.3, steps=50)
+    estimator = ParkinsonVolatility(TICKERS, window=20).replay(high, low)
+    expected = (np.log(high[-20:] / low[-20:]) ** 2).mean(axis=0) / (4 * np.log(2)) * 252
+    np.testing.assert_allclose(estimator.volatility(), np.sqrt(expected), rtol=1e-10)
+
+
+@pytest.mark.parametrize('estimator, fields, tolerance', [
+    (ParkinsonVolatility, (1, 2), 0.06), (GarmanKlassVolatility, (0, 1, 2, 3), 0.06),
+    (YangZhangVolatility, (0, 1, 2, 3), 0.05)])
+def test_range_estimators_recover_the_true_volatility(estimator, fields, tolerance):
+    # parkinson and garman-klass see only the trading day (a tenth of the variance is overnight), yang-zhang adds
+    # the overnight gap back; all of them run a few percent low on a range sampled 390 times a day
+    bars = _ohlc(250, 40, 0.25)
+    volatility = estimator(40, window=200).replay(*(bars[i] for i in fields)).volatility()
+    intraday = 0.25 * (np.sqrt(0.9) if estimator is not YangZhangVolatility else 1.0)
+    assert np.mean(volatility) == pytest.approx(intraday, rel=tolerance)
+
+
+def test_missing_prices_and_subsets_keep_state():
+    full = CloseToCloseVolatility(3, window=5)
+    gappy = CloseToCloseVolatility(3, window=5)
+    closes = CLOSES.to_numpy()[:12, :3]
+    for day, bar in enumerate(closes):
+        full.update(bar)
+        if day == 6:
+            # ticker 1 has no print today and ticker 2 arrives on its own; the next return of ticker 1
+            # spans both days
+            gappy.update([bar[0], np.nan], index=[0, 1])
+            gappy.update(bar[2], index=[2])
+        else:
+            gappy.update(bar)
+    volatility, reference = gappy.volatility(), full.volatility()
+    np.testing.assert_allclose(volatility[[0, 2]], reference[[0, 2]], rtol=1e-12)
+    expected = np.log(np.delete(closes[:, 1], 6)[1:] / np.delete(closes[:, 1], 6)[:-1])[-5:].std(ddof=1)
+    assert volatility[1] == pytest.approx(expected * np.sqrt(252), rel=1e-12)
+
+
+def test_long_streams_do_not_drift():
+    # a quiet stretch after a wild one: the ring buffer resyncs its sums, so the rounding error of the large
+    # squared returns that left the window does not swamp the small ones
+    returns = np.concatenate([rng.normal(0, 0.2, 20000), rng.normal(0, 1e-5, 50)])
+    closes = 100 * np.exp(np.cumsum(returns))[:, None]
+    estimator = CloseToCloseVolatility(1, window=20).replay(closes)
+    returns = np.diff(np.log(closes[:, 0]))[-20:]
+    assert estimator.volatility()[0] == pytest.approx(returns.std(ddof=1) * np.sqrt(252), rel=1e-9)
@@ -0,0 +1,99 @@
+
+import numpy as np
+import pytest
+
+from black_scholes import BlackScholesModel
+from heston import HestonModel, heston_cos_prices
+from monte_carlo import MonteCarloModel
+from variance_reduction import PayoffAccumulator, draw_normals, pair_average
+
+S0, X, T, r, sigma, q = 100.0, 110.0, 0.75, 0.04, 0.25, 0.01
+
+
+def test_antithetic_draws_pair_up():
+    z = draw_normals(np.random.default_rng(0), (10, 3), antithetic=True)
+    np.testing.assert_array_equal(z[5:], -z[:5])
+    with pytest.raises(ValueError, match='even number'):
+        draw_normals(np.random.default_rng(0), 9, antithetic=True)
+
+
+def test_moment_matched_draws():
+    z = draw_normals(np.random.default_rng(1), (1000, 4), moment_matching=True)
+    np.testing.assert_allclose(z.mean(axis=0), 0, atol=1e-14)
+    np.testing.assert_allclose(z.std(axis=0), 1, rtol=1e-12)
+    # a single path cannot be rescaled and is left as drawn
+    assert np.isfinite(draw_normals(np.random.default_rng(1), 1, moment_matching=True)).all()
+
+
+def test_pair_average():
+    values = np.arange(6.0)
+    np.testing.assert_array_equal(pair_average(values, True), [1.5, 2.5, 3.5])
+    assert pair_average(values, False) is values
+
+
+def test_accumulator_without_controls_is_the_sample_mean():
+    payoffs = np.random.default_rng(2).exponential(3.0, 5000)
+    accumulator = PayoffAccumulator()
+    for batch in np.array_split(payoffs, 7):
+        accumulator.add(batch)
+    result = accumulator.result(0.9)
+    assert result['price'] == pytest.approx(0.9 * payoffs.mean(), rel=1e-12)
+    assert result['std_error'] == pytest.approx(0.9 * payoffs.std(ddof=1) / np.sqrt(payoffs.size), rel=1e-9)
+    assert result['vr_factor'] == pytest.approx(1.0)
+
+
+def test_accumulator_control_is_the_regression_estimate():
+    rng = np.random.default_rng(3)
+    control = rng.standard_normal(4000) + 2.0
+    payoffs = 1.5 * control + 0.3 * rng.standard_normal(4000)
+    accumulator = PayoffAccumulator([2.0])
+    accumulator.add(payoffs, [control])
+    result = accumulator.result()
+    slope, intercept = np.polyfit(control, payoffs, 1)
+    assert result['beta'][0] == pytest.approx(slope, rel=1e-9)
+    assert result['price'] == pytest.approx(intercept + 2.0 * slope, rel=1e-9)
+    assert result['vr_factor'] > 20
+
+
+def test_merged_shards_equal_one_accumulator():
+    rng = np.random.default_rng(4)
+    payoffs, control = rng.exponential(1.0, 3000), rng.standard_normal(3000)
+    whole = PayoffAccumulator([0.0])
+    whole.add(payoffs, [control])
+    left, right = PayoffAccumulator([0.0]), PayoffAccumulator([0.0])
+    left.add(payoffs[:1000], [control[:1000]])
+    right.add(payoffs[1000:], [control[1000:]])
+    merged = left.merge(right).result()
+    for key in ('price', 'std_error', 'vr_factor'):
+        assert merged[key] == pytest.approx(whole.result()[key], rel=1e-9)
+    with pytest.raises(ValueError, match='different control variates'):
+        PayoffAccumulator().merge(whole)
+
+
+@pytest.mark.parametrize('options', [dict(antithetic=True), dict(moment_matching=True),
+                                     dict(control_variates=('spot',)),
+                                     dict(antithetic=True, moment_matching=True, control_variates=('spot',))])
+def test_monte_carlo_reductions_match_black_scholes(options):
+    bs = BlackScholesModel(S0, X, T, r, sigma, q)
+    model = MonteCarloModel(S0, X, T, r, sigma, q, num_simulations=100000, num_steps=4, seed=5)
+    plain = model.estimate('call')
+    reduced = model.estimate('call', **options)
+    assert abs(reduced['price'] - bs.call_price()) < 4 * reduced['std_error']
+    if options.keys() == {'moment_matching'}:
+        # rescaled draws leave the per-path variance (and so the reported error) about where it was
+        assert reduced['vr_factor'] == pytest.approx(1.0)
+    else:
+        assert reduced['std_error'] < plain['std_error']
+        assert reduced['vr_factor'] > 1
+
+
+def test_heston_black_scholes_control_matches_cos():
+    params = dict(kappa=1.5, theta=0.05, sigma=0.4, v0=0.04, rho=-0.6)
+    reference = heston_cos_prices(S0, X, T, r, option_type='put', **params)[0]
+    model = HestonModel(S0, X, T, r, **params, num_simulations=40000, num_steps=50, seed=6, scheme='qe')
+    plain = model.estimate('put')
+    reduced = model.estimate('put', control_variates=('black_scholes',))
+    assert abs(reduced['price'] - reference) < 4 * reduced['std_error']
+    # the gbm twin of each path carries most of the payoff noise
+    assert reduced['vr_factor'] > 3
+    assert reduced['std_error'] < plain['std_error'] / 1.5
@@ -0,0 +1,89 @@
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from black_scholes import price_batch
+from volatality import (IV_ABOVE_MAXIMUM, IV_BELOW_INTRINSIC, IV_INVALID_INPUT, IV_NOT_CONVERGED, IV_OK,
+                        VolatilityMeasures, implied_volatility_batch)
+
+
+def test_round_trip():
+    # prices at known vols invert back to them, from short-dated wings to long-dated high vol
+    rng = np.random.default_rng(0)
+    n = 5000
+    S0, X = 100.0, rng.uniform(40, 200, n)
+    T, r, q = rng.uniform(0.02, 5.0, n), rng.uniform(-0.01, 0.08, n), rng.uniform(0.0, 0.04, n)
+    sigma = rng.uniform(0.03, 2.0, n)
+    is_call = rng.random(n) < 0.5
+    price = price_batch(S0, X, T, r, sigma, q, is_call)
+    implied_vol, status = implied_volatility_batch(price, S0, X, T, r, q, is_call)
+    # quotes with almost no time value carry no information about the vol and may be flagged instead
+    informative = price - np.maximum(np.where(is_call, 1, -1) * (S0 * np.exp(-q * T) - X * np.exp(-r * T)), 0) > 1e-8
+    assert (status[informative] == IV_OK).all()
+    np.testing.assert_allclose(implied_vol[informative], sigma[informative], rtol=1e-6)
+    assert informative.mean() > 0.9
+    assert np.isin(status[~informative], [IV_OK, IV_BELOW_INTRINSIC]).all()
+
+
+def test_reprices_exactly():
+    price = np.array([10.45058357, 5.57352602, 0.01, 45.0])
+    implied_vol, status = implied_volatility_batch(price, 100.0, [100, 100, 150, 60], 1.0, 0.05,
+                                                   option_type=['call', 'put', 'call', 'put'])
+    assert (status[:3] == IV_OK).all()
+    np.testing.assert_allclose(implied_vol[:2], 0.2, rtol=1e-8)
+    np.testing.assert_allclose(price_batch(100.0, [100, 100, 150], 1.0, 0.05, implied_vol[:3],
+                                           option_type=['call', 'put', 'call']), price[:3], rtol=1e-9)
+
+
+def test_status_codes():
+    S0, X, T, r = 100.0, 100.0, 1.0, 0.05
+    price = np.array([0.0, 4.0, 150.0, 99.0, 10.0, 10.0, np.nan, 10.0])
+    X = np.array([X, 60.0, X, X, -5.0, X, X, X])
+    T = np.array([T, T, T, T, T, 0.0, T, T])
+    option_type = ['call', 'put', 'call', 'put', 'call', 'call', 'call', 'call']
+    implied_vol, status = implied_volatility_batch(price, S0, X, T, r, option_type=option_type)
+    assert status.tolist() == [IV_BELOW_INTRINSIC, IV_OK, IV_ABOVE_MAXIMUM, IV_ABOVE_MAXIMUM, IV_INVALID_INPUT,
+                               IV_INVALID_INPUT, IV_INVALID_INPUT, IV_OK]
+    assert np.isnan(implied_vol[status != IV_OK]).all()
+    # a price that needs a vol outside vol_bounds
+    implied_vol, status = implied_volatility_batch(10.0, S0, 100.0, 1.0, r, vol_bounds=(1e-6, 0.05))
+    assert status == IV_NOT_CONVERGED and np.isnan(implied_vol)
+
+
+def test_put_below_intrinsic():
+    # an in-the-money put under its discounted intrinsic value
+    implied_vol, status = implied_volatility_batch(20.0, 100.0, 130.0, 1.0, 0.0, option_type='put')
+    assert status == IV_BELOW_INTRINSIC and np.isnan(implied_vol)
+
+
+def test_shapes_broadcast():
+    price = price_batch(100.0, np.array([[90.0, 100.0], [110.0, 120.0]]), 0.5, 0.02, 0.3)
+    implied_vol, status = implied_volatility_batch(price, 100.0, np.array([[90.0, 100.0], [110.0, 120.0]]), 0.5, 0.02)
+    assert implied_vol.shape == status.shape == (2, 2)
+    np.testing.assert_allclose(implied_vol, 0.3, rtol=1e-8)
+
+
+def test_chain():
+    chain = pd.DataFrame({'strike': [90.0, 100.0, 110.0], 'T': [0.5, 1.0, 2.0], 'option_type': ['put', 'call', 'call']})
+    chain['lastPrice'] = price_batch(100.0, chain['strike'], chain['T'], 0.03, [0.25, 0.2, 0.18],
+                                     option_type=chain['option_type'])
+    measures = VolatilityMeasures(None)
+    result = measures.implied_volatility_chain(chain, 100.0, 0.03)
+    np.testing.assert_allclose(result['impliedVol'], [0.25, 0.2, 0.18], rtol=1e-8)
+    assert (result['ivStatus'] == IV_OK).all()
+    assert measures.chain_stats['rows'] == 3
+    single = measures.implied_volatility(chain.iloc[[1]], 100.0, 100.0, 1.0, 0.03)
+    assert single == pytest.approx(0.2, rel=1e-8)
+    with pytest.raises(ValueError, match="'T'"):
+        measures.implied_volatility_chain(chain.drop(columns=['T']), 100.0, 0.03)
+
+
+def test_historical_volatility():
+    # a geometric random walk with 20% annual vol
+    rng = np.random.default_rng(1)
+    returns = 0.2 / np.sqrt(252) * rng.standard_normal(252 * 40)
+    prices = pd.Series(100 * np.exp(np.cumsum(returns)))
+    assert VolatilityMeasures(prices).historical_volatility(window=252 * 20) == pytest.approx(0.2, rel=0.03)
+    with pytest.raises(ValueError, match="Not enough data"):
+        VolatilityMeasures(prices[:100]).historical_volatility()
@@ -0,0 +1,98 @@
+
+import numpy as np
+
+# variance reduction helpers shared by the monte carlo engines (MonteCarloModel, HestonModel, CEVModel)
+# antithetic variates and moment matching change how the normals are drawn,
+# control variates change how the payoffs are averaged (PayoffAccumulator)
+
+
+def draw_normals(rng, size, antithetic=False, moment_matching=False):
+    # standard normals of shape size (paths along axis 0)
+    # antithetic: second half of the paths are the first half negated, so row i pairs with row i + n/2
+    # moment matching: each column rescaled to sample mean 0 and sample std 1
+    size = (size,) if np.isscalar(size) else tuple(size)
+    if antithetic:
+        if size[0] % 2:
+            raise ValueError("Antithetic sampling needs an even number of paths per batch")
+        half = rng.standard_normal((size[0] // 2,) + size[1:])
+        z = np.concatenate([half, -half])
+    else:
+        z = rng.standard_normal(size)
+    if moment_matching and size[0] > 1:
+        z = (z - z.mean(axis=0)) / z.std(axis=0)
+    return z
+
+
+def pair_average(values, antithetic):
+    # antithetic pairs (row i, row i + n/2) are the independent samples, so they are averaged before any statistics
+    if not antithetic:
+        return values
+    half = values.shape[0] // 2
+    return 0.5 * (values[:half] + values[half:])
+
+
+class PayoffAccumulator:
+    # running sums of payoffs and control variates across batches; result() applies the
+    # control variates with the estimated optimal coefficients beta = Cov(C, C)^-1 Cov(C, Y)
+
+    def __init__(self, control_means=()):
+        self.control_means = np.asarray(control_means, dtype=float)
+        k = 1 + self.control_means.size
+        self.n = 0
+        self.sums = np.zeros(k)
+        self.cross = np.zeros((k, k))
+        # plain per-path payoff moments, the baseline for the variance reduction factor
+        self.paths = 0
+        self.raw_sum = 0.0
+        self.raw_sq_sum = 0.0
+
+    def add(self, payoffs, controls=(), antithetic=False):
+        # payoffs: one per path; controls: one array per control variate, same length as payoffs
+        payoffs = np.asarray(payoffs, dtype=float)
+        self.paths += payoffs.size
+        self.raw_sum += payoffs.sum()
+        self.raw_sq_sum += np.dot(payoffs, payoffs)
+
+        samples = np.column_stack([pair_average(x, antithetic) for x in (payoffs, *controls)])
+        self.n += samples.shape[0]
+        self.sums += samples.sum(axis=0)
+        self.cross += samples.T @ samples
+
+    def merge(self, other):
+        # adds the sums of another accumulator (e.g. a parallel shard) to this one
+        if other.control_means.size != self.control_means.size:
+            raise ValueError("Cannot merge accumulators with different control variates")
+        self.n += other.n
+        self.sums += other.sums
+        self.cross += other.cross
+        self.paths += other.paths
+        self.raw_sum += other.raw_sum
+        self.raw_sq_sum += other.raw_sq_sum
+        return self
+
+    def result(self, discount=1.0):
+        n = self.n
+        mean = self.sums / n
+        cov = (self.cross - n * np.outer(mean, mean)) / max(n - 1, 1)
+
+        price = mean[0]
+        variance = cov[0, 0]
+        beta = np.zeros(self.control_means.size)
+        if self.control_means.size:
+            beta = np.linalg.lstsq(cov[1:, 1:], cov[1:, 0], rcond=None)[0]
+            price -= beta @ (mean[1:] - self.control_means)
+            variance -= cov[0, 1:] @ beta
+        variance = max(variance, 0.0)
+
+        # variance per simulated path of the plain estimator vs the reduced one (an antithetic pair costs two paths)
+        raw_mean = self.raw_sum / self.paths
+        raw_variance = (self.raw_sq_sum - self.paths * raw_mean ** 2) / max(self.paths - 1, 1)
+        cost_variance = variance * self.paths / n
+        vr_factor = raw_variance / cost_variance if cost_variance > 0 else np.inf
+
+        return {
+            'price': discount * price,
+            'std_error': discount * np.sqrt(variance / n),
+            'vr_factor': vr_factor,
+            'beta': beta,
+        }
@@ -1,42 +1,145 @@
-
-import numpy as np
-from scipy.optimize import brentq
-from scipy.stats import norm
-
-class VolatilityMeasures:
-    def __init__(self, price_series):
-        self.price_series = price_series
-
-    def historical_volatility(self, window=252):
-        #log returns
-        log_returns = np.log(self.price_series / self.price_series.shift(1)).dropna()   #dropna drops NA values
-        if len(log_returns) < window:
-            raise ValueError(f"Not enough data points for the specified window: {window}")
-        return log_returns.rolling(window=window).std().iloc[-1] * np.sqrt(252) #computes standard deviation of returns over last <window> days to see how violently the price has moved
-        #multiplying with root252 is to convert daily to annual volatality
-
-    def implied_volatility(self, option_chain, S0, X, T, r, q=0.0, option_type='call'):
-        def bs_price(sigma):
-            d1 = (np.log(S0 / X) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-            d2 = d1 - sigma * np.sqrt(T)
-            if option_type == 'call':
-                return S0 * np.exp(-q * T) * norm.cdf(d1) - X * np.exp(-r * T) * norm.cdf(d2)
-            elif option_type == 'put':
-                return X * np.exp(-r * T) * norm.cdf(-d2) - S0 * np.exp(-q * T) * norm.cdf(-d1)
-            else:
-                raise ValueError("Invalid option type. Must be 'call' or 'put'.")
-
-        # Ensure 'lastPrice' exists in the option_chain DataFrame
-        if 'lastPrice' not in option_chain.columns:
-            raise ValueError("The option_chain DataFrame must contain a 'lastPrice' column.")
-        
-        market_price = option_chain['lastPrice'].iloc[0]
-        
-        # Handle cases where the solver might fail
-        try:
-            implied_vol = brentq(lambda x: bs_price(x) - market_price, 1e-6, 5)
-            #numerically find sigma such that the bs option price matches the market price
-        except ValueError:
-            implied_vol = np.nan
-        
-        return implied_vol
+
+import time
+
+import numpy as np
+from scipy.special import ndtr
+
+from black_scholes import call_mask
+from instrumentation import instrument, record
+
+class VolatilityMeasures:
+    def __init__(self, price_series):
+        self.price_series = price_series
+
+    def historical_volatility(self, window=252):
+        #log returns
+        log_returns = np.log(self.price_series / self.price_series.shift(1)).dropna()   #dropna drops NA values
+        if len(log_returns) < window:
+            raise ValueError(f"Not enough data points for the specified window: {window}")
+        return log_returns.rolling(window=window).std().iloc[-1] * np.sqrt(252) #computes standard deviation of returns over last <window> days to see how violently the price has moved
+        #multiplying with root252 is to convert daily to annual volatality
+
+    def implied_volatility(self, option_chain, S0, X, T, r, q=0.0, option_type='call'):
+        # Ensure 'lastPrice' exists in the option_chain DataFrame
+        if 'lastPrice' not in option_chain.columns:
+            raise ValueError("The option_chain DataFrame must contain a 'lastPrice' column.")
+        
+        market_price = option_chain['lastPrice'].iloc[0]
+
+        # numerically find sigma such that the bs option price matches the market price
+        # (unsolvable quotes come back as nan, use implied_volatility_chain to get the reason)
+        implied_vol, _ = implied_volatility_batch(market_price, S0, X, T, r, q, option_type)
+        return float(implied_vol)
+
+    def implied_volatility_chain(self, option_chain, S0, r, q=0.0, T=None, option_type='call', price_column='lastPrice'):
+        # inverts every row of the chain at once; needs a 'strike' column, 'T' and 'option_type' columns
+        # are used when present, otherwise the T / option_type arguments apply to every row
+        for column in ('strike', price_column):
+            if column not in option_chain.columns:
+                raise ValueError(f"The option_chain DataFrame must contain a '{column}' column.")
+        if T is None:
+            if 'T' not in option_chain.columns:
+                raise ValueError("Pass T or add a 'T' (years to expiry) column to the option_chain DataFrame.")
+            T = option_chain['T'].to_numpy()
+        if 'option_type' in option_chain.columns:
+            option_type = option_chain['option_type'].to_numpy()
+
+        start = time.perf_counter()
+        implied_vol, status = implied_volatility_batch(option_chain[price_column].to_numpy(), S0,
+                                                       option_chain['strike'].to_numpy(), T, r, q, option_type)
+        elapsed = time.perf_counter() - start
+
+        result = option_chain.copy()
+        result['impliedVol'] = implied_vol
+        result['ivStatus'] = status
+        self.chain_stats = {'rows': len(result), 'seconds': elapsed, 'rows_per_sec': len(result) / max(elapsed, 1e-12)}
+        return result
+
+
+# per-row status codes returned by implied_volatility_batch
+IV_OK = 0
+IV_BELOW_INTRINSIC = 1      # price at or under the no-arbitrage lower bound (discounted intrinsic value)
+IV_ABOVE_MAXIMUM = 2        # price at or over the upper bound (S e^-qT for calls, X e^-rT for puts)
+IV_NOT_CONVERGED = 3        # no volatility inside vol_bounds reproduces the price
+IV_INVALID_INPUT = 4        # non-positive S0/X/T or a missing value
+
+
+@instrument('implied_vol')
+def implied_volatility_batch(price, S0, X, T, r, q=0.0, option_type='call', tol=1e-10, max_iter=100,
+                             vol_bounds=(1e-6, 10.0)):
+    price, S0, X, T, r, q = (np.asarray(a, dtype=float) for a in (price, S0, X, T, r, q))
+    arrays = np.broadcast_arrays(price, S0, X, T, r, q, call_mask(option_type))
+    shape = arrays[0].shape
+    price, S0, X, T, r, q, is_call = (a.ravel() for a in arrays)
+
+    sign = np.where(is_call, 1.0, -1.0)
+    with np.errstate(invalid='ignore'):
+        spot_disc = S0 * np.exp(-q * T)
+        strike_disc = X * np.exp(-r * T)
+        sqrt_T = np.sqrt(T)
+
+    # classify every quote against the no-arbitrage bounds before solving
+    status = np.full(price.size, IV_NOT_CONVERGED, dtype=np.int8)
+    lower = np.maximum(sign * (spot_disc - strike_disc), 0)
+    upper = np.where(is_call, spot_disc, strike_disc)
+    invalid = ~((S0 > 0) & (X > 0) & (T > 0) & np.isfinite(price) & np.isfinite(r) & np.isfinite(q))
+    status[invalid] = IV_INVALID_INPUT
+    # time value lost in rounding (deep in the money) leaves nothing to invert, so it counts as intrinsic
+    time_value = price - lower
+    status[~invalid & (time_value <= 1e-12 * price)] = IV_BELOW_INTRINSIC
+    status[~invalid & (price >= upper)] = IV_ABOVE_MAXIMUM
+    implied_vol = np.full(price.size, np.nan)
+    active = np.flatnonzero(status == IV_NOT_CONVERGED)
+
+    # rational initial guess (Corrado-Miller) written for the call-equivalent price via put-call parity
+    call_price = price[active] + np.where(is_call[active], 0.0, spot_disc[active] - strike_disc[active])
+    half_moneyness = 0.5 * (spot_disc[active] - strike_disc[active])
+    excess = call_price - half_moneyness
+    radicand = np.maximum(excess ** 2 - (2 * half_moneyness) ** 2 / np.pi, 0)
+    guess = np.sqrt(2 * np.pi) / (spot_disc[active] + strike_disc[active]) * (excess + np.sqrt(radicand)) / sqrt_T[active]
+    sigma = np.clip(np.nan_to_num(guess, nan=0.2), 0.01, 2.0)
+
+    # safeguarded halley iterations: each row keeps a bracket [lo, hi] and falls back to bisection
+    # whenever a step would leave it (vega vanishes for deep in/out of the money quotes)
+    lo = np.full(active.size, vol_bounds[0])
+    hi = np.full(active.size, vol_bounds[1])
+    record('implied_vol', contracts=price.size)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        # one vectorized sweep, and how many quotes it still had to move
+        record('implied_vol', iterations=1, quote_iterations=active.size)
+        vol_sqrt_T = sigma * sqrt_T[active]
+        d1 = (np.log(spot_disc[active] / strike_disc[active]) + 0.5 * vol_sqrt_T ** 2) / vol_sqrt_T
+        d2 = d1 - vol_sqrt_T
+        s = sign[active]
+        model_price = s * (spot_disc[active] * ndtr(s * d1) - strike_disc[active] * ndtr(s * d2))
+        diff = model_price - price[active]
+        vega = spot_disc[active] * sqrt_T[active] * np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi)
+
+        hi = np.where(diff > 0, sigma, hi)
+        lo = np.where(diff < 0, sigma, lo)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            # far from the root (tiny out of the money prices) newton on log(price) converges much faster
+            far = (model_price < 0.5 * price[active]) | (model_price > 2 * price[active])
+            newton = np.where(far, np.log(model_price / price[active]) * model_price, diff) / vega
+            halley = np.where(far, 1.0, 1 - 0.5 * newton * d1 * d2 / sigma)
+            new_sigma = sigma - newton / np.clip(halley, 0.5, 2.0)
+        outside = ~((new_sigma > lo) & (new_sigma < hi))
+        new_sigma[outside] = 0.5 * (lo[outside] + hi[outside])
+
+        price_done = np.abs(diff) <= tol * time_value[active]
+        step_done = ~price_done & (np.abs(new_sigma - sigma) <= tol * sigma)
+        implied_vol[active[price_done]] = sigma[price_done]
+        implied_vol[active[step_done]] = new_sigma[step_done]
+        converged = price_done | step_done
+        status[active[converged]] = IV_OK
+
+        keep = ~converged
+        active, sigma, lo, hi = active[keep], new_sigma[keep], lo[keep], hi[keep]
+
+    # a "converged" bracket pinned to the edge of vol_bounds means the price is out of reach
+    pinned = (status == IV_OK) & ((implied_vol <= vol_bounds[0] * (1 + 1e-6)) | (implied_vol >= vol_bounds[1] * (1 - 1e-6)))
+    status[pinned] = IV_NOT_CONVERGED
+    implied_vol[status != IV_OK] = np.nan
+    return implied_vol.reshape(shape), status.reshape(shape)